@@ -0,0 +1,32 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Benchmarks for the client's hot paths.
+
+Each module has a ``run()`` function returning a dict of measurements,
+and can be run on its own. To run them all and write the results as JSON,
+so that they can be compared between releases:
+
+::
+
+    python -m benchmarks --output results.json
+    python -m benchmarks pagination events
+
+Benchmarks that need an API run against ``intercom.fake_server``, so no
+network access is required.
+
+"""
+
+BENCHMARKS = (
+    'import_time',
+    'call_overhead',
+    'codec',
+    'models',
+    'payload',
+    'pagination',
+    'events',
+    'memory',
+    'replay',
+    'transports',
+)
@@ -0,0 +1,52 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Runs the benchmarks and writes the results as JSON. """
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks import BENCHMARKS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'benchmarks', nargs='*', default=BENCHMARKS,
+        help='benchmarks to run (default: all of them)')
+    parser.add_argument(
+        '--output', default='-',
+        help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    from intercom.intercom import __version__
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': int(time.time()),
+        'results': {},
+    }
+    for name in args.benchmarks:
+        module = __import__('benchmarks.' + name, None, None, ['run'])
+        sys.stderr.write('running %s\n' % (name))
+        report['results'][name] = module.run()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as results:
+            results.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
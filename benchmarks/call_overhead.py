@@ -0,0 +1,74 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures the client-side CPU cost of a single ``Intercom._call``.
+
+The HTTP adapter is replaced with one that returns a canned response, so
+the numbers cover request building, header and auth preparation, body
+serialization and response parsing, but no network I/O.
+
+Run it with:
+
+::
+
+    python benchmarks/call_overhead.py
+
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from intercom import Intercom
+
+USER = b'{"email": "somebody@example.com", "user_id": "123"}'
+
+
+def canned_send(self, request, **kwargs):
+    """ Return a 200 response without touching the network. """
+    response = requests.Response()
+    response.status_code = 200
+    response._content = USER
+    response.request = request
+    response.url = request.url
+    return response
+
+
+def run(number=2000):
+    """ Return the mean seconds per call for a handful of API calls. """
+    send = HTTPAdapter.send
+    HTTPAdapter.send = canned_send
+    try:
+        return _run(number)
+    finally:
+        HTTPAdapter.send = send
+
+
+def _run(number):
+    Intercom.app_id = 'dummy-app-id'
+    Intercom.api_key = 'dummy-api-key'
+    calls = {
+        'get_user': lambda: Intercom.get_user(email='somebody@example.com'),
+        'create_impression': lambda: Intercom.create_impression(
+            email='somebody@example.com', user_ip='1.2.3.4'),
+        'create_note': lambda: Intercom.create_note(
+            email='somebody@example.com', body='A note.'),
+        'get_message_threads': lambda: Intercom.get_message_threads(
+            email='somebody@example.com'),
+    }
+    results = {}
+    for name, func in calls.items():
+        func()  # warm up
+        results[name] = timeit.timeit(func, number=number) / number
+    return results
+
+
+if __name__ == '__main__':
+    for name, seconds in sorted(run().items()):
+        print('%-20s %8.1f us/call' % (name, seconds * 1e6))
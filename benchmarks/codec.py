@@ -0,0 +1,76 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Compares the JSON codecs on the integration test fixtures.
+
+Each fixture is decoded with every installed codec. A 500 user page,
+built by repeating the users in ``v1-users.json``, shows the cost of a
+full ``get_users`` page. The ``strip+json`` row is the decoding done
+before codecs were introduced.
+
+Run it with:
+
+::
+
+    python benchmarks/codec.py
+
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom.codec import CODECS
+from intercom.codec import get_codec
+
+FIXTURES = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'integration', 'fixtures')
+
+
+def load_fixtures():
+    """ Returns a dict of fixture name to raw bytes. """
+    fixtures = {}
+    for filename in os.listdir(FIXTURES):
+        with open(os.path.join(FIXTURES, filename), 'rb') as fixture:
+            fixtures[filename[:-len('.json')]] = fixture.read()
+    users = json.loads(fixtures['v1-users'].decode('utf-8'))
+    page = dict(users, users=(users['users'] * 500)[:500])
+    fixtures['users-page-500'] = json.dumps(page).encode('utf-8')
+    return fixtures
+
+
+def available_codecs():
+    """ Returns the installed codecs. """
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            pass
+    return codecs
+
+
+def run(number=200):
+    """ Return {fixture: {codec: seconds per decode}}. """
+    results = {}
+    codecs = available_codecs()
+    for name, content in sorted(load_fixtures().items()):
+        results[name] = {
+            'strip+json': timeit.timeit(
+                lambda: json.loads(content.strip()), number=number) / number
+        }
+        for codec in codecs:
+            results[name][codec.name] = timeit.timeit(
+                lambda: codec.loads(content), number=number) / number
+    return results
+
+
+if __name__ == '__main__':
+    for fixture, timings in sorted(run().items()):
+        print(fixture)
+        for codec, seconds in sorted(timings.items(), key=lambda t: t[1]):
+            print('    %-12s %10.1f us' % (codec, seconds * 1e6))
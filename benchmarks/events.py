@@ -0,0 +1,46 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures sequential event sending against the fake server.
+
+Run it with:
+
+::
+
+    python benchmarks/events.py
+
+"""
+
+import os
+import sys
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom import Event
+from intercom import Intercom
+from intercom.fake_server import FakeIntercom
+
+
+def run(count=2000):
+    """ Return {measurement: events per second}. """
+    endpoint = Intercom.api_endpoint
+    with FakeIntercom() as fake:
+        Intercom.api_endpoint = fake.url
+        try:
+            start = default_timer()
+            for number in range(count):
+                Event.create(
+                    event_name='page-viewed', user_id=str(number % 100),
+                    metadata={'path': '/pricing'})
+            elapsed = default_timer() - start
+        finally:
+            Intercom.api_endpoint = endpoint
+    return {'Event.create events/s': count / elapsed}
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run().items()):
+        print('%-24s %10.0f' % (name, value))
@@ -0,0 +1,56 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures the time taken to import intercom in a fresh interpreter.
+
+Each statement is timed in a new process, so that nothing is already in
+``sys.modules``, and the best of several runs is reported.
+
+Run it with:
+
+::
+
+    python benchmarks/import_time.py
+
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+STATEMENTS = (
+    'import intercom',
+    'from intercom import Event',
+    'from intercom import User',
+    'from intercom import *',
+)
+
+TIMER = """
+import time
+start = time.time()
+%s
+print(time.time() - start)
+"""
+
+
+def time_import(statement, repeat=10):
+    """ Returns the fastest of repeat imports, in seconds. """
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', TIMER % (statement)], cwd=ROOT)
+        timings.append(float(output))
+    return min(timings)
+
+
+def run(repeat=10):
+    """ Return {statement: seconds}. """
+    return dict((s, time_import(s, repeat)) for s in STATEMENTS)
+
+
+if __name__ == '__main__':
+    for statement, seconds in sorted(run().items()):
+        print('%-28s %8.2f ms' % (statement, seconds * 1e3))
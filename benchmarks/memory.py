@@ -0,0 +1,181 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures the client's memory footprint for bulk operations.
+
+Each scenario runs over a synthetic dataset served by a fake server in a
+separate process, so that only the client's allocations are traced. For
+each one the peak, and the steady state (what is still allocated when the
+operation returns, e.g. a list of Users) is reported in KiB per 1000
+records.
+
+Requires tracemalloc (Python 3.4+). Run it with:
+
+::
+
+    python benchmarks/memory.py --records 10000
+
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from intercom import Intercom
+from intercom import MessageThread
+from intercom import User
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class FakeServerProcess(object):
+    """ Runs intercom.fake_server in a subprocess. """
+
+    def __init__(self, users):
+        self.users = users
+        self.process = None
+        self.port = None
+
+    def __enter__(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'intercom.fake_server',
+             '--port', str(self.port), '--users', str(self.users),
+             '--threads', '2'],
+            cwd=ROOT, stdout=subprocess.PIPE)
+        # the server prints a line once it is listening
+        self.process.stdout.readline()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s/v1/' % (self.port)
+
+
+def measure(func):
+    """ Returns (peak bytes, steady state bytes) allocated by func. The
+    result of func is kept alive until the steady state is measured. """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return peak - baseline, current - baseline
+
+
+def consume(iterable):
+    """ Iterate, keeping nothing. Returns None. """
+    for _ in iterable:
+        pass
+
+
+def save_users(count):
+    """ save() count Users, one at a time. """
+    for number in range(1, count + 1):
+        user = User(user_id=str(number), email='user%s@example.com' % number)
+        user.name = 'User %s' % (number)
+        user.save()
+
+
+def thread_fan_out(count):
+    """ Fetch the message threads of count users. """
+    return [
+        MessageThread.find_all(user_id=str(number))
+        for number in range(1, count + 1)]
+
+
+def scenarios(records, per_page, fan_out):
+    """ Returns {name: (function, number of records)}. """
+    fan_out = min(records, fan_out)
+    return {
+        'User.all (User)': (User.all, records),
+        'User.iter_all (User)': (
+            lambda: consume(User.iter_all(per_page=per_page)), records),
+        'User.iter_all (dict)': (
+            lambda: consume(User.iter_all(raw=True, per_page=per_page)),
+            records),
+        'User.iter_all stream (User)': (
+            lambda: consume(User.iter_all(per_page=per_page, stream=True)),
+            records),
+        'User.iter_all stream (dict)': (
+            lambda: consume(User.iter_all(
+                raw=True, per_page=per_page, stream=True)), records),
+        'list(User.iter_all) (dict)': (
+            lambda: list(User.iter_all(raw=True, per_page=per_page)),
+            records),
+        'User.save': (lambda: save_users(fan_out), fan_out),
+        'MessageThread.find_all fan-out': (
+            lambda: thread_fan_out(fan_out), fan_out),
+    }
+
+
+def run(records=5000, per_page=None, fan_out=1000):
+    """ Return {scenario: {'peak_kib_per_1k': n, 'steady_kib_per_1k': n}}.
+
+    per_page is used by the streaming scenarios, and fan_out caps the
+    number of users saved and whose threads are fetched. """
+    if tracemalloc is None:
+        return {'skipped': 'tracemalloc is not available'}
+    endpoint = Intercom.api_endpoint
+    results = {}
+    with FakeServerProcess(records) as server:
+        Intercom.api_endpoint = server.url
+        try:
+            # warm up the connection pool, and the lazy imports
+            Intercom.get_users(per_page=1)
+            for name, (func, count) in scenarios(
+                    records, per_page, fan_out).items():
+                peak, steady = measure(func)
+                results[name] = {
+                    'peak_kib_per_1k': peak / 1024.0 / count * 1000,
+                    'steady_kib_per_1k': steady / 1024.0 / count * 1000,
+                }
+        finally:
+            Intercom.api_endpoint = endpoint
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--per-page', type=int, default=None)
+    parser.add_argument('--fan-out', type=int, default=1000)
+    parser.add_argument('--json', action='store_true',
+                        help='write the results as JSON')
+    args = parser.parse_args(argv)
+    if tracemalloc is None:
+        sys.exit('tracemalloc is not available')
+    results = run(args.records, args.per_page, args.fan_out)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    print('%-32s %14s %14s' % ('KiB per 1k records', 'peak', 'steady'))
+    for name, result in sorted(results.items()):
+        print('%-32s %14.1f %14.1f' % (
+            name, result['peak_kib_per_1k'], result['steady_kib_per_1k']))
+
+
+if __name__ == '__main__':
+    main()
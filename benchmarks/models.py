@@ -0,0 +1,74 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures model construction and property access.
+
+Run it with:
+
+::
+
+    python benchmarks/models.py
+
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom.company import Company
+from intercom.fake_server import make_user
+from intercom.message_thread import MessageThread
+from intercom.user import User
+
+THREAD = {
+    'thread_id': 5591,
+    'created_at': 1385114541,
+    'updated_at': 1385028141,
+    'read': True,
+    'messages': [{
+        'created_at': 1385114541,
+        'html': '<p>Hey Intercom, What is up?</p>',
+        'from': {'email': 'bob@example.com', 'name': 'Bob'},
+    }] * 5,
+}
+
+
+def access_user(user):
+    """ Read the commonly used properties of a User. """
+    return (
+        user.email, user.user_id, user.name, user.created_at,
+        user.last_impression_at, user.custom_attributes,
+        user.location_data.city_name, user.social_profiles)
+
+
+def access_thread(thread):
+    """ Read the properties of a MessageThread and its Messages. """
+    return [
+        (m.html, m.created_at, m.author.email)
+        for m in thread.messages] + [thread.updated_at]
+
+
+def run(number=20000):
+    """ Return {measurement: seconds per operation}. """
+    user_dict = make_user(1)
+    company_dict = {'company_id': '1', 'name': 'Company', 'created_at': 1}
+    user = User(user_dict)
+    thread = MessageThread(THREAD)
+    tests = {
+        'User()': lambda: User(user_dict),
+        'Company()': lambda: Company(company_dict),
+        'MessageThread()': lambda: MessageThread(THREAD),
+        'User properties': lambda: access_user(user),
+        'MessageThread properties': lambda: access_thread(thread),
+    }
+    return dict(
+        (name, timeit.timeit(test, number=number) / number)
+        for name, test in tests.items())
+
+
+if __name__ == '__main__':
+    for name, seconds in sorted(run().items()):
+        print('%-26s %8.2f us' % (name, seconds * 1e6))
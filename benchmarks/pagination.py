@@ -0,0 +1,58 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures full-table pagination with User.all and Company.all against
+the fake server.
+
+Run it with:
+
+::
+
+    python benchmarks/pagination.py
+
+"""
+
+import os
+import sys
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom import Company
+from intercom import Intercom
+from intercom import User
+from intercom.fake_server import FakeIntercom
+
+
+def throughput(func, repeat):
+    """ Returns the best records per second from repeat calls of func. """
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        count = len(func())
+        elapsed = default_timer() - start
+        best = max(best, count / elapsed) if best else count / elapsed
+    return best
+
+
+def run(users=5000, companies=1000, repeat=3):
+    """ Return {measurement: records per second}. """
+    endpoint = Intercom.api_endpoint
+    with FakeIntercom() as fake:
+        fake.seed_users(users)
+        fake.seed_companies(companies)
+        Intercom.api_endpoint = fake.url
+        try:
+            return {
+                'User.all users/s': throughput(User.all, repeat),
+                'Company.all companies/s': throughput(Company.all, repeat),
+            }
+        finally:
+            Intercom.api_endpoint = endpoint
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run().items()):
+        print('%-24s %10.0f' % (name, value))
@@ -0,0 +1,56 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures the building of save() payloads, up to the point where they
+would be sent.
+
+Run it with:
+
+::
+
+    python benchmarks/payload.py
+
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom import Intercom
+from intercom.company import Company
+from intercom.fake_server import make_user
+from intercom.user import User
+
+
+def capture(method, url, params=None):
+    """ Stands in for Intercom._call: builds the request but does not
+    send it. """
+    Intercom._build_request(method, params)
+    return {}
+
+
+def run(number=20000):
+    """ Return {measurement: seconds per save()}. """
+    user = User(make_user(1))
+    user.companies = [{'company_id': '1', 'name': 'Company'}] * 3
+    company = Company({
+        'company_id': '1', 'name': 'Company', 'monthly_spend': 100,
+        'custom_attributes': {'seats': 10}})
+    call = Intercom._call
+    Intercom._call = staticmethod(capture)
+    try:
+        return {
+            'User.save': timeit.timeit(user.save, number=number) / number,
+            'Company.save': timeit.timeit(
+                company.save, number=number) / number,
+        }
+    finally:
+        Intercom._call = call
+
+
+if __name__ == '__main__':
+    for name, seconds in sorted(run().items()):
+        print('%-14s %8.2f us' % (name, seconds * 1e6))
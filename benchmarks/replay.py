@@ -0,0 +1,86 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Measures the client's CPU cost per call, without network variance, by
+replaying a recorded session.
+
+A session of pagination, note and event calls is recorded against the
+fake server, or read from a cassette given on the command line, then
+replayed as fast as possible with the recorded responses.
+
+Run it with:
+
+::
+
+    python benchmarks/replay.py [session.jsonl.gz]
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom import Event
+from intercom import Intercom
+from intercom import Note
+from intercom import User
+from intercom.cassette import RecordingTransport
+from intercom.cassette import load
+from intercom.cassette import play
+from intercom.fake_server import FakeIntercom
+
+try:
+    cpu_time = time.process_time
+except AttributeError:  # Python 2
+    cpu_time = time.clock
+
+
+def record_session(path, users=2000):
+    """ Record a session against the fake server to path. """
+    endpoint = Intercom.api_endpoint
+    transport = Intercom.transport
+    with FakeIntercom() as fake:
+        fake.seed_users(users)
+        Intercom.api_endpoint = fake.url
+        Intercom.transport = RecordingTransport(transport, path)
+        try:
+            User.all()
+            for number in range(1, 201):
+                Note.create(user_id=str(number), body='Reviewed')
+                Event.create(event_name='reviewed', user_id=str(number))
+        finally:
+            Intercom.transport.close()
+            Intercom.transport = transport
+            Intercom.api_endpoint = endpoint
+
+
+def run(path=None):
+    """ Return {measurement: value}. """
+    tmpdir = None
+    if path is None:
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'session.jsonl.gz')
+        record_session(path)
+    try:
+        interactions = load(path)
+    finally:
+        if tmpdir:
+            os.remove(path)
+            os.rmdir(tmpdir)
+    start = cpu_time()
+    stats = play(interactions)
+    cpu = cpu_time() - start
+    return {
+        'calls': stats['calls'],
+        'cpu seconds per call': cpu / stats['calls'],
+        'wall seconds per call': stats['elapsed'] / stats['calls'],
+    }
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run(*sys.argv[1:]).items()):
+        print('%-24s %g' % (name, value))
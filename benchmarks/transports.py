@@ -0,0 +1,69 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" Compares the per-request cost of each transport against the fake
+server, for a small GET and a small POST.
+
+Run it with:
+
+::
+
+    python benchmarks/transports.py
+
+"""
+
+import os
+import sys
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from intercom import Intercom
+from intercom.fake_server import FakeIntercom
+from intercom.transport import TRANSPORTS
+from intercom.transport import get_transport
+
+
+def measure(count):
+    """ Returns (GET us/request, POST us/request). """
+    Intercom.get_user(user_id='1')  # open the connection
+    start = default_timer()
+    for _ in range(count):
+        Intercom.get_user(user_id='1')
+    get = default_timer() - start
+    start = default_timer()
+    for _ in range(count):
+        Intercom.create_event('page-viewed', user_id='1')
+    post = default_timer() - start
+    return get / count * 1e6, post / count * 1e6
+
+
+def run(count=1000):
+    """ Return {transport: {'get_us': n, 'post_us': n}}. """
+    endpoint = Intercom.api_endpoint
+    previous = Intercom.transport
+    results = {}
+    with FakeIntercom() as fake:
+        fake.seed_users(1)
+        Intercom.api_endpoint = fake.url
+        try:
+            for name in sorted(TRANSPORTS):
+                Intercom.transport = get_transport(name)
+                try:
+                    get, post = measure(count)
+                finally:
+                    Intercom.transport.close()
+                results[name] = {'get_us': get, 'post_us': post}
+        finally:
+            Intercom.api_endpoint = endpoint
+            Intercom.transport = previous
+    return results
+
+
+if __name__ == '__main__':
+    print('%-12s %12s %12s' % ('us/request', 'GET', 'POST'))
+    for name, result in sorted(run().items()):
+        print('%-12s %12.0f %12.0f' % (name, result['get_us'],
+                                       result['post_us']))
@@ -7,9 +7,12 @@
 """ Intercom API wrapper. """
 
 import functools
+import pkgutil
+import sys
 import time
 
 from datetime import datetime
+from types import ModuleType
 
 
 def from_timestamp_property(func_to_decorate):
@@ -35,23 +38,65 @@ def to_timestamp_property(func_to_decorate):
         func_to_decorate(instance, value)
     return wrapper
 
-from .intercom import AuthenticationError
-from .intercom import BadGatewayError
-from .intercom import Intercom
-from .intercom import ResourceNotFound
-from .intercom import ServerError
-from .intercom import ServiceUnavailableError
-
-from .impression import Impression
-from .message_thread import MessageThread
-from .note import Note
-from .user import User
-from .company import Company
-from .tag import Tag
-from .events import Event
+# The public names, and the submodule each is imported from the first time
+# it is used. Deferring these imports keeps `import intercom` cheap, as
+# neither requests nor the resource modules are loaded until needed.
+_LAZY_NAMES = {
+    'AuthenticationError': 'intercom.intercom',
+    'BadGatewayError': 'intercom.intercom',
+    'DeadlineExceeded': 'intercom.intercom',
+    'Intercom': 'intercom.intercom',
+    'ResourceNotFound': 'intercom.intercom',
+    'RateLimitError': 'intercom.intercom',
+    'ServerError': 'intercom.intercom',
+    'ServiceUnavailableError': 'intercom.intercom',
+    'Impression': 'intercom.impression',
+    'MessageThread': 'intercom.message_thread',
+    'Note': 'intercom.note',
+    'User': 'intercom.user',
+    'Company': 'intercom.company',
+    'Tag': 'intercom.tag',
+    'Event': 'intercom.events',
+}
 
 __all__ = [
-    'AuthenticationError', 'BadGatewayError', 'Intercom', 'ResourceNotFound',
-    'ServerError', 'ServiceUnavailableError', 'Impression', 'MessageThread',
-    'Note', 'User', 'Tag', 'Event'
+    'AuthenticationError', 'BadGatewayError', 'DeadlineExceeded', 'Intercom',
+    'RateLimitError', 'ResourceNotFound', 'ServerError',
+    'ServiceUnavailableError', 'Impression', 'MessageThread', 'Note', 'User',
+    'Tag', 'Event'
 ]
+
+
+class _LazyModule(ModuleType):
+    """ The intercom package, which imports a public name, or a submodule
+    e.g. ``intercom.user``, when it is first accessed. """
+
+    def __getattr__(self, name):
+        """ Called only when name is not yet in the module's __dict__. """
+        if name in _LAZY_NAMES:
+            module = __import__(_LAZY_NAMES[name], None, None, [name])
+            value = getattr(module, name)
+        elif name in _submodules(self):
+            __import__('%s.%s' % (self.__name__, name))
+            value = sys.modules['%s.%s' % (self.__name__, name)]
+        else:
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % (name))
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_NAMES))
+
+
+def _submodules(package):
+    """ Returns the names of the modules in package. """
+    return set(
+        name for _, name, _ in pkgutil.iter_modules(package.__path__))
+
+
+# Keep a reference to the original module so it is not garbage collected,
+# then replace it with the lazy one.
+_original_module = sys.modules[__name__]
+sys.modules[__name__] = _LazyModule(__name__)
+sys.modules[__name__].__dict__.update(_original_module.__dict__)
@@ -0,0 +1,171 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" aggregation module
+
+Counts high frequency events locally, and sends one event for each user
+and event name per window in place of each of them:
+
+>>> from intercom import Intercom
+>>> from intercom.aggregation import EventAggregator
+>>> Intercom.event_aggregator = EventAggregator(
+...     ['page-viewed'], window=300).start()
+
+The event sent for a window has the ``created`` time of the last event,
+and the metadata ``count``, ``first`` and ``last``: the number of events
+and the ``created`` times of the first and last of them. Only events
+without metadata of their own are aggregated; the others are sent as
+they are.
+
+At most ``max_keys`` users and event names are counted at once; when
+there are more the window is flushed early. The events counted are
+flushed when the window ends, if the aggregator has been started, on the
+next event after it ends otherwise, and when the interpreter exits,
+unless the aggregator has been stopped, which flushes it.
+
+"""
+
+import atexit
+import logging
+import threading
+import time
+import weakref
+
+from .intercom import Intercom
+
+logger = logging.getLogger('intercom')
+
+
+def _flush_at_exit(ref):
+    aggregator = ref()
+    if aggregator is not None and not aggregator.stopped.is_set():
+        aggregator.flush()
+
+
+class EventAggregator(object):
+    """ Aggregates the events named in names, or all events if names is
+    None, over tumbling windows of window seconds.
+
+    ``aggregated`` and ``sent`` count the events counted and those sent
+    in their place, and ``failed`` those that could not be sent. If a
+    MetricsCollector is given they are also counted there, as
+    ``intercom_events_aggregated_total`` and
+    ``intercom_aggregate_events_sent_total``. """
+
+    def __init__(self, names=None, window=60.0, max_keys=10000,
+                 metrics=None, clock=time.time):
+        self.names = frozenset(names) if names is not None else None
+        self.window = window
+        self.max_keys = max_keys
+        self.metrics = metrics
+        self.clock = clock
+        self.lock = threading.Lock()
+        # {(event_name, user_id, email): [count, first, last]}
+        self.counts = {}
+        self.started = clock()
+        self.aggregated = 0
+        self.sent = 0
+        self.failed = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        # by weak reference, so an aggregator that is dropped is not kept
+        # for the hook
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def add(self, params):
+        """ Count the event with the create_event params, and return True,
+        unless it is not aggregated. """
+        if params.get('metadata') or (
+                self.names is not None and
+                params.get('event_name') not in self.names):
+            return False
+        key = (params.get('event_name'), params.get('user_id'),
+               params.get('email'))
+        created = params['created']
+        if self.clock() - self.started >= self.window:
+            self.flush()
+        with self.lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                self.counts[key] = [1, created, created]
+            else:
+                counts[0] += 1
+                counts[1] = min(counts[1], created)
+                counts[2] = max(counts[2], created)
+            self.aggregated += 1
+            full = len(self.counts) >= self.max_keys
+        if self.metrics is not None:
+            self.metrics.increment('events_aggregated_total')
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """ Send an event for each user and event name counted, and start a
+        new window. Returns the number sent. """
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.started = self.clock()
+        if not counts:
+            return 0
+        with Intercom.tracer.span(
+                'EventAggregator.flush', events=len(counts)):
+            return self._send(counts)
+
+    def _send(self, counts):
+        """ Send an event for each of counts, each in an item span. """
+        sent = 0
+        tracer = Intercom.tracer
+        for (event_name, user_id, email), (count, first, last) in \
+                counts.items():
+            try:
+                with tracer.span('item', event_name=event_name):
+                    Intercom._send_event({
+                        'event_name': event_name,
+                        'user_id': user_id,
+                        'email': email,
+                        'created': last,
+                        'metadata': {'count': count, 'first': first,
+                                     'last': last},
+                    })
+            except Exception:
+                logger.exception(
+                    "sending %s aggregated %s events failed", count,
+                    event_name)
+                with self.lock:
+                    self.failed += 1
+                continue
+            sent += 1
+        with self.lock:
+            self.sent += sent
+        if sent and self.metrics is not None:
+            self.metrics.increment('aggregate_events_sent_total', sent)
+        return sent
+
+    def start(self):
+        """ Flush at the end of each window in a daemon thread. Returns
+        the aggregator. """
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            wait = self.started + self.window - self.clock()
+            self.stopped.wait(max(wait, 0))
+            if self.stopped.is_set():
+                break
+            if self.clock() - self.started >= self.window:
+                self.flush()
+
+    def stop(self):
+        """ Stop the thread started by start, and flush. """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
@@ -0,0 +1,315 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" cassette module
+
+Records API traffic to a cassette file, and replays it offline. Replaying
+a captured session reproduces a production load shape locally, and lets
+the client's CPU cost be measured apart from network variance.
+
+Record by wrapping the current transport:
+
+>>> from intercom import Intercom
+>>> from intercom.cassette import RecordingTransport
+>>> Intercom.transport = RecordingTransport(
+...     Intercom.transport, 'session.jsonl.gz')     # doctest: +SKIP
+>>> # ... run the workload ...
+>>> Intercom.transport.close()                      # doctest: +SKIP
+
+Serve the recorded responses instead of calling the API, at the recorded
+speed (``speed=1.0``), or as fast as possible (``speed=None``):
+
+>>> from intercom.cassette import ReplayTransport
+>>> Intercom.transport = ReplayTransport(
+...     'session.jsonl.gz', speed=1.0)              # doctest: +SKIP
+
+Or re-issue every recorded call through ``Intercom._call``, at the offsets
+they were originally made:
+
+>>> from intercom.cassette import play
+>>> stats = play('session.jsonl.gz', speed=1.0)     # doctest: +SKIP
+
+A cassette has one JSON object per line, and is gzipped if its name ends
+in ``.gz``. The Authorization header is never recorded.
+
+"""
+
+import base64
+import collections
+import gzip
+import json
+import threading
+import time
+
+from timeit import default_timer
+
+from .transport import Response
+from .transport import Transport
+
+
+class CassetteError(Exception):
+    """ Raised when a replayed request was not recorded. """
+    pass
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _path(url):
+    return url.split('?', 1)[0]
+
+
+def _params_key(params):
+    # no parameters are recorded as None, however they were sent
+    return json.dumps(params or None, sort_keys=True)
+
+
+class Interaction(object):
+    """ A recorded request and its response.
+
+    * ``offset``: seconds from the start of the recording to the request.
+    * ``elapsed``: seconds the request took.
+
+    """
+
+    def __init__(self, offset, method, url, params, data, headers,
+                 status_code, response_headers, content, elapsed):
+        self.offset = offset
+        self.method = method
+        self.url = url
+        self.params = params or None
+        self.data = data
+        self.headers = headers
+        self.status_code = status_code
+        self.response_headers = response_headers
+        self.content = content
+        self.elapsed = elapsed
+
+    @property
+    def key(self):
+        """ Identifies the request when replaying. """
+        return (
+            self.method, self.url, _params_key(self.params), self.data)
+
+    def to_json(self):
+        record = {
+            't': round(self.offset, 6), 'm': self.method, 'u': self.url,
+            's': self.status_code, 'e': round(self.elapsed, 6)}
+        if self.params:
+            record['p'] = self.params
+        if self.data is not None:
+            record['b'] = self.data
+        if self.headers:
+            record['h'] = self.headers
+        if self.response_headers:
+            record['rh'] = self.response_headers
+        try:
+            record['c'] = self.content.decode('utf-8')
+        except UnicodeDecodeError:
+            record['c64'] = base64.b64encode(self.content).decode('ascii')
+        return json.dumps(record, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, line):
+        record = json.loads(line)
+        if 'c64' in record:
+            content = base64.b64decode(record['c64'])
+        else:
+            content = record.get('c', '').encode('utf-8')
+        data = record.get('b')
+        if data is not None and not isinstance(data, str):
+            data = data.encode('utf-8')
+        return cls(
+            record['t'], record['m'], record['u'], record.get('p'), data,
+            record.get('h'), record['s'], record.get('rh'), content,
+            record['e'])
+
+
+def load(path):
+    """ Returns the list of Interactions in a cassette. """
+    with _open(path, 'rb') as cassette:
+        return [
+            Interaction.from_json(line.decode('utf-8'))
+            for line in cassette if line.strip()]
+
+
+class RecordingTransport(Transport):
+    """ Sends requests with another transport, and appends each request
+    and its response to a cassette. """
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.path = path
+        self.file = _open(path, 'wb')
+        self.lock = threading.Lock()
+        self.started = None
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        start = default_timer()
+        if self.started is None:
+            self.started = start
+        response = self.transport.send(
+            method, url, params=params, data=data, headers=headers,
+            auth=auth, timeout=timeout)
+        elapsed = default_timer() - start
+        if isinstance(data, bytes) and not isinstance(data, str):
+            data = data.decode('utf-8')
+        interaction = Interaction(
+            start - self.started, method, url, params, data,
+            dict((k, v) for k, v in (headers or {}).items()
+                 if k.lower() != 'authorization'),
+            response.status_code, dict(response.headers or {}),
+            response.content or b'', elapsed)
+        line = interaction.to_json() + '\n'
+        with self.lock:
+            self.file.write(line.encode('utf-8'))
+        return response
+
+    def close(self):
+        """ Finish the cassette, and close the wrapped transport. """
+        with self.lock:
+            self.file.close()
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """ Returns the responses recorded in a cassette.
+
+    A request is matched to the first unplayed interaction with the same
+    method, URL, parameters and body. If there is none, for example
+    because the body contains a timestamp, the first unplayed interaction
+    with the same method and path is used. A CassetteError is raised if
+    that fails too.
+
+    If speed is specified, each response is delayed by its recorded time
+    divided by speed, so 1.0 replays at the recorded speed and 2.0 twice
+    as fast. """
+
+    def __init__(self, path_or_interactions, speed=None):
+        interactions = path_or_interactions
+        if not isinstance(interactions, list):
+            interactions = load(interactions)
+        self.interactions = interactions
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.played = set()
+        self.exact = collections.defaultdict(collections.deque)
+        self.loose = collections.defaultdict(collections.deque)
+        for interaction in interactions:
+            self.exact[interaction.key].append(interaction)
+            self.loose[(interaction.method, _path(interaction.url))].append(
+                interaction)
+
+    def _next(self, queue):
+        while queue:
+            interaction = queue.popleft()
+            if id(interaction) not in self.played:
+                self.played.add(id(interaction))
+                return interaction
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        if isinstance(data, bytes) and not isinstance(data, str):
+            data = data.decode('utf-8')
+        key = (method, url, _params_key(params), data)
+        with self.lock:
+            interaction = self._next(self.exact.get(key)) or \
+                self._next(self.loose.get((method, _path(url))))
+        if interaction is None:
+            raise CassetteError("no recorded response for %s %s" % (
+                method, url))
+        if self.speed:
+            time.sleep(interaction.elapsed / self.speed)
+        return Response(
+            interaction.status_code, interaction.response_headers,
+            interaction.content)
+
+    @property
+    def remaining(self):
+        """ The number of interactions not yet played. """
+        return len(self.interactions) - len(self.played)
+
+
+def play(path_or_interactions, speed=None, workers=8, transport=None):
+    """ Re-issue every call recorded in a cassette through Intercom._call,
+    with the recorded responses unless another transport is given.
+
+    If speed is specified each call is started at its recorded offset
+    divided by speed, by one of workers threads, so that concurrency in
+    the recording is reproduced; otherwise the calls are made one after
+    another, as fast as possible.
+
+    Returns a dict with the number of ``calls`` and ``errors``, and the
+    ``elapsed`` seconds. """
+    from .intercom import Intercom
+    from .intercom import IntercomError
+
+    interactions = path_or_interactions
+    if not isinstance(interactions, list):
+        interactions = load(interactions)
+    previous = Intercom.transport
+    if transport is None:
+        transport = ReplayTransport(interactions, speed=speed)
+    stats = {'calls': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def call(interaction):
+        params = interaction.params
+        if interaction.data:
+            params = json.loads(interaction.data)
+        try:
+            Intercom._call(interaction.method, _path(interaction.url), params)
+            error = 0
+        except IntercomError:
+            error = 1
+        with lock:
+            stats['calls'] += 1
+            stats['errors'] += error
+
+    Intercom.transport = transport
+    start = default_timer()
+    try:
+        if not speed:
+            for interaction in interactions:
+                call(interaction)
+        else:
+            _play_concurrently(interactions, speed, workers, call, start)
+    finally:
+        Intercom.transport = previous
+    stats['elapsed'] = default_timer() - start
+    return stats
+
+
+def _play_concurrently(interactions, speed, workers, call, start):
+    """ Start each call at its offset / speed from start. """
+    try:
+        import queue
+    except ImportError:  # Python 2
+        import Queue as queue
+    pending = queue.Queue()
+
+    def worker():
+        while True:
+            interaction = pending.get()
+            if interaction is None:
+                return
+            call(interaction)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for interaction in interactions:
+        delay = start + interaction.offset / speed - default_timer()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put(interaction)
+    for thread in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
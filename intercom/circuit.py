@@ -0,0 +1,286 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" circuit module
+
+A circuit breaker that stops sending requests to an endpoint that keeps
+failing, so that callers fail fast rather than each waiting out
+``Intercom.timeout``. It wraps the current transport:
+
+>>> from intercom import Intercom
+>>> from intercom.circuit import CircuitBreaker
+>>> Intercom.transport = CircuitBreaker(
+...     Intercom.transport, failure_threshold=5, recovery_timeout=30)
+
+There is a circuit for each endpoint e.g. ``users`` or ``users/notes``:
+
+* ``closed``: requests are sent. After ``failure_threshold`` consecutive
+  failures, i.e. errors raised by the transport or 5xx responses, the
+  circuit opens.
+* ``open``: requests are not sent. CircuitOpenError is raised, unless a
+  fallback provides a response. After ``recovery_timeout`` seconds the
+  circuit becomes half-open.
+* ``half_open``: up to ``half_open_calls`` trial requests are sent. A
+  success closes the circuit, and a failure opens it again.
+
+A fallback is called with ``(method, url, params, data, headers)`` while
+the circuit is open, and returns a transport Response, or None to raise
+CircuitOpenError. An Outbox queues writes to be sent once the API has
+recovered:
+
+>>> from intercom.circuit import Outbox
+>>> outbox = Outbox()
+>>> Intercom.transport = CircuitBreaker(Intercom.transport, fallback=outbox)
+>>> outbox.flush()                                  # doctest: +SKIP
+3
+
+If a MetricsCollector is given, the state of each circuit is exposed as
+the gauge ``intercom_circuit_state`` (0 closed, 1 half-open, 2 open), and
+the counters ``intercom_circuit_transitions_total`` and
+``intercom_circuit_rejected_total``.
+
+"""
+
+import collections
+import logging
+import threading
+
+from timeit import default_timer
+
+from .intercom import Intercom
+from .intercom import IntercomError
+from .transport import Response
+from .transport import Transport
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+FAILURE_STATUSES = (500, 502, 503, 504)
+
+logger = logging.getLogger('intercom')
+
+
+class CircuitOpenError(IntercomError):
+    """ Raised when a request is not sent because its circuit is open. """
+
+    def __init__(self, endpoint, retry_after):
+        super(CircuitOpenError, self).__init__(
+            "Circuit open for %s, retry in %.1fs." % (endpoint, retry_after))
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class Circuit(object):
+    """ The state of the circuit for one endpoint. """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trials = 0
+
+    def __repr__(self):
+        return '<Circuit %s %s>' % (self.endpoint, self.state)
+
+
+class CircuitBreaker(Transport):
+    """ Sends requests with another transport while their endpoint's
+    circuit is closed or half-open. """
+
+    def __init__(self, transport, failure_threshold=5, recovery_timeout=30.0,
+                 half_open_calls=1, failure_statuses=FAILURE_STATUSES,
+                 fallback=None, metrics=None, clock=default_timer):
+        self.transport = transport
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.failure_statuses = failure_statuses
+        self.fallback = fallback
+        self.metrics = metrics
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.circuits = {}
+
+    def circuit(self, endpoint):
+        """ Returns the Circuit for endpoint. """
+        with self.lock:
+            circuit = self.circuits.get(endpoint)
+            if circuit is None:
+                circuit = self.circuits[endpoint] = Circuit(endpoint)
+            return circuit
+
+    def state(self, endpoint):
+        """ Returns the state of endpoint's circuit. """
+        return self.circuit(endpoint).state
+
+    def reset(self):
+        """ Close every circuit. """
+        with self.lock:
+            circuits = list(self.circuits.values())
+        for circuit in circuits:
+            with self.lock:
+                circuit.failures = 0
+                changed = self._transition(circuit, CLOSED)
+            self._report(circuit, changed)
+
+    def _transition(self, circuit, state):
+        """ Move circuit to state; called with the lock held. Returns True
+        if the state changed. """
+        if circuit.state == state:
+            return False
+        circuit.state = state
+        circuit.trials = 0
+        if state == OPEN:
+            circuit.opened_at = self.clock()
+        return True
+
+    def _report(self, circuit, changed):
+        if not changed:
+            return
+        logger.warning(
+            "circuit for %s is %s", circuit.endpoint, circuit.state)
+        if self.metrics is not None:
+            self.metrics.increment(
+                'circuit_transitions_total', endpoint=circuit.endpoint,
+                state=circuit.state)
+            self.metrics.set_gauge(
+                'circuit_state', STATE_VALUES[circuit.state],
+                endpoint=circuit.endpoint)
+
+    def _allow(self, circuit):
+        """ Returns True if a request may be sent. """
+        changed = False
+        with self.lock:
+            if circuit.state == OPEN and \
+                    self.clock() - circuit.opened_at >= self.recovery_timeout:
+                changed = self._transition(circuit, HALF_OPEN)
+            if circuit.state == CLOSED:
+                allowed = True
+            elif circuit.state == HALF_OPEN and \
+                    circuit.trials < self.half_open_calls:
+                circuit.trials += 1
+                allowed = True
+            else:
+                allowed = False
+        self._report(circuit, changed)
+        return allowed
+
+    def _record(self, circuit, failed):
+        """ Record the outcome of a request that was sent. """
+        changed = False
+        with self.lock:
+            if not failed:
+                circuit.failures = 0
+                if circuit.state == HALF_OPEN:
+                    changed = self._transition(circuit, CLOSED)
+            elif circuit.state == HALF_OPEN:
+                changed = self._transition(circuit, OPEN)
+            elif circuit.state == CLOSED:
+                circuit.failures += 1
+                if circuit.failures >= self.failure_threshold:
+                    changed = self._transition(circuit, OPEN)
+        self._report(circuit, changed)
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        circuit = self.circuit(Intercom._endpoint_path(url))
+        if not self._allow(circuit):
+            if self.metrics is not None:
+                self.metrics.increment(
+                    'circuit_rejected_total', endpoint=circuit.endpoint)
+            response = None
+            if self.fallback is not None:
+                response = self.fallback(method, url, params, data, headers)
+            if response is None:
+                retry_after = self.recovery_timeout - (
+                    self.clock() - circuit.opened_at)
+                raise CircuitOpenError(circuit.endpoint, max(retry_after, 0))
+            return response
+        try:
+            response = self.transport.send(
+                method, url, params=params, data=data, headers=headers,
+                auth=auth, timeout=timeout)
+        except Exception:
+            self._record(circuit, True)
+            raise
+        self._record(
+            circuit, response.status_code in self.failure_statuses)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+OutboxEntry = collections.namedtuple(
+    'OutboxEntry', ['method', 'url', 'params', 'data', 'headers'])
+
+
+class Outbox(object):
+    """ A circuit breaker fallback that queues writes (POST, PUT and
+    DELETE), and answers them with an empty 202 response. GETs, and
+    writes once maxsize are queued, are not accepted. The writes are sent
+    with the headers, and so the idempotency keys, they had. """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.local = threading.local()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __call__(self, method, url, params=None, data=None, headers=None):
+        if method == 'GET' or getattr(self.local, 'flushing', False):
+            return None
+        with self.lock:
+            if len(self.queue) >= self.maxsize:
+                return None
+            self.queue.append(OutboxEntry(method, url, params, data, headers))
+        return Response(202, {}, b'')
+
+    def flush(self, transport=None):
+        """ Send the queued requests in order, by default with
+        ``Intercom.transport``, stopping at the first that fails with an
+        error or a 5xx response; it stays queued. Requests rejected with
+        another error status are logged and dropped. Returns the number
+        of requests sent. """
+        if transport is None:
+            transport = Intercom.transport
+        sent = 0
+        # stop an open circuit from queueing the requests again
+        self.local.flushing = True
+        try:
+            while True:
+                timeout = Intercom._request_timeout()
+                with self.lock:
+                    if not self.queue:
+                        break
+                    entry = self.queue.popleft()
+                try:
+                    response = transport.send(
+                        entry.method, entry.url, params=entry.params,
+                        data=entry.data, headers=entry.headers,
+                        auth=Intercom._get_auth(), timeout=timeout)
+                    failed = response.status_code >= 500
+                except CircuitOpenError:
+                    failed = True
+                except Exception:
+                    logger.exception("outbox flush failed")
+                    failed = True
+                if failed:
+                    with self.lock:
+                        self.queue.appendleft(entry)
+                    break
+                if response.status_code >= 400:
+                    logger.warning(
+                        "outbox dropped %s %s: %s", entry.method, entry.url,
+                        response.status_code)
+                sent += 1
+        finally:
+            self.local.flushing = False
+        return sent
@@ -0,0 +1,93 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" codec module
+
+Request bodies are encoded, and response bodies decoded, by the codec in
+``Intercom.codec``. By default this is the standard library ``json``
+module. A faster library can be chosen, by name or as the fastest that is
+installed; note that they may round-trip floats and large integers
+differently:
+
+>>> from intercom import Intercom
+>>> from intercom.codec import fastest_codec
+>>> Intercom.codec = fastest_codec()                # doctest: +SKIP
+
+>>> from intercom.codec import get_codec
+>>> codec = get_codec('json')
+>>> codec.dumps({'email': 'somebody@example.com'})
+'{"email":"somebody@example.com"}'
+>>> codec.loads(b'{"unread_messages": 1}')
+{u'unread_messages': 1}
+
+"""
+
+import json
+
+# In order of preference.
+CODECS = ('orjson', 'ujson', 'simplejson', 'json')
+
+
+class Codec(object):
+    """ A named pair of JSON ``loads`` and ``dumps`` functions.
+
+    ``loads`` accepts the raw response body (bytes), and ``dumps`` returns
+    a str or bytes suitable for a request body. """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '<Codec %s>' % (self.name)
+
+
+def _orjson():
+    import orjson
+    return Codec('orjson', orjson.loads, orjson.dumps)
+
+
+def _ujson():
+    import ujson
+    return Codec('ujson', ujson.loads, ujson.dumps)
+
+
+def _simplejson():
+    import simplejson
+    return Codec(
+        'simplejson', simplejson.loads,
+        lambda obj: simplejson.dumps(obj, separators=(',', ':')))
+
+
+def _json():
+    return Codec(
+        'json', json.loads, lambda obj: json.dumps(obj, separators=(',', ':')))
+
+_FACTORIES = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'simplejson': _simplejson,
+    'json': _json,
+}
+
+
+def get_codec(name='json'):
+    """ Returns the codec with the specified name, by default the standard
+    library json module.
+
+    An ImportError is raised if the named codec is not installed, and a
+    ValueError if the name is unknown. """
+    if name not in _FACTORIES:
+        raise ValueError("unknown codec: %s" % (name))
+    return _FACTORIES[name]()
+
+
+def fastest_codec():
+    """ Returns the first codec in CODECS that can be imported. """
+    for name in CODECS:
+        try:
+            return _FACTORIES[name]()
+        except ImportError:
+            pass
@@ -76,15 +76,58 @@ class Company(CompanyId):
         u'My company'
 
         """
+        with Intercom.tracer.span('Company.all'):
+            return list(cls.iter_all())
+
+    @classmethod
+    def iter_all(cls, raw=False, per_page=None, stream=False):
+        """ Yields each of the Companies, fetching a page at a time, so that
+        only one page is held in memory. If raw is True the dicts from the
+        API are yielded rather than Company objects.
+        If stream is True the records of each page are decoded one at a
+        time as they are yielded; see the streaming module.
+
+        >>> companies = Company.iter_all()
+        >>> next(companies).name
+        u'My company'
+
+        """
+        if stream:
+            for record in cls._iter_streamed(raw, per_page):
+                yield record
+            return
+        page = 1
+        total_pages = 1
+        tracer = Intercom.tracer
+        while page <= total_pages:
+            with tracer.span('page', page=page):
+                resp = Intercom.get_companies(page=page, per_page=per_page)
+                page += 1
+                total_pages = resp.get('total_pages', 0)
+                records = resp['companies']
+                del resp
+                if not raw:
+                    with tracer.span('build'):
+                        # replace in place, so each dict can be freed as
+                        # soon as it has been copied
+                        for index, record in enumerate(records):
+                            records[index] = cls(record)
+            for record in records:
+                yield record
+
+    @classmethod
+    def _iter_streamed(cls, raw, per_page):
+        """ iter_all, decoding each record as it is yielded. """
         page = 1
         total_pages = 1
-        companies = []
         while page <= total_pages:
-            resp = Intercom.get_companies(page=page)
+            with Intercom.tracer.span('page', page=page):
+                records = Intercom._list_page(
+                    'companies', 'companies', page=page, per_page=per_page)
             page += 1
-            total_pages = resp.get('total_pages', 0)
-            companies.extend([cls(u) for u in resp['companies']])
-        return companies
+            for record in records:
+                yield record if raw else cls(record)
+            total_pages = records.fields.get('total_pages', 0)
 
     def save(self):
         """ Creates or updates a Company.
@@ -0,0 +1,505 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" concurrency module
+
+Runs calls to the API concurrently, with the number in flight adapted to
+how the API is coping. The bulk helpers use it, and it can be used
+directly:
+
+>>> from intercom import User
+>>> from intercom.concurrency import AdaptiveLimiter
+>>> from intercom.concurrency import map_concurrent
+>>> limiter = AdaptiveLimiter(initial=4, maximum=32)
+>>> for result in map_concurrent(
+...         lambda user_id: User.find(user_id=user_id),
+...         user_ids, limiter=limiter):            # doctest: +SKIP
+...     print result.item, result.error
+>>> limiter.limit                                   # doctest: +SKIP
+12
+
+The limiter uses additive increase, multiplicative decrease (AIMD): the
+limit grows by one each time a limit's worth of calls succeed, and is cut
+by ``backoff`` when a call is rejected with a 429, 502 or 503, or takes
+``tolerance`` times longer than the average.
+
+A RateLimiter additionally caps the rate at which calls are started, to
+stay within the API's rate limit, and a call rejected with a 429, 502 or
+503 can be retried after an exponential backoff.
+
+A KeyedExecutor runs writes for the same user in the order they were
+submitted, and those for different users concurrently, so that a stale
+write cannot overtake a later one. ``submit_user`` keys a call by the
+user it writes, e.g. with ``User.save`` or ``Event.create``:
+
+>>> from intercom import Event
+>>> from intercom.concurrency import KeyedExecutor
+>>> executor = KeyedExecutor(workers=8)
+>>> future = executor.submit_user(user, user.save)  # doctest: +SKIP
+>>> future = executor.submit_user(
+...     user, Event.create, event_name='upgraded',
+...     email=user.email)                           # doctest: +SKIP
+>>> future.result(timeout=10)                       # doctest: +SKIP
+
+A user must be identified the same way, by user_id or else email, in each
+call, for their writes to be ordered.
+
+"""
+
+import collections
+import random
+import sys
+import threading
+import time
+
+from timeit import default_timer
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from . import deadline
+from . import hooks
+from . import idempotency
+from .intercom import BadGatewayError
+from .intercom import DeadlineExceeded
+from .intercom import Intercom
+from .intercom import RateLimitError
+from .intercom import ServiceUnavailableError
+
+
+class BatchResult(collections.namedtuple(
+        'BatchResult', ['item', 'result', 'error'])):
+    """ The outcome of a call on an item. error is the exception raised,
+    if any, and result is then None. """
+    __slots__ = ()
+
+
+OVERLOAD_ERRORS = (RateLimitError, ServiceUnavailableError, BadGatewayError)
+# the overload errors that mean the API did not act on a request, so that
+# a write may be retried; a 502 may come after it has
+REJECTED_ERRORS = (RateLimitError, ServiceUnavailableError)
+
+
+class AdaptiveLimiter(object):
+    """ Limits the number of calls in flight, adapting the limit with
+    AIMD.
+
+    * ``initial``, ``minimum``, ``maximum``: bounds of the limit.
+    * ``backoff``: the limit is multiplied by this on overload.
+    * ``tolerance``: a call this many times slower than the average
+      latency, and at least ``min_spike`` seconds slower, counts as an
+      overload.
+    * ``smoothing``: the weight of each latency in the average.
+
+    If a MetricsCollector is given, the limit is exposed as the gauge
+    ``intercom_concurrency_limit``, labelled with the limiter's name. """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, backoff=0.5,
+                 tolerance=3.0, min_spike=0.05, smoothing=0.1, metrics=None,
+                 name='default'):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.min_spike = min_spike
+        self.smoothing = smoothing
+        self.metrics = metrics
+        self.name = name
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.average = None
+        # overloads seen by calls started before the last decrease are
+        # the same congestion, and don't decrease the limit again
+        self.decreased_at = None
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._report()
+
+    @property
+    def limit(self):
+        """ The number of calls that may be in flight. """
+        return int(self._limit)
+
+    def _report(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge(
+                'concurrency_limit', self.limit, limiter=self.name)
+
+    def acquire(self):
+        """ Wait until a call may start, and return its start time, to be
+        passed to release. """
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        return default_timer()
+
+    def release(self, start, error=None):
+        """ Record the outcome of a call started at start. """
+        latency = default_timer() - start
+        with self.condition:
+            self.in_flight -= 1
+            overloaded = isinstance(error, OVERLOAD_ERRORS) or (
+                error is None and self.average is not None and
+                latency > self.tolerance * self.average and
+                latency - self.average > self.min_spike)
+            if overloaded:
+                if self.decreased_at is None or start > self.decreased_at:
+                    self._limit = max(
+                        self.minimum, self._limit * self.backoff)
+                    self.decreased_at = default_timer()
+            elif error is None:
+                if self._limit < self.maximum:
+                    self._limit = min(
+                        self.maximum, self._limit + 1.0 / self._limit)
+                if self.average is None:
+                    self.average = latency
+                else:
+                    self.average += self.smoothing * (latency - self.average)
+            self.condition.notify_all()
+        self._report()
+
+    def call(self, func, *args, **kwargs):
+        """ Call func within the limit. """
+        start = self.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.release(start, sys.exc_info()[1])
+            raise
+        self.release(start)
+        return result
+
+
+def user_params(user, key='email'):
+    """ Returns the parameters identifying user: a User or dict with a
+    user_id or email, or else a value for the key parameter.
+
+    >>> user_params('ben@example.com')
+    {'email': 'ben@example.com'}
+    >>> user_params('123', key='user_id')
+    {'user_id': '123'}
+
+    """
+    if isinstance(user, dict):
+        if user.get('user_id') is not None:
+            return {'user_id': user['user_id']}
+        return {'email': user.get('email')}
+    return {key: user}
+
+
+class RateLimiter(object):
+    """ A token bucket that lets calls start at rate a second on average,
+    in bursts of up to burst calls. """
+
+    def __init__(self, rate, burst=1, clock=default_timer, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def acquire(self):
+        """ Wait until a call may start. Returns the seconds waited. """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # take the token now, so that waiting threads queue up in turn
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+def retry_delay(retry, backoff, maximum=30.0):
+    """ Returns the seconds to wait before retry (0 for the first): a
+    random time up to backoff doubled on each retry, capped at maximum,
+    so that rejected callers do not all retry at once. """
+    return random.uniform(0, min(backoff * 2 ** retry, maximum))
+
+
+def map_concurrent(func, items, limiter=None, workers=None,
+                   rate_limiter=None, retries=0, backoff=0.5,
+                   retry_on=OVERLOAD_ERRORS, name=None):
+    """ Call func(item) for each of items on up to workers threads, within
+    limiter's limit, and yield a BatchResult for each as it completes.
+    If a RateLimiter is given each call waits for it first.
+
+    A call that raises one of retry_on, by default OVERLOAD_ERRORS, is
+    retried up to retries times, after a retry_delay, as an idempotency
+    Operation. It is not retried if the Deadline would pass first. Calls
+    that write should pass REJECTED_ERRORS.
+
+    items are consumed lazily, and the threads wait while results are not
+    being taken. workers defaults to the limiter's maximum. Each call is
+    traced as an ``item`` span. If name is given they are the children of
+    a span of that name for the whole operation, which is a child of the
+    current span; otherwise the current span is their parent.
+
+    The current Deadline applies in the threads too. Once it has passed no
+    more items are started, and DeadlineExceeded is raised after the
+    results of those already started. """
+    if limiter is None:
+        limiter = AdaptiveLimiter()
+    if workers is None:
+        workers = limiter.maximum
+    results = queue.Queue(maxsize=workers * 2)
+    items = iter(items)
+    lock = threading.Lock()
+    stopped = threading.Event()
+    tracer = Intercom.tracer
+    span = tracer.current()
+    operation_span = None
+    if name is not None and tracer.active:
+        span = operation_span = tracer.start(name, span)
+    active = deadline.current()
+    expired = []
+
+    def put(result):
+        while not stopped.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def attempt(item, number, queued):
+        # queued until the rate and concurrency limits let it start
+        with hooks.Attempt(number, default_timer() - queued):
+            return func(item)
+
+    def call(item):
+        with tracer.span('item') as item_span:
+            return retried(item, item_span)
+
+    def retried(item, item_span):
+        # a retry sends the writes with the keys they had
+        operation = idempotency.Operation()
+        retry = 0
+        while True:
+            queued = default_timer()
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            item_span.set_attribute('attempts', retry + 1)
+            try:
+                with operation:
+                    return limiter.call(attempt, item, retry + 1, queued)
+            except retry_on:
+                if retry >= retries:
+                    raise
+                delay = retry_delay(retry, backoff)
+                if active is not None and active.remaining() <= delay:
+                    raise
+                stopped.wait(delay)
+                if stopped.is_set():
+                    raise
+                retry += 1
+
+    def work():
+        while not stopped.is_set():
+            if active is not None and active.expired:
+                expired.append(True)
+                break
+            with lock:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                except Exception:
+                    put(BatchResult(None, None, sys.exc_info()[1]))
+                    break
+            try:
+                put(BatchResult(item, call(item), None))
+            except Exception:
+                put(BatchResult(item, None, sys.exc_info()[1]))
+
+    def run():
+        try:
+            with tracer.activate(span):
+                with deadline.activate(active):
+                    work()
+        finally:
+            # even on e.g. SystemExit, so that the results end
+            put(None)
+
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    running = len(threads)
+    try:
+        while running:
+            result = results.get()
+            if result is None:
+                running -= 1
+            else:
+                yield result
+    finally:
+        stopped.set()
+        if operation_span is not None:
+            tracer.finish(operation_span)
+    if expired:
+        raise DeadlineExceeded("Deadline exceeded.")
+
+
+def user_key(user, key='email'):
+    """ Returns a key identifying user, as given to user_params.
+
+    >>> user_key('ben@example.com')
+    'email:ben@example.com'
+
+    """
+    return '%s:%s' % list(user_params(user, key).items())[0]
+
+
+try:
+    _Timeout = TimeoutError
+except NameError:  # Python 2
+    _Timeout = Exception
+
+
+class TimeoutError(_Timeout):
+    """ Raised when a Future is not done within the timeout it was waited
+    for. On Python 3 it is a builtin TimeoutError. """
+    pass
+
+
+class Future(object):
+    """ The outcome of a call submitted to a KeyedExecutor. """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def done(self):
+        """ Returns True once the call has returned or raised. """
+        return self._done.is_set()
+
+    def _set(self, result, error=None):
+        self._result = result
+        self._error = error
+        self._done.set()
+
+    def exception(self, timeout=None):
+        """ Wait up to timeout seconds for the call, and return the
+        exception it raised, or None. Raises TimeoutError if it has not
+        finished by then. """
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise TimeoutError("Timed out waiting for the call.")
+        return self._error
+
+    def result(self, timeout=None):
+        """ Wait up to timeout seconds for the call, and return its result
+        or raise its exception. Raises TimeoutError if it has not finished
+        by then. """
+        error = self.exception(timeout)
+        if error is not None:
+            raise error
+        return self._result
+
+
+class KeyedExecutor(object):
+    """ Runs calls on up to workers threads, those submitted with the same
+    key one at a time, in the order they were submitted. If an
+    AdaptiveLimiter is given the calls are made within its limit.
+
+    The current tracing span and Deadline at submit apply to the call. """
+
+    def __init__(self, workers=8, limiter=None):
+        self.workers = workers
+        self.limiter = limiter
+        self.condition = threading.Condition()
+        # {key: deque of calls, the first of which is running or ready}
+        self.pending = {}
+        self.ready = queue.Queue()
+        self.threads = []
+        self.closed = False
+
+    def submit(self, key, func, *args, **kwargs):
+        """ Call func(*args, **kwargs) once the calls submitted earlier
+        with key have finished, and return its Future. """
+        future = Future()
+        call = (future, func, args, kwargs, Intercom.tracer.current(),
+                deadline.current())
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("executor is shut down")
+            calls = self.pending.get(key)
+            if calls is None:
+                self.pending[key] = collections.deque([call])
+                self.ready.put(key)
+            else:
+                calls.append(call)
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        return future
+
+    def submit_user(self, user, func, *args, **kwargs):
+        """ submit, keyed by the user that func writes: a User, a dict with
+        a user_id or email, or an email. """
+        return self.submit(user_key(user), func, *args, **kwargs)
+
+    def _work(self):
+        while True:
+            key = self.ready.get()
+            if key is None:
+                break
+            with self.condition:
+                call = self.pending[key][0]
+            self._call(*call)
+            with self.condition:
+                calls = self.pending[key]
+                calls.popleft()
+                if calls:
+                    # to the back of the queue, so that no key starves the
+                    # others
+                    self.ready.put(key)
+                else:
+                    del self.pending[key]
+                    self.condition.notify_all()
+
+    def _call(self, future, func, args, kwargs, span, active):
+        with Intercom.tracer.activate(span):
+            with deadline.activate(active):
+                try:
+                    if self.limiter is not None:
+                        result = self.limiter.call(func, *args, **kwargs)
+                    else:
+                        result = func(*args, **kwargs)
+                except Exception:
+                    future._set(None, sys.exc_info()[1])
+                else:
+                    future._set(result)
+
+    def shutdown(self, wait=True):
+        """ Stop accepting calls. If wait is True, wait for those
+        submitted to finish and stop the threads. """
+        with self.condition:
+            self.closed = True
+            if not wait:
+                return
+            while self.pending:
+                self.condition.wait()
+            threads, self.threads = self.threads, []
+        for _ in threads:
+            self.ready.put(None)
+        for thread in threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,96 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" deadline module
+
+A deadline bounds the time taken by an operation made of many calls,
+such as ``User.all`` over thousands of pages, or a bulk helper:
+
+>>> from intercom import User
+>>> from intercom.deadline import Deadline
+>>> with Deadline(60):
+...     users = User.all()                          # doctest: +SKIP
+
+Each request within the block waits at most the time remaining, and once
+the deadline has passed the next request raises DeadlineExceeded rather
+than being sent. The operation stops there, between pages or items.
+
+A deadline can also set the request timeouts within the block, in place
+of ``Intercom.timeout``:
+
+>>> from intercom.transport import Timeout
+>>> with Deadline(60, timeout=Timeout(connect=1, read=5)):
+...     users = User.all()                          # doctest: +SKIP
+
+Deadlines nest, the earliest one applying. They apply to the thread that
+enters them, and to the threads the bulk helpers start for it.
+
+"""
+
+import threading
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+from .transport import Timeout
+
+_local = threading.local()
+
+
+def current():
+    """ Returns the Deadline that applies to this thread, or None. """
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def activate(deadline):
+    """ Apply deadline in this thread, e.g. in a worker thread running
+    part of an operation started elsewhere. """
+    previous = current()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+
+
+class Deadline(object):
+    """ The time by which an operation must finish, seconds from now. """
+
+    def __init__(self, seconds, timeout=None, clock=default_timer):
+        self.clock = clock
+        self.expires = clock() + seconds
+        self.timeout = timeout
+        self.previous = None
+
+    def remaining(self):
+        """ Returns the seconds left, which are negative once the deadline
+        has passed. """
+        return self.expires - self.clock()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def request_timeout(self, default):
+        """ Returns the Timeout for a request: this deadline's timeout, or
+        default, capped at the time remaining. """
+        timeout = self.timeout if self.timeout is not None else default
+        return Timeout.of(timeout).capped(max(self.remaining(), 0))
+
+    def __enter__(self):
+        self.previous = current()
+        if self.previous is not None:
+            self.expires = min(self.expires, self.previous.expires)
+            if self.timeout is None:
+                self.timeout = self.previous.timeout
+        _local.deadline = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.deadline = self.previous
+        self.previous = None
+
+    def __repr__(self):
+        return '<Deadline %.3fs remaining>' % (self.remaining())
@@ -0,0 +1,173 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" dedup module
+
+Drops events that have already been sent, e.g. those delivered more than
+once by an at-least-once producer, before they cost a request:
+
+>>> from intercom import Intercom
+>>> from intercom.dedup import EventFilter
+>>> Intercom.event_filter = EventFilter(
+...     window=3600, error_rate=0.001, max_bytes=1024 * 1024)
+
+An event is the same as one sent before when its name, user, ``created``
+time and metadata are. ``create_event`` sets ``created`` to the time of
+the call if it is not given, so producers should pass the time the event
+happened for their retries to be recognized. An event is claimed before
+it is sent, so that a duplicate sent at the same time is dropped too; the
+claim is released if the event fails to send, for it to be sent again.
+
+The events sent are remembered in Bloom filters, each taking at most
+``max_bytes / 2`` of memory, so an event is remembered for between
+``window`` and twice ``window`` seconds. A filter is replaced early if it
+fills up, before its false positive rate passes ``error_rate``. A false
+positive drops an event that was not a duplicate, at about that rate.
+
+``sent`` and ``duplicates`` count the events checked. If a
+MetricsCollector is given they are also counted there, as
+``intercom_events_sent_total`` and ``intercom_events_deduplicated_total``.
+
+"""
+
+import hashlib
+import json
+import math
+import struct
+import threading
+import time
+
+
+class BloomFilter(object):
+    """ A set of keys, in bits of memory, that may report a key it does
+    not hold at about error_rate once it holds capacity keys. """
+
+    def __init__(self, bits, error_rate):
+        self.bits = max(int(bits), 8)
+        # the best number of hashes, and the keys they allow for
+        # error_rate
+        self.capacity = max(int(
+            self.bits * math.log(2) ** 2 / -math.log(error_rate)), 1)
+        self.hashes = max(int(round(
+            float(self.bits) / self.capacity * math.log(2))), 1)
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # double hashing: the k positions from two 64 bit hashes
+        first, second = struct.unpack(
+            '<QQ', hashlib.md5(key).digest())
+        for index in range(self.hashes):
+            yield (first + index * second) % self.bits
+
+    def __contains__(self, key):
+        array = self.array
+        for position in self._positions(key):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        array = self.array
+        for position in self._positions(key):
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+def event_key(params):
+    """ Returns the key identifying an event, given the create_event
+    parameters. """
+    metadata = params.get('metadata')
+    if metadata:
+        metadata = hashlib.md5(json.dumps(
+            metadata, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return json.dumps([
+        params.get('event_name'), params.get('user_id'), params.get('email'),
+        params.get('created'), metadata]).encode('utf-8')
+
+
+class EventFilter(object):
+    """ Remembers the events sent in the last window seconds, in up to
+    max_bytes of memory. """
+
+    def __init__(self, window=3600.0, error_rate=0.001, max_bytes=1 << 20,
+                 metrics=None, clock=time.time):
+        self.window = window
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.duplicates = 0
+        self.rotations = 0
+        # the keys of the events claimed and being sent
+        self.pending = set()
+        self.previous = None
+        self.current = self._new_filter()
+        self.started = clock()
+
+    def _new_filter(self):
+        return BloomFilter(self.max_bytes * 8 // 2, self.error_rate)
+
+    def _rotate(self, now):
+        """ Replace the older filter with a new one; called with the lock
+        held. """
+        if now - self.started >= 2 * self.window:
+            # neither filter holds an event within the window
+            self.previous = None
+        else:
+            self.previous = self.current
+        self.current = self._new_filter()
+        self.started = now
+        self.rotations += 1
+
+    def _check(self, params, claim):
+        key = event_key(params)
+        with self.lock:
+            now = self.clock()
+            if now - self.started >= self.window:
+                self._rotate(now)
+            duplicate = key in self.pending or key in self.current or (
+                self.previous is not None and key in self.previous)
+            if duplicate:
+                self.duplicates += 1
+            elif claim:
+                self.pending.add(key)
+        if duplicate and self.metrics is not None:
+            self.metrics.increment('events_deduplicated_total')
+        return duplicate
+
+    def seen(self, params):
+        """ Returns True if the event with the create_event params has been
+        sent within the window, or is being sent. """
+        return self._check(params, False)
+
+    def claim(self, params):
+        """ Returns True, and marks the event with the create_event params
+        as being sent, unless seen would return True. The mark is kept by
+        add, or dropped by release. """
+        return not self._check(params, True)
+
+    def release(self, params):
+        """ Drop the mark of claim, as the event was not sent. """
+        key = event_key(params)
+        with self.lock:
+            self.pending.discard(key)
+
+    def add(self, params):
+        """ Record that the event with the create_event params was sent. """
+        key = event_key(params)
+        with self.lock:
+            if self.current.full:
+                self._rotate(self.clock())
+            self.current.add(key)
+            self.pending.discard(key)
+            self.sent += 1
+        if self.metrics is not None:
+            self.metrics.increment('events_sent_total')
@@ -13,8 +13,11 @@ from .user import UserId
 class Event(UserId):
 
     @classmethod
-    def create(cls, event_name=None, user_id=None, email=None, metadata=None):
-        resp = Intercom.create_event(event_name=event_name, user_id=user_id, email=email, metadata=metadata)
+    def create(cls, event_name=None, user_id=None, email=None, metadata=None,
+               created=None):
+        resp = Intercom.create_event(
+            event_name=event_name, user_id=user_id, email=email,
+            metadata=metadata, created=created)
         return Event(resp)
 
     def save(self):
@@ -0,0 +1,693 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" fake_server module
+
+A local, threaded, in-memory stand-in for the parts of the Intercom v1 API
+used by this library: users, companies, tags, events, impressions, notes
+and message threads. It needs no network access, so it is the target for
+integration, load and resilience tests, and for the benchmarks.
+
+>>> from intercom import Intercom, User
+>>> from intercom.fake_server import FakeIntercom
+>>> server = FakeIntercom().start()
+>>> server.seed_users(1200)
+>>> Intercom.api_endpoint = server.url
+>>> len(User.all())
+1200
+>>> server.stop()
+
+Latency, rate limits and errors can be configured:
+
+* ``latency``: seconds added to every response, plus a random amount up
+  to ``jitter`` seconds.
+* ``rate_limit``: requests allowed per second, beyond which a 429 is
+  returned. None for no limit.
+* ``error_rate``: the probability, from 0.0 to 1.0, that a request fails
+  with one of ``error_statuses``.
+* ``fail_next(status, count, path)``: fail the next count requests, to
+  path if specified, with status.
+
+It can also be run from the command line:
+
+::
+
+    python -m intercom.fake_server --port 8000 --users 10000
+
+"""
+
+import itertools
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urlparse import urlparse
+except ImportError:  # Python 3
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import urlparse
+
+MAX_PER_PAGE = 500
+DEFAULT_COMPANIES_PER_PAGE = 50
+
+
+class FakeError(Exception):
+    """ Raised by a route to return an error response. """
+
+    def __init__(self, status, error_type, message):
+        super(FakeError, self).__init__(message)
+        self.status = status
+        self.body = {'error': {'type': error_type, 'message': message}}
+
+
+def make_user(number, custom_attributes=10):
+    """ Returns a synthetic user dict, as created by the API. """
+    created_at = 1270000000 + number
+    return {
+        'user_id': str(number),
+        'email': 'user%s@example.com' % (number),
+        'name': 'User %s' % (number),
+        'created_at': created_at,
+        'last_impression_at': created_at + 3600,
+        'last_request_at': created_at + 3600,
+        'last_seen_ip': '127.0.0.1',
+        'last_seen_user_agent': 'Mozilla/5.0 (X11; Linux x86_64)',
+        'unsubscribed_from_emails': False,
+        'custom_attributes': dict(
+            ('attribute_%s' % (i), i * 1.5) for i in range(custom_attributes)),
+        'location_data': {
+            'city_name': 'Santiago',
+            'country_name': 'Chile',
+            'country_code': 'CHL',
+            'timezone': 'Chile/Continental',
+        },
+        'social_profiles': [{
+            'type': 'twitter',
+            'url': 'http://twitter.com/user%s' % (number),
+            'username': 'user%s' % (number),
+        }],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Passes every request to the FakeIntercom. """
+
+    protocol_version = 'HTTP/1.1'
+    # send each response in one write, without waiting on Nagle's algorithm
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.fake.handle(self)
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    """ Tracks open connections, so that idle keep-alive connections can
+    be closed when the server stops. """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def get_request(self):
+        connection, address = HTTPServer.get_request(self)
+        self.connections.add(connection)
+        return connection, address
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class FakeIntercom(object):
+    """ An in-memory Intercom API served over HTTP on localhost. """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 rate_limit=None, error_rate=0.0, error_statuses=(500, 503),
+                 app_id=None, api_key=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        # when set, requests must use these credentials
+        self.app_id = app_id
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        self.random = random.Random(0)
+        self.reset()
+
+    def reset(self):
+        """ Discard all data, injected failures and request counts. """
+        with self.lock:
+            self.users = {}
+            self.user_order = []
+            self.companies = {}
+            self.company_order = []
+            self.tags = {}
+            self.events = []
+            self.notes = []
+            self.threads = {}
+            self.failures = []
+            # {(method, path): count}
+            self.requests = {}
+            self.ids = itertools.count(1)
+            self.tokens = self.rate_limit
+            self.refilled_at = time.time()
+
+    @property
+    def url(self):
+        """ The API endpoint, to be used as Intercom.api_endpoint. """
+        return 'http://%s:%s/v1/' % (self.host, self.port)
+
+    def start(self):
+        """ Serve requests in a background thread. Returns self. """
+        self.server = _Server((self.host, self.port), _Handler)
+        self.server.fake = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving requests. """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server.close_connections()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, status, count=1, path=None):
+        """ Fail the next count requests with status. If path is specified
+        e.g. 'users/notes', only requests to it fail. """
+        with self.lock:
+            self.failures.extend([(path, status)] * count)
+
+    def request_count(self, method=None, path=None):
+        """ Returns the number of requests received, optionally only those
+        with the method and path. """
+        with self.lock:
+            return sum(
+                count for (m, p), count in self.requests.items()
+                if method in (None, m) and path in (None, p))
+
+    def seed_users(self, count, start=1, **kwargs):
+        """ Create count synthetic users. kwargs are passed to make_user.
+        """
+        with self.lock:
+            for number in range(start, start + count):
+                self._save_user(make_user(number, **kwargs))
+
+    def seed_companies(self, count, start=1):
+        """ Create count synthetic companies. """
+        with self.lock:
+            for number in range(start, start + count):
+                self._save_company({
+                    'company_id': str(number),
+                    'name': 'Company %s' % (number),
+                    'monthly_spend': number,
+                })
+
+    def seed_threads(self, per_user, messages=3):
+        """ Create per_user message threads, each with messages messages,
+        for every user. """
+        with self.lock:
+            for intercom_id in self.user_order:
+                user = self.users[intercom_id]
+                for _ in range(per_user):
+                    self.create_message_thread(
+                        {'user_id': user.get('user_id'),
+                         'email': user.get('email'), 'body': 'Hello'})
+                    thread = self.threads[max(self.threads)]
+                    for number in range(1, messages):
+                        thread['messages'].append(self._message(
+                            'Reply %s' % (number), user, number % 2 == 1))
+
+    # Request handling
+
+    def handle(self, handler):
+        """ Respond to a request from _Handler. """
+        parsed = urlparse(handler.path)
+        path = parsed.path.strip('/')
+        if path.startswith('v1/'):
+            path = path[3:]
+        params = dict((k, v[-1]) for k, v in parse_qs(parsed.query).items())
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        try:
+            if body:
+                params.update(json.loads(body.decode('utf-8')))
+            status, payload, headers = self.dispatch(
+                handler.command, path, params,
+                handler.headers.get('Authorization'))
+        except FakeError as exc:
+            status, payload, headers = exc.status, exc.body, {}
+        except ValueError as exc:
+            status, payload, headers = 400, {'error': {
+                'type': 'bad_request', 'message': str(exc)}}, {}
+        except Exception as exc:
+            status, payload, headers = 500, {'error': {
+                'type': 'internal_error', 'message': str(exc)}}, {}
+
+        content = b''
+        if payload is not None:
+            content = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            handler.send_header(name, str(value))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def dispatch(self, method, path, params, authorization=None):
+        """ Returns (status, payload, headers) for a request. """
+        with self.lock:
+            key = (method, path)
+            self.requests[key] = self.requests.get(key, 0) + 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.random() * self.jitter)
+
+        headers = {}
+        if self.rate_limit is not None:
+            remaining = self._take_token()
+            headers = {
+                'X-RateLimit-Limit': self.rate_limit,
+                'X-RateLimit-Remaining': max(int(remaining), 0),
+                'X-RateLimit-Reset': int(time.time()) + 1,
+            }
+            if remaining < 0:
+                raise FakeError(429, 'rate_limit_exceeded', 'Rate limited')
+        self._injected_failure(path)
+        if self.app_id is not None and \
+                authorization != self._authorization():
+            raise FakeError(401, 'unauthorized', 'Invalid credentials')
+
+        route = self.ROUTES.get((method, path))
+        if route is None:
+            raise FakeError(404, 'not_found', 'No route %s %s' % key)
+        with self.lock:
+            status, payload = route(self, params)
+        return status, payload, headers
+
+    def _take_token(self):
+        """ Takes a token from the rate limit bucket, and returns the number
+        left, which is negative if there were none. """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(
+                self.rate_limit,
+                self.tokens + (now - self.refilled_at) * self.rate_limit)
+            self.refilled_at = now
+            if self.tokens < 1:
+                return -1
+            self.tokens -= 1
+            return self.tokens
+
+    def _injected_failure(self, path):
+        """ Raises a FakeError for a queued or random failure. """
+        status = None
+        with self.lock:
+            for index, (fail_path, fail_status) in enumerate(self.failures):
+                if fail_path in (None, path):
+                    status = fail_status
+                    del self.failures[index]
+                    break
+            if status is None and self.error_rate and \
+                    self.random.random() < self.error_rate:
+                status = self.random.choice(self.error_statuses)
+        if status is not None:
+            raise FakeError(status, 'injected_error', 'Injected failure')
+
+    def _authorization(self):
+        """ The expected Authorization header. """
+        from .intercom import BasicAuth
+        return BasicAuth(self.app_id, self.api_key).header
+
+    # Storage; these are called with the lock held.
+
+    def _find_user(self, params, required=True):
+        """ Returns the user identified by user_id or email. """
+        user = None
+        if params.get('user_id') is not None:
+            user = self.users.get(('user_id', str(params['user_id'])))
+        elif params.get('email') is not None:
+            user = self.users.get(('email', params['email']))
+        if user is None and required:
+            raise FakeError(404, 'not_found', 'The User was not found')
+        return user
+
+    def _save_user(self, params):
+        """ Creates or updates a user. """
+        if params.get('user_id') is None and params.get('email') is None:
+            raise FakeError(400, 'bad_request', 'user_id or email required')
+        user = self._find_user(params, required=False)
+        if user is None:
+            user = {
+                'intercom_id': '%024x' % (next(self.ids)),
+                'created_at': int(time.time()),
+                'session_count': 0,
+                'custom_data': {},
+                'company_ids': [],
+                'unread_messages': 0,
+            }
+            self.user_order.append(user['intercom_id'])
+        for name, value in params.items():
+            if name in ('custom_data', 'custom_attributes'):
+                user['custom_data'].update(value or {})
+            elif name == 'companies':
+                for company in value:
+                    company = self._save_company(company)
+                    if company['id'] not in user['company_ids']:
+                        user['company_ids'].append(company['id'])
+            elif name == 'last_request_at':
+                user['last_impression_at'] = value
+            else:
+                user[name] = value
+        user['custom_attributes'] = user['custom_data']
+        self.users[user['intercom_id']] = user
+        for key in ('user_id', 'email'):
+            if user.get(key) is not None:
+                self.users[(key, str(user[key]))] = user
+        return user
+
+    def _save_company(self, params):
+        """ Creates or updates a company. """
+        company_id = params.get('company_id', params.get('id'))
+        if company_id is None:
+            raise FakeError(400, 'bad_request', 'company_id required')
+        company = self.companies.get(str(company_id))
+        if company is None:
+            company = {
+                'id': '%024x' % (next(self.ids)),
+                'company_id': str(company_id),
+                'created_at': int(time.time()),
+                'session_count': 0,
+                'user_count': 0,
+                'custom_data': {},
+            }
+            self.companies[company['company_id']] = company
+            self.company_order.append(company['company_id'])
+        for name, value in params.items():
+            if name in ('custom_data', 'custom_attributes'):
+                company['custom_data'].update(value or {})
+            elif name not in ('id', 'company_id'):
+                company[name] = value
+        return company
+
+    def _page(self, items, params, per_page):
+        """ Returns (page, total_pages, items on the page). """
+        page = max(int(params.get('page', 1)), 1)
+        per_page = min(max(int(params.get('per_page', per_page)), 1),
+                       MAX_PER_PAGE)
+        total_pages = (len(items) + per_page - 1) // per_page
+        start = (page - 1) * per_page
+        return page, total_pages, items[start:start + per_page]
+
+    def _user_response(self, user):
+        """ A user as returned by the API. """
+        response = dict(user)
+        response.pop('unread_messages', None)
+        return response
+
+    # Routes; these are called with the lock held, and return
+    # (status, payload).
+
+    def get_users(self, params):
+        if 'user_id' in params or 'email' in params:
+            return 200, self._user_response(self._find_user(params))
+        order = self.user_order
+        if params.get('tag_name') or params.get('tag_id'):
+            tag = self.tags.get(params.get('tag_name')) or dict(
+                (t['id'], t) for t in self.tags.values()).get(
+                    params.get('tag_id'))
+            tagged = tag['users'] if tag else set()
+            order = [i for i in order if i in tagged]
+        page, total_pages, ids = self._page(order, params, MAX_PER_PAGE)
+        return 200, {
+            'users': [self._user_response(self.users[i]) for i in ids],
+            'total_count': len(order),
+            'page': page,
+            'next_page': page + 1 if page < total_pages else None,
+            'previous_page': page - 1 if page > 1 else None,
+            'total_pages': total_pages,
+        }
+
+    def save_user(self, params):
+        return 200, self._user_response(self._save_user(params))
+
+    def delete_user(self, params):
+        user = self._find_user(params)
+        self.user_order.remove(user['intercom_id'])
+        for key in list(self.users):
+            if self.users[key] is user:
+                del self.users[key]
+        return 200, self._user_response(user)
+
+    def get_companies(self, params):
+        if 'company_id' in params:
+            company = self.companies.get(str(params['company_id']))
+        elif 'name' in params:
+            company = dict(
+                (c.get('name'), c) for c in self.companies.values()).get(
+                    params['name'])
+        else:
+            page, total_pages, ids = self._page(
+                self.company_order, params, DEFAULT_COMPANIES_PER_PAGE)
+            return 200, {
+                'type': 'company.list',
+                'companies': [self.companies[i] for i in ids],
+                'total_count': len(self.company_order),
+                'page': page,
+                'total_pages': total_pages,
+            }
+        if company is None:
+            raise FakeError(404, 'not_found', 'The Company was not found')
+        return 200, company
+
+    def save_company(self, params):
+        return 200, self._save_company(params)
+
+    def get_tag(self, params):
+        tag = self.tags.get(params.get('name'))
+        if tag is None:
+            raise FakeError(404, 'not_found', 'The Tag was not found')
+        return 200, self._tag_response(tag)
+
+    def save_tag(self, params):
+        name = params.get('name')
+        if not name:
+            raise FakeError(400, 'bad_request', 'name required')
+        tag = self.tags.get(name)
+        if tag is None:
+            tag = self.tags[name] = {
+                'id': '%024x' % (next(self.ids)), 'name': name,
+                'segment': False, 'users': set()}
+        users = [self.users.get(('user_id', str(u)))
+                 for u in params.get('user_ids') or []]
+        users += [self.users.get(('email', e))
+                  for e in params.get('emails') or []]
+        ids = set(u['intercom_id'] for u in users if u is not None)
+        if params.get('tag_or_untag') == 'untag':
+            tag['users'] -= ids
+        else:
+            tag['users'] |= ids
+        return 200, self._tag_response(tag)
+
+    def _tag_response(self, tag):
+        return {
+            'id': tag['id'], 'name': tag['name'], 'segment': tag['segment'],
+            'tagged_user_count': len(tag['users'])}
+
+    def create_event(self, params):
+        if not params.get('event_name'):
+            raise FakeError(400, 'bad_request', 'event_name required')
+        self.events.append(params)
+        return 202, None
+
+    def create_impression(self, params):
+        user = self._save_user(dict(
+            (k, params[k]) for k in ('user_id', 'email') if k in params))
+        user['session_count'] += 1
+        user['last_impression_at'] = int(time.time())
+        if params.get('user_ip'):
+            user['last_seen_ip'] = params['user_ip']
+        if params.get('user_agent'):
+            user['last_seen_user_agent'] = params['user_agent']
+        return 200, {'unread_messages': user['unread_messages']}
+
+    def create_note(self, params):
+        user = self._find_user(params)
+        note = {
+            'html': '<p>%s</p>' % (params.get('body') or ''),
+            'created_at': int(time.time()),
+            'user': self._user_response(user),
+        }
+        self.notes.append(note)
+        return 200, note
+
+    def _message(self, body, user, is_admin=False):
+        return {
+            'created_at': int(time.time()),
+            'url': None,
+            'html': '<p>%s</p>' % (body or ''),
+            'subject': '',
+            'from': {
+                'email': user.get('email'),
+                'user_id': user.get('user_id'),
+                'name': user.get('name'),
+                'is_admin': is_admin,
+                'avatar': {},
+            },
+        }
+
+    def get_message_threads(self, params):
+        user = self._find_user(params)
+        if params.get('thread_id') is not None:
+            thread = self.threads.get(int(params['thread_id']))
+            if thread is None or thread['owner'] != user['intercom_id']:
+                raise FakeError(404, 'not_found', 'The Thread was not found')
+            return 200, self._thread_response(thread)
+        return 200, [
+            self._thread_response(t) for t in sorted(
+                self.threads.values(), key=lambda t: t['thread_id'])
+            if t['owner'] == user['intercom_id']]
+
+    def create_message_thread(self, params):
+        user = self._find_user(params)
+        thread_id = next(self.ids)
+        now = int(time.time())
+        self.threads[thread_id] = {
+            'thread_id': thread_id,
+            'message_id': thread_id,
+            'message_type': 'conversation',
+            'created_by_user': True,
+            'created_at': now,
+            'updated_at': now,
+            'read': True,
+            'owner': user['intercom_id'],
+            'messages': [self._message(params.get('body'), user)],
+        }
+        return 200, self._thread_response(self.threads[thread_id])
+
+    def reply_message_thread(self, params):
+        user = self._find_user(params)
+        thread = self.threads.get(int(params.get('thread_id') or 0))
+        if thread is None or thread['owner'] != user['intercom_id']:
+            raise FakeError(404, 'not_found', 'The Thread was not found')
+        if params.get('body'):
+            thread['messages'].append(self._message(params['body'], user))
+            thread['updated_at'] = int(time.time())
+        if params.get('read') is not None:
+            thread['read'] = params['read']
+        return 200, self._thread_response(thread)
+
+    def admin_reply(self, thread_id, body, admin=None):
+        """ Add a reply from an admin to a thread, as if it was sent from
+        the Intercom web app. """
+        admin = admin or {'name': 'Admin', 'email': 'admin@example.com'}
+        with self.lock:
+            thread = self.threads[thread_id]
+            thread['messages'].append(self._message(body, admin, True))
+            thread['updated_at'] = int(time.time())
+            thread['read'] = False
+            self.users[thread['owner']]['unread_messages'] += 1
+
+    def _thread_response(self, thread):
+        response = dict(thread)
+        del response['owner']
+        response['messages'] = list(thread['messages'])
+        return response
+
+    ROUTES = {
+        ('GET', 'users'): get_users,
+        ('POST', 'users'): save_user,
+        ('PUT', 'users'): save_user,
+        ('DELETE', 'users'): delete_user,
+        ('GET', 'companies'): get_companies,
+        ('POST', 'companies'): save_company,
+        ('PUT', 'companies'): save_company,
+        ('GET', 'tags'): get_tag,
+        ('POST', 'tags'): save_tag,
+        ('PUT', 'tags'): save_tag,
+        ('POST', 'events'): create_event,
+        ('POST', 'users/impressions'): create_impression,
+        ('POST', 'users/notes'): create_note,
+        ('GET', 'users/message_threads'): get_message_threads,
+        ('POST', 'users/message_threads'): create_message_thread,
+        ('PUT', 'users/message_threads'): reply_message_thread,
+    }
+
+
+def main(argv=None):
+    """ Run a FakeIntercom in the foreground. """
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--users', type=int, default=0,
+                        help='number of synthetic users to create')
+    parser.add_argument('--companies', type=int, default=0,
+                        help='number of synthetic companies to create')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='number of message threads for each user')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+    fake = FakeIntercom(
+        args.host, args.port, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, error_rate=args.error_rate)
+    fake.seed_users(args.users)
+    fake.seed_companies(args.companies)
+    fake.seed_threads(args.threads)
+    fake.start()
+    print('Serving the Intercom API on %s' % (fake.url))
+    sys.stdout.flush()
+    try:
+        while fake.thread.is_alive():
+            fake.thread.join(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" hedging module
+
+Hedged requests cut the tail latency of GETs: if a GET has not been
+answered after a delay, a second identical request is sent, and the
+first response to arrive is used. It wraps the current transport:
+
+>>> from intercom import Intercom
+>>> from intercom.hedging import HedgedTransport
+>>> Intercom.transport = HedgedTransport(
+...     Intercom.transport, percentile=0.95, max_rate=0.05)
+
+The delay is the ``percentile`` latency of the recent GETs to the same
+endpoint, so that only the slowest requests are hedged. Until enough
+latencies have been observed ``initial_delay`` is used.
+
+Hedges are limited to ``max_rate`` of the GETs sent: each GET earns
+``max_rate`` of a hedge, and a hedge is only sent when a whole one has
+been earned. When the API is slow for everyone, the earned hedges run out
+and the load is not amplified beyond that rate.
+
+POST, PUT and DELETE requests are not idempotent, and are sent as they
+are.
+
+"""
+
+import collections
+import threading
+
+from timeit import default_timer
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from .intercom import Intercom
+from .transport import Transport
+
+
+class LatencyWindow(object):
+    """ The latencies of the most recent requests to an endpoint. """
+
+    def __init__(self, size=1000, percentile=0.95, min_samples=20,
+                 refresh=32):
+        self.samples = collections.deque(maxlen=size)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        # the percentile is recomputed every refresh observations
+        self.refresh = refresh
+        self.pending = 0
+        self.value = None
+        self.lock = threading.Lock()
+
+    def observe(self, latency):
+        """ Add the latency of a request, in seconds. """
+        with self.lock:
+            self.samples.append(latency)
+            self.pending += 1
+            if self.pending >= self.refresh or (
+                    self.value is None and
+                    len(self.samples) >= self.min_samples):
+                self.pending = 0
+                ordered = sorted(self.samples)
+                self.value = ordered[
+                    min(int(len(ordered) * self.percentile),
+                        len(ordered) - 1)]
+
+    def delay(self):
+        """ Returns the percentile latency, or None if there are too few
+        samples. """
+        return self.value
+
+
+class _Workers(object):
+    """ Daemon threads that run the attempts, started as needed. """
+
+    def __init__(self, limit):
+        self.limit = limit
+        # handed to idle threads, one for each taken from idle
+        self.tasks = queue.Queue()
+        # waiting for a thread once limit are busy
+        self.backlog = collections.deque()
+        self.lock = threading.Lock()
+        self.threads = 0
+        self.idle = 0
+
+    def submit(self, func, *args):
+        task = (func, args)
+        with self.lock:
+            if self.idle:
+                # reserve the idle thread before another submit sees it
+                self.idle -= 1
+                self.tasks.put(task)
+                return
+            if self.threads >= self.limit:
+                self.backlog.append(task)
+                return
+            self.threads += 1
+        thread = threading.Thread(target=self.run, args=(task,))
+        thread.daemon = True
+        thread.start()
+
+    def run(self, task):
+        while True:
+            func, args = task
+            func(*args)
+            with self.lock:
+                if self.backlog:
+                    task = self.backlog.popleft()
+                    continue
+                self.idle += 1
+            task = self.tasks.get()
+
+
+class HedgedTransport(Transport):
+    """ Sends GETs with another transport, hedging the slow ones.
+
+    * ``percentile``: hedge GETs slower than this fraction of recent GETs.
+    * ``max_rate``: the largest fraction of GETs that may be hedged.
+    * ``initial_delay``: seconds before hedging, until ``min_samples``
+      latencies have been observed for an endpoint.
+    * ``min_delay``: never hedge sooner than this.
+    * ``workers``: the most threads sending requests.
+
+    ``requests``, ``hedges`` and ``hedge_wins`` count the GETs sent, those
+    that were hedged, and those answered by the hedge. If a
+    MetricsCollector is given they are also counted there, as
+    ``intercom_hedges_total`` and ``intercom_hedge_wins_total``. """
+
+    def __init__(self, transport, percentile=0.95, max_rate=0.05,
+                 initial_delay=1.0, min_delay=0.01, min_samples=20,
+                 window=1000, workers=32, metrics=None):
+        self.transport = transport
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.metrics = metrics
+        self.workers = _Workers(workers)
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.budget = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def latency(self, endpoint):
+        """ Returns the LatencyWindow for endpoint. """
+        with self.lock:
+            window = self.windows.get(endpoint)
+            if window is None:
+                window = self.windows[endpoint] = LatencyWindow(
+                    self.window, self.percentile, self.min_samples)
+            return window
+
+    def _earn(self):
+        """ Count a GET, and earn max_rate of a hedge. """
+        with self.lock:
+            self.requests += 1
+            # a burst of hedges is limited to what 1 / max_rate GETs earn
+            self.budget = min(self.budget + self.max_rate, 1.0)
+
+    def _spend(self):
+        """ Returns True if a hedge may be sent. """
+        with self.lock:
+            if self.budget < 1.0:
+                return False
+            self.budget -= 1.0
+            self.hedges += 1
+            return True
+
+    def _attempt(self, results, number, window, method, url, kwargs):
+        start = default_timer()
+        try:
+            response = self.transport.send(method, url, **kwargs)
+        except Exception as exc:
+            results.put((number, None, exc))
+            return
+        window.observe(default_timer() - start)
+        results.put((number, response, None))
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        kwargs = {'params': params, 'data': data, 'headers': headers,
+                  'auth': auth, 'timeout': timeout}
+        if method != 'GET':
+            return self.transport.send(method, url, **kwargs)
+        endpoint = Intercom._endpoint_path(url)
+        window = self.latency(endpoint)
+        delay = window.delay()
+        if delay is None:
+            delay = self.initial_delay
+        delay = max(delay, self.min_delay)
+        self._earn()
+
+        results = queue.Queue()
+        self.workers.submit(
+            self._attempt, results, 1, window, method, url, kwargs)
+        pending = 1
+        try:
+            outcome = results.get(timeout=delay)
+        except queue.Empty:
+            if self._spend():
+                self.workers.submit(
+                    self._attempt, results, 2, window, method, url, kwargs)
+                pending = 2
+                if self.metrics is not None:
+                    self.metrics.increment('hedges_total', endpoint=endpoint)
+            outcome = results.get()
+        pending -= 1
+        if outcome[2] is not None and pending:
+            # the other attempt may still succeed
+            other = results.get()
+            if other[2] is None:
+                outcome = other
+        number, response, error = outcome
+        if error is not None:
+            raise error
+        if number == 2:
+            with self.lock:
+                self.hedge_wins += 1
+            if self.metrics is not None:
+                self.metrics.increment('hedge_wins_total', endpoint=endpoint)
+        return response
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,167 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" hooks module
+
+Callbacks can be registered to observe every request sent by
+``Intercom._call``. Each callback receives a ``RequestInfo`` describing
+the request, and the response or error once there is one.
+
+>>> from intercom import Intercom
+>>> def log_request(info):
+...     print info.method, info.endpoint, info.status_code
+>>> Intercom.hooks.register('after_response', log_request)
+>>> Intercom.hooks.unregister('after_response', log_request)
+
+There are three events:
+
+* ``before_request``: the request is about to be sent.
+* ``after_response``: a response has arrived, whatever its status code.
+* ``on_error``: the call is raising an error, either because the request
+  could not be sent or because the response has an error status code.
+
+When nothing is registered the only cost to a call is a single attribute
+check.
+
+The bulk helpers send each try of an item within an ``Attempt``, which
+sets the ``attempt`` and ``queue_time`` of its requests.
+
+"""
+
+import logging
+import threading
+
+from timeit import default_timer
+
+BEFORE_REQUEST = 'before_request'
+AFTER_RESPONSE = 'after_response'
+ON_ERROR = 'on_error'
+EVENTS = (BEFORE_REQUEST, AFTER_RESPONSE, ON_ERROR)
+
+logger = logging.getLogger('intercom')
+
+_local = threading.local()
+
+
+def current_attempt():
+    """ Returns the Attempt that applies to this thread, or None. """
+    return getattr(_local, 'attempt', None)
+
+
+class Attempt(object):
+    """ A try of a call that may be retried: number is 1 for the first,
+    and queue_time the seconds it waited to start. The requests sent
+    within it, in this thread, have its number as their ``attempt``, and
+    the first has its queue_time. """
+
+    def __init__(self, number=1, queue_time=0.0):
+        self.number = number
+        self.queue_time = queue_time
+        self.previous = None
+
+    def take_queue_time(self):
+        """ Returns the queue_time, once. """
+        queue_time, self.queue_time = self.queue_time, 0.0
+        return queue_time
+
+    def __enter__(self):
+        self.previous = current_attempt()
+        _local.attempt = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.attempt = self.previous
+        self.previous = None
+
+
+class RequestInfo(object):
+    """ The timing and outcome of a single API request.
+
+    * ``method``: the HTTP method e.g. GET.
+    * ``url``: the full URL.
+    * ``endpoint``: the URL relative to the API endpoint e.g.
+      ``users/notes``.
+    * ``start``: the ``timeit.default_timer`` value when the request was
+      started.
+    * ``elapsed``: seconds until the response arrived or the error was
+      raised.
+    * ``status_code``: the HTTP status code, None if there was no response.
+    * ``bytes_sent``: the size of the request body.
+    * ``bytes_received``: the size of the response body.
+    * ``attempt``: 1 for the first attempt, incremented on each retry.
+    * ``queue_time``: seconds the request waited before it was sent, e.g.
+      for a worker or a rate limit.
+    * ``error``: the exception raised, if any.
+
+    """
+
+    __slots__ = (
+        'method', 'url', 'endpoint', 'start', 'elapsed', 'status_code',
+        'bytes_sent', 'bytes_received', 'attempt', 'queue_time', 'error')
+
+    def __init__(self, method, url, endpoint, bytes_sent=0, attempt=1,
+                 queue_time=0.0):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.start = default_timer()
+        self.elapsed = None
+        self.status_code = None
+        self.bytes_sent = bytes_sent
+        self.bytes_received = 0
+        self.attempt = attempt
+        self.queue_time = queue_time
+        self.error = None
+
+    def responded(self, response):
+        """ Record the arrival of response. """
+        self.elapsed = default_timer() - self.start
+        self.status_code = response.status_code
+        content = response.content
+        self.bytes_received = len(content) if content else 0
+
+    def failed(self, error):
+        """ Record that the request failed with error. """
+        if self.elapsed is None:
+            self.elapsed = default_timer() - self.start
+        self.error = error
+
+    def __repr__(self):
+        return '<RequestInfo %s %s %s>' % (
+            self.method, self.endpoint, self.status_code)
+
+
+class Hooks(object):
+    """ The callbacks registered for each event. """
+
+    def __init__(self):
+        self.callbacks = dict((event, []) for event in EVENTS)
+        self.active = False
+
+    def register(self, event, callback):
+        """ Call callback(info) on every event. """
+        if event not in self.callbacks:
+            raise ValueError("unknown event: %s" % (event))
+        self.callbacks[event].append(callback)
+        self.active = True
+
+    def unregister(self, event, callback):
+        """ Stop calling callback on event. """
+        self.callbacks[event].remove(callback)
+        self.active = any(self.callbacks.values())
+
+    def clear(self):
+        """ Remove every callback. """
+        for callbacks in self.callbacks.values():
+            del callbacks[:]
+        self.active = False
+
+    def fire(self, event, info):
+        """ Call the callbacks for event. An error in a callback is logged
+        rather than raised, so it cannot break the API call. """
+        for callback in self.callbacks[event]:
+            try:
+                callback(info)
+            except Exception:
+                logger.exception("%s hook %r failed", event, callback)
@@ -0,0 +1,173 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" idempotency module
+
+Each write request (POST, PUT or DELETE) is sent with an
+``Idempotency-Key`` header, a key generated by the client, unless
+``Intercom.idempotency_keys`` is False. A request that is sent again,
+e.g. from an Outbox, carries the same key.
+
+Within an Operation, the writes take keys derived from the operation's,
+in order, so that when the operation is retried each write is sent with
+the key it had the first time. The bulk helpers retry each item as an
+Operation:
+
+>>> from intercom import Note
+>>> from intercom.idempotency import Operation
+>>> operation = Operation()
+>>> with operation:
+...     note = Note.create(email='ben@example.com', body='Hi')  # doctest: +SKIP
+
+An IdempotentTransport remembers the keys of the writes the API has
+confirmed, and answers a write sent again with one of them, within
+``window`` seconds, with the response it had rather than sending it:
+
+>>> from intercom import Intercom
+>>> from intercom.idempotency import IdempotentTransport
+>>> Intercom.transport = IdempotentTransport(Intercom.transport, window=300)
+
+"""
+
+import collections
+import threading
+import uuid
+
+from timeit import default_timer
+
+from .transport import IDEMPOTENCY_HEADER
+from .transport import Transport
+
+HEADER = IDEMPOTENCY_HEADER
+
+_local = threading.local()
+
+
+def new_key():
+    """ Returns a new random key. """
+    return uuid.uuid4().hex
+
+
+def current():
+    """ Returns the Operation that applies to this thread, or None. """
+    return getattr(_local, 'operation', None)
+
+
+def request_key():
+    """ Returns the key for the next write request in this thread. """
+    operation = current()
+    if operation is None:
+        return new_key()
+    return operation.next_key()
+
+
+class Operation(object):
+    """ A logical operation, made of one or more writes, that may be
+    retried. Each time it is entered its writes take the same keys again,
+    in the same order. """
+
+    def __init__(self, key=None):
+        self.key = key or new_key()
+        self.writes = 0
+        self.previous = None
+
+    def next_key(self):
+        """ Returns the key for the next write in the operation. """
+        self.writes += 1
+        if self.writes == 1:
+            return self.key
+        return '%s-%s' % (self.key, self.writes)
+
+    def __enter__(self):
+        self.writes = 0
+        self.previous = current()
+        _local.operation = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.operation = self.previous
+        self.previous = None
+
+    def __repr__(self):
+        return '<Operation %s>' % (self.key)
+
+
+class RecentKeys(object):
+    """ The responses to the writes confirmed in the last window seconds,
+    by key, up to maxsize of them. """
+
+    def __init__(self, window=300.0, maxsize=100000, clock=default_timer):
+        self.window = window
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.responses = {}
+        # (expiry, key) in the order they were confirmed
+        self.expiries = collections.deque()
+
+    def __len__(self):
+        return len(self.responses)
+
+    def _expire(self, now):
+        while self.expiries and (
+                self.expiries[0][0] <= now or
+                len(self.expiries) > self.maxsize):
+            expires, key = self.expiries.popleft()
+            entry = self.responses.get(key)
+            if entry is not None and entry[0] == expires:
+                del self.responses[key]
+
+    def get(self, key):
+        """ Returns the response confirming key, or None. """
+        with self.lock:
+            self._expire(self.clock())
+            entry = self.responses.get(key)
+        return entry[1] if entry is not None else None
+
+    def confirm(self, key, response):
+        """ Record that the write with key was confirmed by response. """
+        with self.lock:
+            now = self.clock()
+            expires = now + self.window
+            self.responses[key] = (expires, response)
+            self.expiries.append((expires, key))
+            self._expire(now)
+
+
+class IdempotentTransport(Transport):
+    """ Sends requests with another transport, except for writes that have
+    been confirmed within window seconds, which are answered with the
+    response they had.
+
+    ``suppressed`` counts the writes not sent. If a MetricsCollector is
+    given they are also counted there, as
+    ``intercom_idempotent_suppressed_total``. """
+
+    def __init__(self, transport, window=300.0, maxsize=100000, metrics=None,
+                 clock=default_timer):
+        self.transport = transport
+        self.recent = RecentKeys(window=window, maxsize=maxsize, clock=clock)
+        self.metrics = metrics
+        self.suppressed = 0
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        key = (headers or {}).get(HEADER)
+        if key is not None:
+            response = self.recent.get(key)
+            if response is not None:
+                self.suppressed += 1
+                if self.metrics is not None:
+                    self.metrics.increment(
+                        'idempotent_suppressed_total', method=method)
+                return response
+        response = self.transport.send(
+            method, url, params=params, data=data, headers=headers,
+            auth=auth, timeout=timeout)
+        if key is not None and 200 <= response.status_code < 300:
+            self.recent.confirm(key, response)
+        return response
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,426 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" importer module
+
+Imports users from a CSV or NDJSON file, e.g. a warehouse dump of
+millions of rows, with a pool of worker processes:
+
+>>> from intercom.importer import import_users
+>>> stats = import_users(
+...     'users.csv', processes=4, threads=8, rate=80,
+...     rejects='rejects.ndjson')                       # doctest: +SKIP
+>>> stats.imported, stats.rejected                  # doctest: +SKIP
+(999990, 10)
+
+or from the command line::
+
+    $ intercom-import users.csv --processes 4 --rate 80 \\
+        --rejects rejects.ndjson
+
+The file is streamed, and each row is sent to a worker chosen by a hash
+of its ``user_id``, or else its ``email``, so that the rows of a user are
+imported in the order they appear. Each worker process runs ``threads``
+threads, again chosen by the hash, with a transport, and so connections,
+of its own, and an equal share of ``rate``, the requests a second for the
+whole import.
+
+A CSV row is a user: the columns named as in ``User.attributes`` are
+sent as they are, ``*_at`` values of digits as timestamps, and the other
+columns as custom data. An NDJSON row is sent as it is. Empty values are
+not sent. Each chunk of rows a thread imports is traced as an
+``import_users.batch`` span, in the worker process.
+
+A row that fails is written to the rejects file as a JSON line with the
+``line`` it was read from, the ``row`` and the ``error``. Requests
+rejected with a 429 or 503 are retried first; those answered with a 502
+are not, as the user may have been saved.
+
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+from timeit import default_timer
+
+from .concurrency import REJECTED_ERRORS
+from .concurrency import RateLimiter
+from .concurrency import retry_delay
+from .hooks import Attempt
+from .idempotency import Operation
+from .intercom import Intercom
+from .transport import get_transport
+from .user import User
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+CHUNK_SIZE = 100
+
+
+class ImportStats(object):
+    """ The progress of an import. """
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.start = default_timer()
+        self.elapsed = 0.0
+
+    @property
+    def per_second(self):
+        """ The rows imported or rejected a second. """
+        done = self.imported + self.rejected
+        return done / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return '<ImportStats %s rows, %s imported, %s rejected, %.0f/s>' % (
+            self.rows, self.imported, self.rejected, self.per_second)
+
+
+def _format(path, format=None):
+    if format is not None:
+        return format
+    for extension, name in FORMATS.items():
+        if path.lower().endswith(extension):
+            return name
+    raise ValueError("unknown file format: %s" % (path))
+
+
+def user_row(row):
+    """ Returns the create_user parameters for a CSV row.
+
+    >>> user_row({'email': 'ben@example.com', 'plan': 'pro', 'name': ''})
+    {'custom_data': {'plan': 'pro'}, 'email': 'ben@example.com'}
+
+    """
+    params = {}
+    custom_data = {}
+    for name, value in row.items():
+        if value is None or value == '':
+            continue
+        if name in User.attributes:
+            if name.endswith('_at') and value.isdigit():
+                value = int(value)
+            params[name] = value
+        else:
+            custom_data[name] = value
+    if custom_data:
+        params['custom_data'] = custom_data
+    return params
+
+
+def read_rows(path, format=None):
+    """ Yields (line number, create_user parameters) for each row of the
+    CSV or NDJSON file at path. format is 'csv' or 'ndjson', by default
+    from the file's extension. """
+    format = _format(path, format)
+    if format == 'csv':
+        if sys.version_info[0] < 3:
+            rows = open(path, 'rb')
+        else:
+            rows = io.open(path, newline='', encoding='utf-8')
+        with rows:
+            reader = csv.DictReader(rows)
+            for row in reader:
+                if sys.version_info[0] < 3:
+                    row = dict(
+                        (k, v.decode('utf-8') if v is not None else v)
+                        for k, v in row.items())
+                yield reader.line_num, user_row(row)
+    elif format == 'ndjson':
+        with io.open(path, encoding='utf-8') as rows:
+            for number, line in enumerate(rows, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+    else:
+        raise ValueError("unknown file format: %s" % (format))
+
+
+def shard(row, count):
+    """ Returns the shard of count for row, by a hash of its user_id, or
+    else its email, that is the same in every process. """
+    key = row.get('user_id')
+    if key is None:
+        key = row.get('email')
+    return zlib.crc32(('%s' % (key)).encode('utf-8')) % count
+
+
+def _import_row(row, rate_limiter, retries):
+    operation = Operation()
+    retry = 0
+    while True:
+        waited = 0.0
+        if rate_limiter is not None:
+            waited = rate_limiter.acquire()
+        try:
+            with operation:
+                with Attempt(retry + 1, waited):
+                    return Intercom.create_user(**row)
+        except REJECTED_ERRORS:
+            if retry >= retries:
+                raise
+            time.sleep(retry_delay(retry, 0.5))
+            retry += 1
+
+
+def _import_batch(rows, rate_limiter, retries):
+    """ Imports (line, row) pairs, in an ``import_users.batch`` span with
+    an ``item`` span for each row. Returns the number imported, and the
+    (line, row, error) of those rejected. """
+    tracer = Intercom.tracer
+    imported = 0
+    rejects = []
+    with tracer.span('import_users.batch', rows=len(rows)):
+        for line, row in rows:
+            try:
+                with tracer.span('item', line=line):
+                    _import_row(row, rate_limiter, retries)
+                imported += 1
+            except Exception as exc:
+                rejects.append((line, row, '%s' % (exc)))
+    return imported, rejects
+
+
+def _worker(config, tasks, results):
+    """ Imports the chunks of rows from tasks, putting ('progress',
+    imported, rejects) on results as it goes, and ('exit', ...) once it
+    has been given None. """
+    Intercom.api_endpoint = config['api_endpoint']
+    Intercom.app_id = config['app_id']
+    Intercom.api_key = config['api_key']
+    threads = config['threads']
+    # a transport of its own, never the connections of the parent process
+    Intercom.transport = get_transport(config['transport'])
+    rate_limiter = RateLimiter(config['rate']) if config['rate'] else None
+    lock = threading.Lock()
+    done = {'imported': 0, 'rejects': []}
+
+    def work(rows):
+        while True:
+            chunk = rows.get()
+            if chunk is None:
+                break
+            imported, rejects = _import_batch(
+                chunk, rate_limiter, config['retries'])
+            with lock:
+                done['imported'] += imported
+                done['rejects'].extend(rejects)
+
+    def report(kind):
+        with lock:
+            imported, done['imported'] = done['imported'], 0
+            rejects, done['rejects'] = done['rejects'], []
+        results.put((kind, imported, rejects))
+
+    queues = [queue.Queue(maxsize=4) for _ in range(threads)]
+    pool = [threading.Thread(target=work, args=(rows,)) for rows in queues]
+    for thread in pool:
+        thread.daemon = True
+        thread.start()
+    last = default_timer()
+    while True:
+        chunk = tasks.get()
+        if chunk is None:
+            break
+        split = [[] for _ in range(threads)]
+        for line, row in chunk:
+            split[shard(row, config['shards']) // config['processes'] %
+                  threads].append((line, row))
+        for rows, part in zip(queues, split):
+            if part:
+                rows.put(part)
+        if default_timer() - last >= 0.5:
+            report('progress')
+            last = default_timer()
+    for rows in queues:
+        rows.put(None)
+    for thread in pool:
+        thread.join()
+    report('exit')
+
+
+class _Pool(object):
+    """ The worker processes, and the stats of their progress. """
+
+    def __init__(self, config, processes, rejects, progress):
+        self.processes = processes
+        self.rejects = rejects
+        self.progress = progress
+        self.stats = ImportStats()
+        self.results = multiprocessing.Queue()
+        self.tasks = [multiprocessing.Queue(maxsize=8)
+                      for _ in range(processes)]
+        self.workers = [
+            multiprocessing.Process(
+                target=_worker, args=(config, tasks, self.results))
+            for tasks in self.tasks]
+        self.running = processes
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def reject(self, line, row, error):
+        self.stats.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps(
+                {'line': line, 'row': row, 'error': error},
+                sort_keys=True) + '\n')
+
+    def collect(self, block=False):
+        """ Take the results the workers have reported. """
+        while self.running:
+            try:
+                kind, imported, rejects = self.results.get(
+                    block, timeout=1 if block else None)
+            except queue.Empty:
+                if not block:
+                    break
+                if not any(w.is_alive() for w in self.workers):
+                    raise RuntimeError("import workers exited")
+                continue
+            self.stats.imported += imported
+            for line, row, error in rejects:
+                self.reject(line, row, error)
+            if kind == 'exit':
+                self.running -= 1
+            self.report()
+
+    def report(self):
+        self.stats.elapsed = default_timer() - self.stats.start
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def put(self, index, chunk):
+        """ Send a chunk to a worker, taking results while it is busy.
+        Raises RuntimeError if the worker has exited. """
+        worker = self.workers[index]
+        while True:
+            try:
+                self.tasks[index].put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                self.collect()
+            if not worker.is_alive():
+                raise RuntimeError("import worker %s exited with code %s" % (
+                    index, worker.exitcode))
+
+    def close(self):
+        """ Tell the workers to exit once their chunks are done, and take
+        their results. Raises RuntimeError if a worker has exited early. """
+        for index in range(len(self.tasks)):
+            self.put(index, None)
+        self.collect(block=True)
+        for worker in self.workers:
+            worker.join()
+
+    def terminate(self):
+        for worker in self.workers:
+            worker.terminate()
+
+
+def import_users(path, processes=None, threads=4, rate=None, rejects=None,
+                 format=None, retries=3, transport='requests',
+                 progress=None):
+    """ Imports the users in the CSV or NDJSON file at path, and returns
+    the ImportStats.
+
+    processes defaults to the number of CPUs, and rate, the requests a
+    second across them all, to no limit. Failed rows are appended to the
+    rejects file if one is given. progress is called with the ImportStats
+    as rows are imported. """
+    processes = processes or multiprocessing.cpu_count()
+    config = {
+        'api_endpoint': Intercom.api_endpoint,
+        'app_id': Intercom.app_id,
+        'api_key': Intercom.api_key,
+        'transport': transport,
+        'threads': threads,
+        'processes': processes,
+        'shards': processes * threads,
+        'rate': float(rate) / processes if rate else None,
+        'retries': retries,
+    }
+    output = open(rejects, 'a') if rejects is not None else None
+    pool = None
+    try:
+        pool = _Pool(config, processes, output, progress)
+        chunks = [[] for _ in range(processes)]
+        for line, row in read_rows(path, format):
+            pool.stats.rows += 1
+            if row.get('user_id') is None and row.get('email') is None:
+                pool.reject(line, row, 'user_id or email required')
+                continue
+            index = shard(row, config['shards']) % processes
+            chunks[index].append((line, row))
+            if len(chunks[index]) >= CHUNK_SIZE:
+                pool.put(index, chunks[index])
+                chunks[index] = []
+        for index, chunk in enumerate(chunks):
+            if chunk:
+                pool.put(index, chunk)
+        pool.close()
+    except Exception:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if output is not None:
+            output.close()
+    pool.report()
+    return pool.stats
+
+
+def main(argv=None):
+    """ The intercom-import command. """
+    import argparse
+    import os
+    parser = argparse.ArgumentParser(
+        description='Import users into Intercom from a CSV or NDJSON file.')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument(
+        '--app-id', default=os.environ.get('INTERCOM_APP_ID'))
+    parser.add_argument(
+        '--api-key', default=os.environ.get('INTERCOM_API_KEY'))
+    parser.add_argument('--api-endpoint', default=Intercom.api_endpoint)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests a second, across all the processes')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--rejects', help='file to write failed rows to')
+    parser.add_argument('--transport', default='requests')
+    args = parser.parse_args(argv)
+    Intercom.app_id = args.app_id
+    Intercom.api_key = args.api_key
+    Intercom.api_endpoint = args.api_endpoint
+
+    def progress(stats):
+        sys.stderr.write(
+            '\r%s rows, %s imported, %s rejected, %.0f rows/s' % (
+                stats.rows, stats.imported, stats.rejected,
+                stats.per_second))
+        sys.stderr.flush()
+
+    stats = import_users(
+        args.path, processes=args.processes, threads=args.threads,
+        rate=args.rate, rejects=args.rejects, format=args.format,
+        retries=args.retries, transport=args.transport, progress=progress)
+    sys.stderr.write('\n')
+    return 1 if stats.rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
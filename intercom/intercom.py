@@ -16,14 +16,31 @@ All of the API requests are created, and the API responses are parsed here.
 
 __version__ = '0.2.14'
 
-import functools
-import json
+import base64
 import numbers
-import requests
 import time
 
+from . import deadline
+from . import idempotency
+from . import streaming
+from .codec import get_codec
+from .hooks import AFTER_RESPONSE
+from .hooks import BEFORE_REQUEST
+from .hooks import Hooks
+from .hooks import ON_ERROR
+from .hooks import RequestInfo
+from .hooks import current_attempt
+from .tracing import Tracer
+from .transport import RequestsTransport
+
 DEFAULT_TIMEOUT = 10  # seconds
 
+HEADERS = {
+    'User-Agent': 'python-intercom/' + __version__,
+    'Accept': 'application/json'
+}
+BODY_HEADERS = dict(HEADERS, **{'content-type': 'application/json'})
+
 
 class IntercomError(Exception):
     """ Base error. """
@@ -42,6 +59,12 @@ class BadGatewayError(IntercomError):
     pass
 
 
+class DeadlineExceeded(IntercomError):
+    """ Raised instead of sending a request once the deadline of the
+    operation it is part of has passed. """
+    pass
+
+
 class ResourceNotFound(IntercomError):
     """ Raised when a resource cannot be found e.g. a non-existant User. """
     pass
@@ -53,6 +76,12 @@ class ServerError(IntercomError):
     pass
 
 
+class RateLimitError(ServerError):
+    """ Raised when the API rejects a request with a 429 because a rate
+    limit has been reached. """
+    pass
+
+
 class ServiceUnavailableError(IntercomError):
     """ Raised when the API cannot be handle a request. """
     pass
@@ -88,18 +117,45 @@ class CustomData(dict):
         super(CustomData, self).__setitem__(key, value)
 
 
-def api_call(func_to_decorate):
-    """ Decorator for handling AWS credentials. """
-    @functools.wraps(func_to_decorate)
-    def wrapper(*args, **kwargs):
-        """ Decorator closure. """
-        response = func_to_decorate(*args, **kwargs)
-        raise_errors_on_failure(response)
-        if not response.content.strip():
-            return ''
-        result = json.loads(response.content)
-        return result
-    return wrapper
+def parse_response(response):
+    """ Raises an error for a failed response, otherwise returns the
+    decoded body. """
+    raise_errors_on_failure(response)
+    content = response.content
+    # isspace avoids the copy that strip() would make of a large body
+    if not content or content.isspace():
+        return ''
+    result = Intercom.codec.loads(content)
+    return result
+
+
+def strip_none(params):
+    """ Returns a copy of params without the parameters that are unset.
+
+    >>> strip_none({'email': 'somebody@example.com', 'user_id': None})
+    {'email': 'somebody@example.com'}
+
+    """
+    if not params:
+        return {}
+    return dict(
+        (key, value) for key, value in params.items() if value is not None)
+
+
+class BasicAuth(object):
+    """ HTTP Basic auth whose header is computed once for a set of
+    credentials, rather than on every request. """
+
+    def __init__(self, app_id, api_key):
+        self.credentials = (app_id, api_key)
+        token = base64.b64encode(
+            ('%s:%s' % self.credentials).encode('latin1'))
+        self.header = 'Basic ' + token.decode('ascii')
+
+    def __call__(self, request):
+        """ Sets the Authorization header on a requests.PreparedRequest. """
+        request.headers['Authorization'] = self.header
+        return request
 
 
 def raise_errors_on_failure(response):
@@ -128,7 +184,7 @@ def raise_errors_on_failure(response):
     elif response.status_code == 422:
         raise ServerError("Unprocessable Entity – The data was well-formed but invalid.")
     elif response.status_code == 429:
-        raise ServerError("Too Many Requests – The client has reached or exceeded a rate limit, or the server is overloaded.")
+        raise RateLimitError("Too Many Requests – The client has reached or exceeded a rate limit, or the server is overloaded.")
     elif response.status_code == 500:
         raise ServerError("Server error.")
     elif response.status_code == 502:
@@ -148,28 +204,117 @@ class Intercom(object):
     api_endpoint = 'https://api.intercom.io/v' + str(api_version) + '/'
     api_endpoint = 'https://api.intercom.io/'
     timeout = DEFAULT_TIMEOUT
+    idempotency_keys = True
+    event_filter = None
+    event_aggregator = None
+    codec = get_codec()
+    hooks = Hooks()
+    tracer = Tracer()
+
+    transport = RequestsTransport()
+
+    _auth = None
+
+    @classmethod
+    def _get_auth(cls):
+        """ Returns the BasicAuth for the current credentials, building a
+        new one only when app_id or api_key have changed. """
+        auth = Intercom._auth
+        if auth is None or \
+                auth.credentials != (Intercom.app_id, Intercom.api_key):
+            auth = Intercom._auth = BasicAuth(
+                Intercom.app_id, Intercom.api_key)
+        return auth
 
     @classmethod
-    @api_call
-    def _call(cls, method, url, params=None):
+    def _build_request(cls, method, params=None):
+        """ Returns the keyword arguments for a request: the parameters
+        that are unset are dropped, the body is serialized, and the
+        shared headers are attached, with an idempotency key for a
+        write. """
+        params = strip_none(params)
+        if method in ('POST', 'PUT', 'DELETE'):
+            headers = BODY_HEADERS
+            if Intercom.idempotency_keys:
+                headers = dict(BODY_HEADERS)
+                headers[idempotency.HEADER] = idempotency.request_key()
+            return {
+                'data': Intercom.codec.dumps(params),
+                'headers': headers
+            }
+        return {'params': params, 'headers': HEADERS}
+
+    @classmethod
+    def _call(cls, method, url, params=None, parse=parse_response):
         """ Construct an API request, send it to the API, and parse the
         response. """
-        req_params = {}
-        headers = {
-            'User-Agent': 'python-intercom/' + __version__,
-            'Accept': 'application/json'
-        }
-        if method in ('POST', 'PUT', 'DELETE'):
-            headers['content-type'] = 'application/json'
-            req_params['data'] = json.dumps(params)
-        elif method == 'GET':
-            req_params['params'] = params
-        req_params['headers'] = headers
+        req_params = Intercom._build_request(method, params)
+        if not (Intercom.hooks.active or Intercom.tracer.active):
+            return parse(Intercom._send(method, url, req_params))
+        return Intercom._observed_call(method, url, req_params, parse)
 
-        resp = requests.request(
-            method, url, timeout=Intercom.timeout,
-            auth=(Intercom.app_id, Intercom.api_key), **req_params)
-        return resp
+    @classmethod
+    def _observed_call(cls, method, url, req_params, parse=parse_response):
+        """ _call with the request hooks fired and a tracing span. """
+        hooks = Intercom.hooks
+        tracer = Intercom.tracer
+        endpoint = Intercom._endpoint_path(url)
+        attempt = current_attempt()
+        info = RequestInfo(
+            method, url, endpoint,
+            bytes_sent=len(req_params.get('data', '')))
+        if attempt is not None:
+            info.attempt = attempt.number
+            info.queue_time = attempt.take_queue_time()
+        with tracer.span('http', method=method, endpoint=endpoint) as span:
+            hooks.fire(BEFORE_REQUEST, info)
+            try:
+                resp = Intercom._send(method, url, req_params)
+                info.responded(resp)
+                span.set_attribute('status_code', info.status_code)
+                hooks.fire(AFTER_RESPONSE, info)
+                with tracer.span('decode'):
+                    return parse(resp)
+            except Exception as exc:
+                info.failed(exc)
+                hooks.fire(ON_ERROR, info)
+                raise
+
+    @classmethod
+    def _send(cls, method, url, req_params):
+        """ Send a request built by _build_request, and return the
+        response. """
+        return Intercom.transport.send(
+            method, url, timeout=Intercom._request_timeout(),
+            auth=Intercom._get_auth(), **req_params)
+
+    @classmethod
+    def _request_timeout(cls):
+        """ Returns the timeout for a request: Intercom.timeout, unless a
+        Deadline applies. Raises DeadlineExceeded if it has passed. """
+        active = deadline.current()
+        if active is None:
+            return Intercom.timeout
+        if active.expired:
+            raise DeadlineExceeded("Deadline exceeded.")
+        return active.request_timeout(Intercom.timeout)
+
+    @classmethod
+    def _endpoint_path(cls, url):
+        """ Returns url relative to the API endpoint e.g. users/notes. """
+        if url.startswith(Intercom.api_endpoint):
+            url = url[len(Intercom.api_endpoint):]
+        return url.split('?', 1)[0].strip('/')
+
+    @classmethod
+    def _list_page(cls, path, key, **params):
+        """ Returns a streaming.ListPage of the list at path, whose key
+        records are decoded as it is iterated. """
+        def parse(response):
+            raise_errors_on_failure(response)
+            return streaming.ListPage(response.content, key)
+        return Intercom._call(
+            'GET', Intercom.api_endpoint + path, params=params, parse=parse)
 
     @classmethod
     def _create_or_update_user(cls, method, **kwargs):
@@ -594,20 +739,48 @@ class Intercom(object):
         return tag_dict
 
     @classmethod
-    def create_event(cls, event_name=None, user_id=None, email=None, metadata=None):
+    def create_event(cls, event_name=None, user_id=None, email=None, metadata=None,
+                     created=None):
         """
         Create an event
+
+        ``created`` is the time the event happened, a timestamp or
+        datetime, by default now. If ``Intercom.event_aggregator`` is set,
+        the events it aggregates are counted rather than sent.
         """
+        if created is None:
+            created = int(time.time())
+        elif not isinstance(created, numbers.Number):
+            created = int(time.mktime(created.timetuple()))
         params = {
             'event_name': event_name,
             'user_id': user_id,
             'email': email,
-            'created': int(time.time()) 
+            'created': created
          }
 
         if isinstance(metadata, dict):
             params['metadata'] = metadata
 
-        call = Intercom._call(
-             'POST', Intercom.api_endpoint + 'events', params=params)
+        aggregator = Intercom.event_aggregator
+        if aggregator is not None and aggregator.add(params):
+            return ''
+        return Intercom._send_event(params)
+
+    @classmethod
+    def _send_event(cls, params):
+        """ Send an event, unless ``Intercom.event_filter`` is set and has
+        seen it sent. """
+        event_filter = Intercom.event_filter
+        if event_filter is not None and not event_filter.claim(params):
+            return ''
+        try:
+            call = Intercom._call(
+                'POST', Intercom.api_endpoint + 'events', params=params)
+        except Exception:
+            if event_filter is not None:
+                event_filter.release(params)
+            raise
+        if event_filter is not None:
+            event_filter.add(params)
         return call
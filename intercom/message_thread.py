@@ -15,6 +15,9 @@
 
 from . import Intercom
 from . import from_timestamp_property
+from .concurrency import RateLimiter
+from .concurrency import map_concurrent
+from .concurrency import user_params
 
 
 class MessageThread(dict):
@@ -56,6 +59,32 @@ class MessageThread(dict):
         resp = Intercom.get_message_threads(user_id=user_id, email=email)
         return [MessageThread(mt) for mt in resp]
 
+    @classmethod
+    def find_all_for(cls, users, key='email', limiter=None, rate=None,
+                     workers=None):
+        """ Finds all Messages for each of users concurrently, yielding a
+        ``(user, [MessageThread], error)`` BatchResult for each as it
+        arrives. A user that fails has the exception as its error, and
+        None for its threads.
+
+        users are Users, dicts with a user_id or email, or the values of
+        the key parameter. limiter is an AdaptiveLimiter for the number of
+        requests in flight, and rate caps the requests per second.
+
+        >>> results = MessageThread.find_all_for(
+        ... ["somebody@example.com"])
+        >>> user, message_threads, error = next(results)
+        >>> len(message_threads)
+        1
+
+        """
+        def fetch(user):
+            return cls.find_all(**user_params(user, key))
+        return map_concurrent(
+            fetch, users, limiter=limiter, workers=workers,
+            rate_limiter=RateLimiter(rate) if rate else None,
+            name='MessageThread.find_all_for')
+
     @classmethod
     def create(cls, user_id=None, email=None, body=None):
         """ Creates a new converstion.
@@ -0,0 +1,191 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" metrics module
+
+An in-process aggregator for the request hooks. It keeps a latency
+histogram, request, error and byte counts for each endpoint, and can
+export them in the Prometheus text exposition format. The requests
+retried by the bulk helpers, and the seconds they waited for their rate
+and concurrency limits, are counted as ``intercom_retries_total`` and
+``intercom_queue_seconds_total``.
+
+>>> from intercom.metrics import MetricsCollector
+>>> metrics = MetricsCollector().attach()
+>>> print metrics.to_prometheus()   # doctest: +SKIP
+>>> metrics.detach()
+
+Other parts of the library add their own counters and gauges through
+``increment`` and ``set_gauge``.
+
+"""
+
+import bisect
+import threading
+
+from .hooks import AFTER_RESPONSE
+from .hooks import ON_ERROR
+
+# Latency histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'intercom_'
+
+
+class Histogram(object):
+    """ A cumulative histogram with fixed bucket bounds. """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # the last count is for observations above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """ Add value to the histogram. """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """ Returns a list of (upper bound, count of observations less than
+        or equal to it), ending with ('+Inf', count). """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append(('+Inf', self.count))
+        return result
+
+    def percentile(self, fraction):
+        """ Returns the upper bound of the bucket holding the fraction
+        (0.0 to 1.0) percentile, or None if nothing has been observed. """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+
+
+def _labels(labels):
+    """ Formats a sorted tuple of (name, value) label pairs. """
+    if not labels:
+        return ''
+    return '{%s}' % (','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"')) for name, value in labels))
+
+
+class MetricsCollector(object):
+    """ Aggregates RequestInfo from the request hooks. """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.hooks = None
+        self.reset()
+
+    def reset(self):
+        """ Discard everything collected so far. """
+        with self.lock:
+            # {(method, endpoint): Histogram}
+            self.latency = {}
+            # {name: {labels: value}}
+            self.counters = {}
+            self.gauges = {}
+
+    def attach(self, hooks=None):
+        """ Start collecting from hooks, by default ``Intercom.hooks``.
+        Returns the collector. """
+        if hooks is None:
+            from .intercom import Intercom
+            hooks = Intercom.hooks
+        hooks.register(AFTER_RESPONSE, self.after_response)
+        hooks.register(ON_ERROR, self.on_error)
+        self.hooks = hooks
+        return self
+
+    def detach(self):
+        """ Stop collecting. """
+        if self.hooks is not None:
+            self.hooks.unregister(AFTER_RESPONSE, self.after_response)
+            self.hooks.unregister(ON_ERROR, self.on_error)
+            self.hooks = None
+
+    def increment(self, name, value=1, **labels):
+        """ Add value to the counter name with the labels. """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """ Set the gauge name with the labels to value. """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def counter(self, name, **labels):
+        """ Returns the value of a counter. """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            return self.counters.get(name, {}).get(key, 0)
+
+    def histogram(self, method, endpoint):
+        """ Returns the latency Histogram for an endpoint, or None. """
+        with self.lock:
+            return self.latency.get((method, endpoint))
+
+    def after_response(self, info):
+        """ after_response hook. """
+        with self.lock:
+            histogram = self.latency.get((info.method, info.endpoint))
+            if histogram is None:
+                histogram = self.latency[(info.method, info.endpoint)] = \
+                    Histogram(self.buckets)
+            histogram.observe(info.elapsed)
+        labels = {'method': info.method, 'endpoint': info.endpoint}
+        self.increment('requests_total', status=info.status_code, **labels)
+        self.increment('request_bytes_total', info.bytes_sent, **labels)
+        self.increment('response_bytes_total', info.bytes_received, **labels)
+        if info.attempt > 1:
+            self.increment('retries_total', **labels)
+        if info.queue_time:
+            self.increment('queue_seconds_total', info.queue_time, **labels)
+
+    def on_error(self, info):
+        """ on_error hook. """
+        self.increment(
+            'errors_total', method=info.method, endpoint=info.endpoint,
+            error=type(info.error).__name__)
+
+    def to_prometheus(self):
+        """ Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            name = PREFIX + 'request_duration_seconds'
+            if self.latency:
+                lines.append('# TYPE %s histogram' % (name))
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                labels = (('endpoint', endpoint), ('method', method))
+                for bound, total in histogram.cumulative():
+                    lines.append('%s_bucket%s %s' % (
+                        name, _labels(labels + (('le', bound),)), total))
+                lines.append('%s_sum%s %s' % (
+                    name, _labels(labels), histogram.sum))
+                lines.append('%s_count%s %s' % (
+                    name, _labels(labels), histogram.count))
+            for kind, metrics in (
+                    ('counter', self.counters), ('gauge', self.gauges)):
+                for name, values in sorted(metrics.items()):
+                    lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+                    for labels, value in sorted(values.items()):
+                        lines.append('%s%s%s %s' % (
+                            PREFIX, name, _labels(labels), value))
+        return '\n'.join(lines) + '\n'
@@ -16,6 +16,10 @@
 from . import Intercom
 from . import from_timestamp_property
 from . import to_timestamp_property
+from .concurrency import REJECTED_ERRORS
+from .concurrency import RateLimiter
+from .concurrency import map_concurrent
+from .concurrency import user_params
 from .user import User
 from .user import UserId
 
@@ -38,6 +42,36 @@ class Note(UserId):
         resp = Intercom.create_note(user_id=user_id, email=email, body=body)
         return cls(resp)
 
+    @classmethod
+    def create_all(cls, notes, key='email', limiter=None, rate=None,
+                   workers=None, retries=3):
+        """ Creates a Note for each of notes, (user, body) pairs,
+        concurrently, yielding a ``((user, body), Note, error)``
+        BatchResult for each as it is created. A note that fails has the
+        exception as its error, and None for its Note.
+
+        users are Users, dicts with a user_id or email, or the values of
+        the key parameter. limiter is an AdaptiveLimiter for the number of
+        requests in flight, and rate caps the requests per second. A note
+        rejected with a 429 or 503 is retried up to retries times; one
+        answered with a 502 is not, as it may have been created.
+
+        >>> results = Note.create_all(
+        ...     [("somebody@example.com", "This is a note.")])
+        >>> (user, body), note, error = next(results)
+        >>> note.html
+        u'<p>This is a note</p>'
+
+        """
+        def create(note):
+            user, body = note
+            return cls.create(body=body, **user_params(user, key))
+        return map_concurrent(
+            create, notes, limiter=limiter, workers=workers,
+            rate_limiter=RateLimiter(rate) if rate else None,
+            retries=retries, retry_on=REJECTED_ERRORS,
+            name='Note.create_all')
+
     def save(self):
         """ Create a Note from this objects properties:
 
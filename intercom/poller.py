@@ -0,0 +1,228 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" poller module
+
+Polls the message threads of a set of users, and reports the messages
+added since the last poll:
+
+>>> from intercom.poller import MessagePoller
+>>> poller = MessagePoller(
+...     ['ben@example.com', 'ann@example.com'], path='poller.json')
+>>> def on_update(update):
+...     for message in update.messages:
+...         print update.user, update.thread.thread_id, message.html
+>>> poller.run(on_update)                           # doctest: +SKIP
+
+The API has no way to list only the threads changed since a time, so each
+poll of a user lists their threads with one request. A thread whose
+``updated_at`` has not moved is skipped, and only the messages after
+those already seen are reported for one that has.
+
+Each user is polled on their own interval. It drops to ``min_interval``
+when a poll finds a change, and grows by ``backoff`` up to
+``max_interval`` after each poll that does not, so active conversations
+are polled often and quiet ones rarely.
+
+If a path is given, the checkpoint, i.e. what has been seen of each
+thread and when each user is next due, is saved there by ``run`` once the
+callback has handled the updates of a poll, and loaded on start, so a
+restarted poller carries on where it left off and reports again what was
+not handled. The
+threads found on the first poll of a user are taken as seen, unless
+``report_existing`` is True.
+
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from .concurrency import RateLimiter
+from .concurrency import map_concurrent
+from .concurrency import user_key
+from .concurrency import user_params
+from .message_thread import Message
+from .message_thread import MessageThread
+
+logger = logging.getLogger('intercom')
+
+
+class ThreadUpdate(collections.namedtuple(
+        'ThreadUpdate', ['user', 'thread', 'messages'])):
+    """ The new messages of a thread: user is as it was given to the
+    poller, thread a MessageThread and messages a list of Messages. """
+    __slots__ = ()
+
+
+class MessagePoller(object):
+    """ Polls the message threads of users for new messages.
+
+    users are Users, dicts with a user_id or email, or the values of the
+    key parameter. The due users are fetched concurrently, within
+    limiter, an AdaptiveLimiter, and at up to rate requests a second. """
+
+    def __init__(self, users=(), key='email', path=None, min_interval=10.0,
+                 max_interval=600.0, backoff=2.0, report_existing=False,
+                 limiter=None, rate=None, clock=time.time):
+        self.key = key
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.report_existing = report_existing
+        self.limiter = limiter
+        self.rate = rate
+        self.clock = clock
+        self.lock = threading.Lock()
+        # {user key: user as given}
+        self.users = {}
+        # {user key: {'interval': seconds, 'due': time, 'seen': True once
+        # polled}}
+        self.schedule = {}
+        # {thread id: {'updated_at': timestamp, 'messages': count,
+        # 'user': user key}}
+        self.threads = {}
+        if path is not None and os.path.exists(path):
+            self.load()
+        for user in users:
+            self.add(user)
+
+    def add(self, user):
+        """ Start polling user; due now unless the checkpoint says
+        otherwise. """
+        key = user_key(user, self.key)
+        with self.lock:
+            self.users[key] = user
+            self.schedule.setdefault(
+                key, {'interval': self.min_interval, 'due': 0})
+
+    def remove(self, user):
+        """ Stop polling user, and forget their threads. """
+        key = user_key(user, self.key)
+        with self.lock:
+            self.users.pop(key, None)
+            self.schedule.pop(key, None)
+            for thread_id, seen in list(self.threads.items()):
+                if seen.get('user') == key:
+                    del self.threads[thread_id]
+
+    def next_due(self):
+        """ Returns the time the next user is due, or None. """
+        with self.lock:
+            due = [self.schedule[k]['due'] for k in self.users]
+        return min(due) if due else None
+
+    def _due_users(self, now):
+        with self.lock:
+            return [
+                (user_key, user) for user_key, user in self.users.items()
+                if self.schedule[user_key]['due'] <= now]
+
+    def _diff(self, user_key, user, first_poll, threads):
+        """ Returns the ThreadUpdates for a user's threads, and records
+        them as seen. """
+        updates = []
+        for thread in threads:
+            thread_id = str(thread.thread_id)
+            messages = dict.get(thread, 'messages') or []
+            updated_at = dict.get(thread, 'updated_at')
+            seen = self.threads.get(thread_id)
+            if seen is None:
+                start = len(messages) if (
+                    first_poll and not self.report_existing) else 0
+            elif seen['updated_at'] == updated_at and \
+                    seen['messages'] == len(messages):
+                continue
+            else:
+                # messages are only appended; if some have gone, start over
+                start = seen['messages'] if \
+                    seen['messages'] <= len(messages) else len(messages)
+            self.threads[thread_id] = {
+                'updated_at': updated_at, 'messages': len(messages),
+                'user': user_key}
+            if start < len(messages):
+                updates.append(ThreadUpdate(
+                    user, thread, [Message(m) for m in messages[start:]]))
+        return updates
+
+    def poll_once(self):
+        """ Poll the users that are due, and return a list of
+        ThreadUpdates. They are recorded as seen, but not saved to the
+        checkpoint; call save once they have been handled. """
+        now = self.clock()
+        due = dict(self._due_users(now))
+        if not due:
+            return []
+        updates = []
+        for user_key, threads, error in self._fetch(due):
+            user = due[user_key]
+            with self.lock:
+                if user_key not in self.schedule:
+                    continue  # removed while it was being polled
+                schedule = self.schedule[user_key]
+                if error is not None:
+                    logger.warning("polling %s failed: %s", user_key, error)
+                    changed = []
+                else:
+                    changed = self._diff(
+                        user_key, user, 'seen' not in schedule, threads)
+                    schedule['seen'] = True
+                if changed:
+                    schedule['interval'] = self.min_interval
+                else:
+                    schedule['interval'] = min(
+                        schedule['interval'] * self.backoff,
+                        self.max_interval)
+                schedule['due'] = now + schedule['interval']
+            updates.extend(changed)
+        return updates
+
+    def _fetch(self, due):
+        """ Fetch the threads of the due users, yielding (user key,
+        threads, error). """
+        def fetch(user_key):
+            return MessageThread.find_all(
+                **user_params(due[user_key], self.key))
+        return map_concurrent(
+            fetch, list(due), limiter=self.limiter,
+            rate_limiter=RateLimiter(self.rate) if self.rate else None)
+
+    def run(self, callback, stop=None):
+        """ Poll until stop, a threading.Event, is set, calling
+        callback(update) for each ThreadUpdate, and saving the checkpoint
+        once it has handled those of a poll. An error raised by callback
+        stops the poller, without saving. """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            for update in self.poll_once():
+                callback(update)
+            if self.path is not None:
+                self.save()
+            next_due = self.next_due()
+            wait = self.min_interval if next_due is None else \
+                max(next_due - self.clock(), 0)
+            stop.wait(wait)
+
+    def save(self):
+        """ Write the checkpoint to path, replacing it atomically. """
+        with self.lock:
+            checkpoint = json.dumps(
+                {'schedule': self.schedule, 'threads': self.threads},
+                sort_keys=True)
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as output:
+            output.write(checkpoint)
+        os.rename(temp, self.path)
+
+    def load(self):
+        """ Read the checkpoint from path. """
+        with open(self.path) as checkpoint:
+            state = json.load(checkpoint)
+        with self.lock:
+            self.schedule.update(state.get('schedule', {}))
+            self.threads.update(state.get('threads', {}))
@@ -0,0 +1,139 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" streaming module
+
+Decodes the records of a list response, e.g. the ``users`` of a page of
+``get_users``, one at a time, rather than the whole page at once, so the
+first record can be used as soon as it has been decoded and only one is
+held at a time:
+
+>>> from intercom import User
+>>> for user in User.iter_all(stream=True):         # doctest: +SKIP
+...     print user.email
+
+The body is read in chunks of ``CHUNK_SIZE`` bytes, and each record is
+decoded with ``json.JSONDecoder.raw_decode`` as soon as its chunks have
+been read. The other members of the response, e.g. ``total_pages``, are
+in ``ListPage.fields`` once the records have been iterated.
+
+The records are decoded with the json module rather than
+``Intercom.codec``.
+
+"""
+
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def chunks(content, size=CHUNK_SIZE):
+    """ Yields content, bytes or text, in pieces of up to size. """
+    for start in range(0, len(content), size):
+        yield content[start:start + size]
+
+
+class _Reader(object):
+    """ Decodes JSON values from chunks of bytes or text, reading more
+    chunks as they are needed. """
+
+    def __init__(self, pieces):
+        self.pieces = iter(pieces)
+        self.decoder = json.JSONDecoder()
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.pos = 0
+
+    def read(self):
+        """ Append the next chunk to the buffer. Returns False if there
+        are no more. """
+        for piece in self.pieces:
+            if isinstance(piece, bytes):
+                piece = self.text.decode(piece)
+            # drop what has been decoded
+            self.buffer = self.buffer[self.pos:] + piece
+            self.pos = 0
+            return True
+        return False
+
+    def peek(self):
+        """ Returns the next character other than whitespace. """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read():
+                raise ValueError("Unexpected end of JSON")
+
+    def next(self, expected):
+        """ Consume the next character, which must be one of expected. """
+        char = self.peek()
+        if char not in expected:
+            raise ValueError("Expected one of %r at %r" % (expected, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """ Decode the next value. """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.read():
+                    continue
+                raise
+            # a number may continue in the next chunk
+            if end == len(self.buffer) and self.read():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_records(pieces, key, fields):
+    """ Yields the elements of the key array of the JSON object in
+    pieces, bytes or text, and sets the other members of the object in
+    the fields dict. """
+    reader = _Reader(pieces)
+    reader.next('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.next(':')
+        if name == key and reader.peek() == '[':
+            reader.next('[')
+            if reader.peek() == ']':
+                reader.next(']')
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.next(',]') == ']':
+                        break
+        else:
+            fields[name] = reader.value()
+        if reader.next(',}') == '}':
+            break
+
+
+class ListPage(object):
+    """ A page of a list response, whose key records are decoded one at a
+    time as it is iterated. It can be iterated once. """
+
+    def __init__(self, content, key, chunk_size=CHUNK_SIZE):
+        self.content = content
+        self.key = key
+        self.chunk_size = chunk_size
+        self.fields = {}
+
+    def __iter__(self):
+        content, self.content = self.content, None
+        if content is None:
+            raise ValueError("A ListPage can be iterated once.")
+        return iter_records(
+            chunks(content, self.chunk_size), self.key, self.fields)
@@ -0,0 +1,171 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" tracing module
+
+A lightweight tracer for attributing time within high-level operations.
+``User.all`` for example creates a span for the whole operation, one for
+each page, and within those one for each HTTP call, its decoding, and the
+construction of the models.
+
+The bulk operations, e.g. ``Note.create_all``, create a span for the
+whole operation and one for each item, in the thread that sends it.
+
+Spans are only created while an adapter is attached. Adapters receive
+each span as it starts and finishes, and can forward it to an external
+tracer:
+
+>>> from intercom import Intercom
+>>> from intercom.tracing import RecordingAdapter
+>>> recorder = RecordingAdapter()
+>>> Intercom.tracer.add_adapter(recorder)
+>>> users = User.all()                          # doctest: +SKIP
+>>> [span.name for span in recorder.spans]      # doctest: +SKIP
+['http', 'decode', 'build', 'page', 'User.all']
+>>> Intercom.tracer.remove_adapter(recorder)
+
+"""
+
+import itertools
+import threading
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+_ids = itertools.count(1)
+
+
+class Span(object):
+    """ A timed operation, possibly nested within a parent Span. """
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attributes = attributes or {}
+        self.start = default_timer()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """ Seconds from start to finish, None while the span is open. """
+        if self.end is not None:
+            return self.end - self.start
+
+    def set_attribute(self, name, value):
+        """ Set an attribute e.g. the page number or status code. """
+        self.attributes[name] = value
+
+    def __repr__(self):
+        return '<Span %s %s>' % (self.name, self.attributes)
+
+
+class _NullSpan(object):
+    """ Stands in for a Span when tracing is inactive. """
+
+    def set_attribute(self, name, value):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+
+class SpanAdapter(object):
+    """ Base class for forwarding spans to another tracer. Subclasses
+    override ``start`` and ``finish``, both called in the thread that
+    runs the span. """
+
+    def start(self, span):
+        """ span has started. """
+        pass
+
+    def finish(self, span):
+        """ span has finished; span.error is set if it raised. """
+        pass
+
+
+class RecordingAdapter(SpanAdapter):
+    """ Keeps finished spans in a list, for tests and debugging. """
+
+    def __init__(self):
+        self.spans = []
+
+    def finish(self, span):
+        self.spans.append(span)
+
+
+class Tracer(object):
+    """ Tracks the current span for each thread. """
+
+    def __init__(self):
+        self.adapters = []
+        self.active = False
+        self.local = threading.local()
+
+    def add_adapter(self, adapter):
+        """ Start sending spans to adapter. """
+        self.adapters.append(adapter)
+        self.active = True
+
+    def remove_adapter(self, adapter):
+        """ Stop sending spans to adapter. """
+        self.adapters.remove(adapter)
+        self.active = bool(self.adapters)
+
+    def current(self):
+        """ Returns the current span in this thread, or None. """
+        return getattr(self.local, 'span', None)
+
+    @contextmanager
+    def activate(self, span):
+        """ Make span the parent of new spans in this thread, e.g. in a
+        worker thread running part of an operation started elsewhere. """
+        previous = self.current()
+        self.local.span = span
+        try:
+            yield span
+        finally:
+            self.local.span = previous
+
+    def start(self, name, parent=None, **attributes):
+        """ Start a span, a child of parent, without making it the current
+        span: e.g. for an operation that is iterated, whose children run
+        in other threads. It must be passed to finish. Returns the Span,
+        or a no-op stand-in if no adapters are attached. """
+        if not self.active:
+            return NULL_SPAN
+        span = Span(name, parent, attributes)
+        for adapter in self.adapters:
+            adapter.start(span)
+        return span
+
+    def finish(self, span, error=None):
+        """ Finish a span returned by start. """
+        if span is NULL_SPAN:
+            return
+        span.error = error
+        span.end = default_timer()
+        for adapter in self.adapters:
+            adapter.finish(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """ Time the enclosed block as a child of the current span. Yields
+        the Span, or a no-op stand-in if no adapters are attached. """
+        if not self.active:
+            yield NULL_SPAN
+            return
+        parent = self.current()
+        span = self.start(name, parent, **attributes)
+        self.local.span = span
+        error = None
+        try:
+            yield span
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self.local.span = parent
+            self.finish(span, error)
@@ -0,0 +1,293 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" transport module
+
+A transport sends the requests built by ``Intercom._call``. The transport
+in ``Intercom.transport`` is used for every call, so it can be replaced,
+or wrapped, without patching anything:
+
+>>> from intercom import Intercom
+>>> from intercom.transport import get_transport
+>>> Intercom.transport = get_transport('urllib3')
+
+Three are available:
+
+* ``requests``: the default, a shared requests.Session.
+* ``urllib3``: a urllib3 connection pool, which avoids the per-request
+  overhead of requests.
+* ``http.client``: the standard library, with a persistent connection for
+  each thread; no dependencies.
+
+"""
+
+import errno
+import socket
+import threading
+
+try:
+    from httplib import BadStatusLine
+    from httplib import HTTPConnection
+    from httplib import HTTPException
+    from httplib import HTTPSConnection
+    from urllib import urlencode
+    from urlparse import urlsplit
+except ImportError:  # Python 3
+    from http.client import BadStatusLine
+    from http.client import HTTPConnection
+    from http.client import HTTPException
+    from http.client import HTTPSConnection
+    from urllib.parse import urlencode
+    from urllib.parse import urlsplit
+
+# the header carrying a write's idempotency key; see the idempotency module
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# methods that may be sent twice without changing the outcome
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# errors showing a kept-alive connection was closed before the request was
+# answered
+STALE_ERRNOS = frozenset([errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED])
+
+
+class Timeout(object):
+    """ Separate limits, in seconds, on connecting to the server and on
+    waiting for it to send data. Either may be None for no limit.
+
+    >>> from intercom import Intercom
+    >>> Intercom.timeout = Timeout(connect=3.05, read=10)
+
+    """
+
+    __slots__ = ('connect', 'read')
+
+    def __init__(self, connect=None, read=None):
+        self.connect = connect
+        self.read = read
+
+    @classmethod
+    def of(cls, timeout):
+        """ Returns timeout as a Timeout; a number is used for both. """
+        if isinstance(timeout, Timeout):
+            return timeout
+        return cls(timeout, timeout)
+
+    def capped(self, seconds):
+        """ Returns a Timeout with neither limit longer than seconds. """
+        return Timeout(
+            seconds if self.connect is None else min(self.connect, seconds),
+            seconds if self.read is None else min(self.read, seconds))
+
+    def __eq__(self, other):
+        return isinstance(other, Timeout) and \
+            (self.connect, self.read) == (other.connect, other.read)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Timeout(connect=%r, read=%r)' % (self.connect, self.read)
+
+
+class Response(object):
+    """ A response returned by a transport. ``content`` is the raw body,
+    and ``headers`` a dict of header name to value. """
+
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code, headers=None, content=b''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+    def __repr__(self):
+        return '<Response [%s]>' % (self.status_code)
+
+
+class Transport(object):
+    """ Base class for transports. """
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        """ Send a request and return its response, an object with
+        ``status_code``, ``headers`` and ``content`` attributes.
+
+        * ``params``: a dict of query string parameters.
+        * ``data``: the encoded request body.
+        * ``headers``: a dict of request headers.
+        * ``auth``: an ``intercom.intercom.BasicAuth``.
+        * ``timeout``: seconds to wait for the server, or a Timeout.
+
+        Errors connecting or reading are raised as they are by the
+        underlying HTTP library. """
+        raise NotImplementedError
+
+    def close(self):
+        """ Release any pooled connections. """
+        pass
+
+
+class RequestsTransport(Transport):
+    """ Sends requests with a shared requests.Session. requests is only
+    imported when the first request is sent. """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        if isinstance(timeout, Timeout):
+            timeout = (timeout.connect, timeout.read)
+        return self.session.request(
+            method, url, params=params, data=data, headers=headers,
+            auth=auth, timeout=timeout)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+def _query(url, params):
+    """ Returns url with params appended as a query string. """
+    if not params:
+        return url
+    pairs = []
+    for name, value in sorted(params.items()):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for value in values:
+            if not isinstance(value, (str, bytes)):
+                value = u'%s' % (value)
+            if not isinstance(value, bytes):
+                value = value.encode('utf-8')
+            pairs.append((name, value))
+    return url + ('&' if '?' in url else '?') + urlencode(pairs)
+
+
+def _headers(headers, auth, data):
+    """ Returns the request headers with the auth header added, and the
+    body encoded as bytes. """
+    headers = dict(headers or {})
+    if auth is not None:
+        headers['Authorization'] = auth.header
+    if data is not None and not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return headers, data
+
+
+class Urllib3Transport(Transport):
+    """ Sends requests with a urllib3.PoolManager. Connection errors and
+    timeouts are raised as urllib3 exceptions; nothing is retried. """
+
+    def __init__(self, pool_manager=None, maxsize=10):
+        self.pool_manager = pool_manager
+        self.maxsize = maxsize
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        if self.pool_manager is None:
+            import urllib3
+            self.pool_manager = urllib3.PoolManager(maxsize=self.maxsize)
+        headers, data = _headers(headers, auth, data)
+        if isinstance(timeout, Timeout):
+            import urllib3
+            timeout = urllib3.Timeout(
+                connect=timeout.connect, read=timeout.read)
+        response = self.pool_manager.urlopen(
+            method, _query(url, params), body=data, headers=headers,
+            timeout=timeout, retries=False, redirect=False)
+        return Response(response.status, dict(response.headers), response.data)
+
+    def close(self):
+        if self.pool_manager is not None:
+            self.pool_manager.clear()
+
+
+def _stale(error):
+    """ Returns True if error shows that a kept-alive connection had been
+    closed, before any of the response arrived. """
+    if isinstance(error, socket.timeout):
+        return False
+    if isinstance(error, BadStatusLine):
+        # including RemoteDisconnected
+        return True
+    return getattr(error, 'errno', None) in STALE_ERRNOS
+
+
+class HTTPClientTransport(Transport):
+    """ Sends requests with the standard library's HTTP client, keeping a
+    persistent connection per host for each thread. If a kept-alive
+    connection turns out to have been closed by the server, an idempotent
+    request, or one with an idempotency key, is sent once more on a new
+    connection. A request that timed out is never sent again. """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def _connection(self, scheme, netloc, timeout):
+        """ Returns the connection to netloc, connected within the connect
+        timeout, with the read timeout set on its socket, and whether it
+        was already open. """
+        connections = self.local.__dict__.setdefault('connections', {})
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            cls = HTTPSConnection if scheme == 'https' else HTTPConnection
+            connection = connections[(scheme, netloc)] = cls(netloc)
+        reused = connection.sock is not None
+        if not reused:
+            connection.timeout = timeout.connect
+            connection.connect()
+        connection.sock.settimeout(timeout.read)
+        return connection, reused
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             auth=None, timeout=None):
+        headers, data = _headers(headers, auth, data)
+        timeout = Timeout.of(timeout)
+        parts = urlsplit(_query(url, params))
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        retriable = method in IDEMPOTENT_METHODS or \
+            IDEMPOTENCY_HEADER in headers
+        for attempt in (1, 2):
+            connection, reused = self._connection(
+                parts.scheme, parts.netloc, timeout)
+            try:
+                connection.request(method, path, data, headers)
+                response = connection.getresponse()
+            except (HTTPException, IOError) as error:
+                connection.close()
+                if reused and attempt == 1 and retriable and _stale(error):
+                    continue
+                raise
+            try:
+                content = response.read()
+            except Exception:
+                connection.close()
+                raise
+            break
+        return Response(
+            response.status, dict(response.getheaders()), content)
+
+    def close(self):
+        for connection in getattr(self.local, 'connections', {}).values():
+            connection.close()
+        self.local = threading.local()
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'urllib3': Urllib3Transport,
+    'http.client': HTTPClientTransport,
+}
+
+
+def get_transport(name):
+    """ Returns a new transport of the named kind; see TRANSPORTS. """
+    if name not in TRANSPORTS:
+        raise ValueError("unknown transport: %s" % (name))
+    return TRANSPORTS[name]()
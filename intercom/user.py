@@ -15,6 +15,10 @@ from . import Intercom
 from . import from_timestamp_property
 from . import to_timestamp_property
 
+from .concurrency import REJECTED_ERRORS
+from .concurrency import RateLimiter
+from .concurrency import map_concurrent
+from .concurrency import user_params
 from .intercom import CustomData
 
 
@@ -136,15 +140,114 @@ class User(UserId):
         u'first.user@example.com'
 
         """
+        with Intercom.tracer.span('User.all'):
+            return list(cls.iter_all())
+
+    @classmethod
+    def iter_all(cls, raw=False, per_page=None, stream=False):
+        """ Yields each of the Users, fetching a page at a time, so that
+        only one page is held in memory. If raw is True the dicts from the
+        API are yielded rather than User objects.
+        If stream is True the records of each page are decoded one at a
+        time as they are yielded; see the streaming module.
+
+        >>> users = User.iter_all()
+        >>> next(users).email
+        u'first.user@example.com'
+
+        """
+        if stream:
+            for record in cls._iter_streamed(raw, per_page):
+                yield record
+            return
         page = 1
         total_pages = 1
-        users = []
+        tracer = Intercom.tracer
         while page <= total_pages:
-            resp = Intercom.get_users(page=page)
+            with tracer.span('page', page=page):
+                resp = Intercom.get_users(page=page, per_page=per_page)
+                page += 1
+                total_pages = resp.get('total_pages', 0)
+                records = resp['users']
+                del resp
+                if not raw:
+                    with tracer.span('build'):
+                        # replace in place, so each dict can be freed as
+                        # soon as it has been copied
+                        for index, record in enumerate(records):
+                            records[index] = cls(record)
+            for record in records:
+                yield record
+
+    @classmethod
+    def _iter_streamed(cls, raw, per_page):
+        """ iter_all, decoding each record as it is yielded. """
+        page = 1
+        total_pages = 1
+        while page <= total_pages:
+            with Intercom.tracer.span('page', page=page):
+                records = Intercom._list_page(
+                    'users', 'users', page=page, per_page=per_page)
             page += 1
-            total_pages = resp.get('total_pages', 0)
-            users.extend([cls(u) for u in resp['users']])
-        return users
+            for record in records:
+                yield record if raw else cls(record)
+            total_pages = records.fields.get('total_pages', 0)
+
+    @classmethod
+    def add_companies(cls, pairs, key='email', limiter=None, rate=None,
+                      workers=None, retries=3):
+        """ Adds users to companies, given (user, company) pairs, yielding
+        a ``(user, User, error)`` BatchResult for each user as it is
+        updated. A user that fails has the exception as its error, and
+        None for its User.
+
+        The pairs are grouped by user, so each user is updated with one
+        request, concurrently, that sets only their companies. A company
+        is a Company or a dict with an id; each is sent as one payload,
+        with the attributes given for it merged, however many users it is
+        added to.
+
+        users are Users, dicts with a user_id or email, or the values of
+        the key parameter. limiter is an AdaptiveLimiter for the number of
+        requests in flight, and rate caps the requests per second. A user
+        rejected with a 429 or 503 is retried up to retries times; one
+        answered with a 502 is not, as it may have been updated.
+
+        >>> results = User.add_companies(
+        ...     [("somebody@example.com", {'id': 6, 'name': 'Intercom'})])
+        >>> user, updated, error = next(results)
+        >>> updated.name
+        u'Somebody'
+
+        """
+        users = []
+        payloads = {}
+        companies = {}
+        for user, company in pairs:
+            params = user_params(user, key)
+            user_key = tuple(params.items())
+            if user_key not in payloads:
+                users.append(user)
+                payloads[user_key] = dict(params, companies={})
+            company_id = company.get('id', company.get('company_id'))
+            if company_id is None:
+                raise ValueError("company must have an id")
+            company_key = str(company_id)
+            if company_key not in companies:
+                companies[company_key] = Company()
+            companies[company_key].update(company)
+            payloads[user_key]['companies'][company_key] = \
+                companies[company_key]
+
+        def update(user):
+            params = dict(payloads[tuple(user_params(user, key).items())])
+            params['companies'] = list(params['companies'].values())
+            return cls(Intercom.update_user(**params))
+        return map_concurrent(
+            update, users, limiter=limiter, workers=workers,
+            rate_limiter=RateLimiter(rate) if rate else None,
+            retries=retries, retry_on=REJECTED_ERRORS,
+            name='User.add_companies')
 
     def save(self):
         """ Creates or updates a User.
@@ -0,0 +1,376 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+""" webhooks module
+
+Receives Intercom webhook notifications, and hands them in batches to a
+handler running on a pool of threads:
+
+>>> from intercom.webhooks import Dispatcher, WebhookReceiver
+>>> def handle(notifications):
+...     for notification in notifications:
+...         print notification.topic, notification.item
+>>> dispatcher = Dispatcher(handle, workers=4, batch_size=100).start()
+>>> receiver = WebhookReceiver(dispatcher, secret='hub-secret')
+
+The receiver is a WSGI application, to be mounted in an existing server.
+Or it can be served on its own:
+
+>>> from intercom.webhooks import serve
+>>> serve(receiver, port=8080)                      # doctest: +SKIP
+
+Each notification is checked against its ``X-Hub-Signature`` if a secret
+is set, and its item parsed into a User, Company, Tag or MessageThread.
+The receiver answers as soon as the notification is queued. If the queue
+is full it answers 503, so that Intercom retries later, rather than
+accepting more than the handler can keep up with.
+
+Payloads saved locally, one JSON notification per file, can be replayed
+through a receiver without a server:
+
+>>> from intercom.webhooks import replay
+>>> replay(receiver, ['user.created.json'])         # doctest: +SKIP
+[202]
+
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+
+from timeit import default_timer
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from .company import Company
+from .message_thread import MessageThread
+from .tag import Tag
+from .user import User
+
+try:
+    _STRING = basestring
+except NameError:  # Python 3
+    _STRING = str
+
+SIGNATURE_HEADER = 'x-hub-signature'
+
+# item types, and the class each is parsed into
+MODELS = {
+    'user': User,
+    'company': Company,
+    'tag': Tag,
+    'conversation': MessageThread,
+    'message_thread': MessageThread,
+}
+
+logger = logging.getLogger('intercom')
+
+
+def sign(body, secret):
+    """ Returns the X-Hub-Signature for body. """
+    if not isinstance(secret, bytes):
+        secret = secret.encode('utf-8')
+    return 'sha1=' + hmac.new(secret, body, hashlib.sha1).hexdigest()
+
+
+def _equal(a, b):
+    """ Compares strings in constant time. """
+    compare_digest = getattr(hmac, 'compare_digest', None)
+    if compare_digest is not None:
+        return compare_digest(a, b)
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+def verify_signature(body, signature, secret):
+    """ Returns True if signature is the X-Hub-Signature of body. """
+    if not signature:
+        return False
+    return _equal(str(signature), str(sign(body, secret)))
+
+
+class Notification(object):
+    """ A webhook notification.
+
+    * ``topic``: e.g. ``user.created``.
+    * ``item``: a User, Company, Tag or MessageThread, or a dict for other
+      kinds of item.
+    * ``payload``: the whole notification, as a dict.
+
+    Raises ValueError if the payload is not the shape of one.
+
+    """
+
+    __slots__ = ('id', 'topic', 'created_at', 'item', 'payload')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.id = payload.get('id')
+        self.topic = payload.get('topic')
+        self.created_at = payload.get('created_at')
+        if self.topic is not None and not isinstance(self.topic, _STRING):
+            raise ValueError("topic is not a string")
+        data = payload.get('data') or {}
+        if not isinstance(data, dict):
+            raise ValueError("data is not an object")
+        item = data.get('item') or {}
+        if not isinstance(item, dict):
+            raise ValueError("data.item is not an object")
+        kind = item.get('type')
+        if kind is not None and not isinstance(kind, _STRING):
+            raise ValueError("data.item.type is not a string")
+        model = MODELS.get(kind)
+        if model is None and self.topic:
+            model = MODELS.get(self.topic.split('.')[0])
+        self.item = model(item) if model else item
+
+    @classmethod
+    def parse(cls, body):
+        """ Returns the Notification in the JSON body. Raises ValueError if
+        it isn't one. """
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        payload = json.loads(body)
+        if not isinstance(payload, dict):
+            raise ValueError("not a notification")
+        return cls(payload)
+
+    def __repr__(self):
+        return '<Notification %s %s>' % (self.topic, self.id)
+
+
+_STOP = object()
+
+
+class Dispatcher(object):
+    """ Calls handler with batches of notifications, on workers threads.
+
+    A batch is dispatched once it has batch_size notifications, or
+    max_wait seconds after its first. At most max_queue notifications wait
+    to be dispatched; submit refuses any more. Batches are handled
+    concurrently, so a handler must not depend on their order.
+
+    If a MetricsCollector is given the counters
+    ``intercom_webhooks_received_total``,
+    ``intercom_webhooks_rejected_total``,
+    ``intercom_webhooks_dispatched_total`` and
+    ``intercom_webhook_errors_total`` are kept there, and the gauge
+    ``intercom_webhook_queue_depth``. """
+
+    def __init__(self, handler, workers=4, batch_size=100, max_wait=0.05,
+                 max_queue=10000, metrics=None):
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.threads = []
+        self.started = None
+        self.counts = dict.fromkeys(
+            ('received', 'rejected', 'dispatched', 'batches', 'errors'), 0)
+
+    def _count(self, name, value=1, **labels):
+        with self.lock:
+            self.counts[name] += value
+        if self.metrics is not None:
+            if name == 'batches':
+                return
+            metric = 'webhook_errors_total' if name == 'errors' else \
+                'webhooks_%s_total' % (name)
+            self.metrics.increment(metric, value, **labels)
+
+    def start(self):
+        """ Start the worker threads. Returns the dispatcher. """
+        self.started = default_timer()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """ Dispatch the queued notifications, and stop the workers. """
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, notification):
+        """ Queue notification. Returns False if the queue is full. """
+        try:
+            self.queue.put_nowait(notification)
+        except queue.Full:
+            self._count('rejected', topic=notification.topic)
+            return False
+        self._count('received', topic=notification.topic)
+        if self.metrics is not None:
+            self.metrics.set_gauge('webhook_queue_depth', self.queue.qsize())
+        return True
+
+    def _batch(self):
+        """ Returns the next batch, and whether to stop after it. """
+        first = self.queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        until = default_timer() + self.max_wait
+        while len(batch) < self.batch_size:
+            wait = until - default_timer()
+            try:
+                if wait > 0:
+                    notification = self.queue.get(timeout=wait)
+                else:
+                    notification = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if notification is _STOP:
+                return batch, True
+            batch.append(notification)
+        return batch, False
+
+    def _work(self):
+        stop = False
+        while not stop:
+            batch, stop = self._batch()
+            if not batch:
+                continue
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception("webhook handler failed")
+                self._count('errors')
+            self._count('batches')
+            self._count('dispatched', len(batch))
+
+    def stats(self):
+        """ Returns a dict of the counts, the queue depth, and the
+        notifications dispatched per second since the start. """
+        with self.lock:
+            stats = dict(self.counts)
+        stats['queued'] = self.queue.qsize()
+        elapsed = default_timer() - self.started if self.started else 0
+        stats['per_second'] = stats['dispatched'] / elapsed if elapsed else 0
+        return stats
+
+
+class WebhookReceiver(object):
+    """ A WSGI application that receives notifications at path, and
+    submits them to dispatcher. """
+
+    def __init__(self, dispatcher, secret=None, path='/'):
+        self.dispatcher = dispatcher
+        self.secret = secret
+        self.path = path
+
+    def handle(self, method, path, headers, body):
+        """ Handle a request; headers is a dict with lowercase names.
+        Returns (status, headers, body). """
+        if path != self.path:
+            return _response(404, 'Not Found')
+        if method != 'POST':
+            return _response(405, 'Method Not Allowed')
+        if self.secret is not None and not verify_signature(
+                body, headers.get(SIGNATURE_HEADER), self.secret):
+            return _response(401, 'Invalid signature')
+        try:
+            notification = Notification.parse(body)
+        except ValueError as exc:
+            return _response(400, 'Invalid notification: %s' % (exc))
+        except Exception:
+            logger.exception("parsing a webhook notification failed")
+            return _response(500, 'Internal Server Error')
+        if not self.dispatcher.submit(notification):
+            return _response(503, 'Busy', [('Retry-After', '1')])
+        return _response(202, 'Accepted')
+
+    def __call__(self, environ, start_response):
+        """ The WSGI application. """
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length) if length else b''
+        headers = {}
+        signature = environ.get('HTTP_X_HUB_SIGNATURE')
+        if signature is not None:
+            headers[SIGNATURE_HEADER] = signature
+        status, response_headers, content = self.handle(
+            environ['REQUEST_METHOD'], environ.get('PATH_INFO') or '/',
+            headers, body)
+        start_response(_STATUS[status], response_headers)
+        return [content]
+
+
+_STATUS = {
+    202: '202 Accepted',
+    400: '400 Bad Request',
+    401: '401 Unauthorized',
+    404: '404 Not Found',
+    405: '405 Method Not Allowed',
+    500: '500 Internal Server Error',
+    503: '503 Service Unavailable',
+}
+
+
+def _response(status, message, headers=()):
+    content = message.encode('utf-8')
+    return status, [
+        ('Content-Type', 'text/plain'),
+        ('Content-Length', str(len(content)))] + list(headers), content
+
+
+def serve(receiver, host='127.0.0.1', port=8080):
+    """ Serve receiver with a threaded WSGI server until interrupted. """
+    from wsgiref.simple_server import WSGIRequestHandler
+    from wsgiref.simple_server import WSGIServer
+    from wsgiref.simple_server import make_server
+    try:
+        from SocketServer import ThreadingMixIn
+    except ImportError:  # Python 3
+        from socketserver import ThreadingMixIn
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class Handler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = make_server(
+        host, port, receiver, server_class=Server, handler_class=Handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def replay(receiver, paths, secret=None):
+    """ Submit the notification saved in each of paths to receiver, signed
+    with secret, by default the receiver's. Returns the status codes. """
+    secret = secret if secret is not None else receiver.secret
+    statuses = []
+    for path in paths:
+        with open(path, 'rb') as saved:
+            body = saved.read()
+        headers = {}
+        if secret is not None:
+            headers[SIGNATURE_HEADER] = sign(body, secret)
+        status, _, _ = receiver.handle('POST', receiver.path, headers, body)
+        statuses.append(status)
+    return statuses
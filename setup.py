@@ -29,8 +29,13 @@ setup(
     url="http://github.com/jkeyes/python-intercom",
     keywords='Intercom crm python',
     classifiers=[],
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     include_package_data=True,
     install_requires=["requests"],
+    entry_points={
+        'console_scripts': [
+            'intercom-import = intercom.importer:main',
+        ],
+    },
     zip_safe=False
 )
@@ -0,0 +1,215 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+import random
+import threading
+import time
+
+from intercom import BadGatewayError
+from intercom import Intercom
+from intercom import MessageThread
+from intercom import Note
+from intercom import ResourceNotFound
+from intercom import User
+from intercom.concurrency import AdaptiveLimiter
+from intercom.concurrency import KeyedExecutor
+from intercom.fake_server import FakeIntercom
+from intercom.transport import Transport
+from intercom.tracing import RecordingAdapter
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import with_setup
+
+fake = FakeIntercom(app_id='fake-app-id', api_key='fake-api-key')
+saved = {}
+
+
+def setup_module():
+    saved.update(
+        api_endpoint=Intercom.api_endpoint, app_id=Intercom.app_id,
+        api_key=Intercom.api_key)
+    fake.start()
+    Intercom.api_endpoint = fake.url
+    Intercom.app_id = 'fake-app-id'
+    Intercom.api_key = 'fake-api-key'
+
+
+def teardown_module():
+    fake.stop()
+    for name, value in saved.items():
+        setattr(Intercom, name, value)
+
+
+def reset():
+    fake.reset()
+
+
+@with_setup(reset)
+def test_find_all_for():
+    fake.seed_users(20)
+    fake.seed_threads(2)
+    emails = ['user%s@example.com' % n for n in range(1, 21)]
+    users = emails[:10] + [User(user_id='15')] + ['nobody@example.com']
+    limiter = AdaptiveLimiter(initial=2, maximum=4)
+    results = dict(
+        (user if isinstance(user, str) else user.user_id, (threads, error))
+        for user, threads, error in MessageThread.find_all_for(
+            users, limiter=limiter, rate=1000))
+    eq_(12, len(results))
+    threads, error = results['user3@example.com']
+    eq_(None, error)
+    eq_(2, len(threads))
+    ok_(isinstance(threads[0], MessageThread))
+    eq_('user3@example.com', threads[0].messages[0].author.email)
+    eq_(2, len(results['15'][0]))
+    threads, error = results['nobody@example.com']
+    eq_(None, threads)
+    ok_(isinstance(error, ResourceNotFound))
+    eq_(12, fake.request_count('GET', 'users/message_threads'))
+
+
+@with_setup(reset)
+def test_find_all_for_user_ids():
+    fake.seed_users(3)
+    fake.seed_threads(1)
+    results = list(MessageThread.find_all_for(['1', '2', '3'], key='user_id'))
+    eq_([1, 1, 1], [len(threads) for _, threads, _ in results])
+
+
+@with_setup(reset)
+def test_create_all_notes():
+    fake.seed_users(10)
+    fake.fail_next(429, count=3, path='users/notes')
+    notes = [('user%s@example.com' % n, 'Note %s' % n) for n in range(1, 11)]
+    notes.append(('nobody@example.com', 'Lost'))
+    results = list(Note.create_all(notes, rate=1000, workers=4))
+    eq_(11, len(results))
+    created = dict(
+        (user, note) for (user, body), note, error in results if not error)
+    eq_(10, len(created))
+    ok_(isinstance(created['user3@example.com'], Note))
+    eq_('user3@example.com', created['user3@example.com'].user.email)
+    errors = [error for _, _, error in results if error]
+    ok_(isinstance(errors[0], ResourceNotFound))
+    # the rate limited notes were retried
+    eq_(14, fake.request_count('POST', 'users/notes'))
+    eq_(10, len(fake.notes))
+
+
+@with_setup(reset)
+def test_create_all_notes_bad_gateway():
+    fake.seed_users(1)
+    fake.fail_next(502, path='users/notes')
+    results = list(Note.create_all([('user1@example.com', 'Once')]))
+    # the note may have been created, so it is not sent again
+    ok_(isinstance(results[0].error, BadGatewayError))
+    eq_(1, fake.request_count('POST', 'users/notes'))
+
+
+@with_setup(reset)
+def test_add_companies():
+    fake.seed_users(4)
+    pairs = [
+        ('user1@example.com', {'id': 'acme', 'name': 'Acme'}),
+        ('user2@example.com', {'id': 'acme'}),
+        ('user1@example.com', {'id': 'initech', 'name': 'Initech'}),
+        ('user1@example.com', {'id': 'acme', 'plan': 'pro'}),
+        (User(user_id='3'), {'company_id': 'initech'})]
+    results = list(User.add_companies(pairs, workers=2))
+    eq_(3, len(results))
+    eq_([None] * 3, [error for _, _, error in results])
+    ok_(isinstance(results[0].result, User))
+    # one request per user
+    eq_(3, fake.request_count('POST', 'users'))
+    acme = fake.companies['acme']
+    eq_('Acme', acme['name'])
+    eq_('pro', acme['plan'])
+    user = fake._find_user({'email': 'user1@example.com'})
+    eq_(2, len(user['company_ids']))
+    user = fake._find_user({'user_id': '3'})
+    eq_([fake.companies['initech']['id']], user['company_ids'])
+
+
+def span_tree(spans):
+    """ Returns the names of the spans, each with the names of its
+    children, sorted. """
+    children = {}
+    for span in spans:
+        children.setdefault(span.parent, []).append(span)
+
+    def tree(span):
+        return (span.name, sorted(tree(c) for c in children.get(span, [])))
+    return sorted(tree(span) for span in children.get(None, []))
+
+
+def traced(operation):
+    recorder = RecordingAdapter()
+    Intercom.tracer.add_adapter(recorder)
+    try:
+        results = list(operation())
+    finally:
+        Intercom.tracer.remove_adapter(recorder)
+    eq_([None] * len(results), [error for _, _, error in results])
+    return span_tree(recorder.spans)
+
+
+@with_setup(reset)
+def test_create_all_notes_spans():
+    fake.seed_users(2)
+    notes = [('user1@example.com', 'One'), ('user2@example.com', 'Two')]
+    item = ('item', [('http', [('decode', [])])])
+    eq_([('Note.create_all', [item, item])],
+        traced(lambda: Note.create_all(notes, workers=2)))
+
+
+@with_setup(reset)
+def test_add_companies_spans():
+    fake.seed_users(2)
+    pairs = [('user1@example.com', {'id': 'acme'}),
+             ('user2@example.com', {'id': 'acme'})]
+    item = ('item', [('http', [('decode', [])])])
+    eq_([('User.add_companies', [item, item])],
+        traced(lambda: User.add_companies(pairs, workers=2)))
+
+
+class Jittery(Transport):
+    """ Sends with another transport after a random delay, recording the
+    names of the users saved in the order they were sent. """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.lock = threading.Lock()
+        self.saved = []
+
+    def send(self, method, url, data=None, **kwargs):
+        time.sleep(random.random() * 0.005)
+        if method == 'POST' and url.endswith('/users'):
+            params = json.loads(data)
+            with self.lock:
+                self.saved.append((params['email'], params['name']))
+        return self.transport.send(method, url, data=data, **kwargs)
+
+
+@with_setup(reset)
+def test_keyed_user_writes():
+    fake.seed_users(2)
+    transport = Intercom.transport
+    jittery = Intercom.transport = Jittery(transport)
+    emails = ['user1@example.com', 'user2@example.com']
+    try:
+        with KeyedExecutor(workers=4) as executor:
+            futures = []
+            for number in range(10):
+                for email in emails:
+                    user = User(email=email, name='Name %s' % number)
+                    futures.append(executor.submit_user(user, user.save))
+        eq_([None] * 20, [future.exception() for future in futures])
+    finally:
+        Intercom.transport = transport
+    for email in emails:
+        eq_(['Name %s' % number for number in range(10)],
+            [name for saved, name in jittery.saved if saved == email])
+        eq_('Name 9', fake._find_user({'email': email})['name'])
@@ -0,0 +1,137 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom import AuthenticationError
+from intercom import Company
+from intercom import Event
+from intercom import Impression
+from intercom import Intercom
+from intercom import MessageThread
+from intercom import Note
+from intercom import ResourceNotFound
+from intercom import ServerError
+from intercom import ServiceUnavailableError
+from intercom import Tag
+from intercom import User
+from intercom.fake_server import FakeIntercom
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+fake = FakeIntercom(app_id='fake-app-id', api_key='fake-api-key')
+saved = {}
+
+
+def setup_module():
+    saved.update(
+        api_endpoint=Intercom.api_endpoint, app_id=Intercom.app_id,
+        api_key=Intercom.api_key)
+    fake.start()
+    Intercom.api_endpoint = fake.url
+    Intercom.app_id = 'fake-app-id'
+    Intercom.api_key = 'fake-api-key'
+
+
+def teardown_module():
+    fake.stop()
+    for name, value in saved.items():
+        setattr(Intercom, name, value)
+
+
+def reset():
+    fake.reset()
+
+
+@with_setup(reset)
+def test_users_pagination():
+    fake.seed_users(1001)
+    users = User.all()
+    eq_(len(users), 1001)
+    eq_(users[-1].email, 'user1001@example.com')
+    eq_(fake.request_count('GET', 'users'), 3)
+
+
+@with_setup(reset)
+def test_user_lifecycle():
+    user = User.create(email='somebody@example.com', name='Somebody')
+    ok_(user['intercom_id'])
+    user = User.find(email='somebody@example.com')
+    eq_(user.name, 'Somebody')
+    user.name = 'Somebody Else'
+    user.save()
+    eq_(User.find(email='somebody@example.com').name, 'Somebody Else')
+    User.delete(email='somebody@example.com')
+    raises(ResourceNotFound)(User.find)(email='somebody@example.com')
+
+
+@with_setup(reset)
+def test_companies():
+    fake.seed_companies(60)
+    eq_(len(Company.all()), 60)
+    eq_(Company.find(company_id='7').name, 'Company 7')
+
+
+@with_setup(reset)
+def test_tags_events_impressions_notes():
+    fake.seed_users(2)
+    tag = Tag.create('Free Trial', 'tag', user_ids=['1', '2'])
+    eq_(tag.tagged_user_count, 2)
+    eq_(len(Intercom.get_users(tag_name='Free Trial')['users']), 2)
+
+    Event.create(event_name='shared-item', user_id='1')
+    eq_(fake.events[0]['event_name'], 'shared-item')
+
+    impression = Impression.create(user_id='1', user_ip='1.2.3.4')
+    eq_(impression.unread_messages, 0)
+
+    note = Note.create(user_id='1', body='A note')
+    eq_(note.html, '<p>A note</p>')
+    eq_(note.user.email, 'user1@example.com')
+
+
+@with_setup(reset)
+def test_message_threads():
+    fake.seed_users(1)
+    thread = MessageThread.create(user_id='1', body='Hello')
+    fake.admin_reply(thread.thread_id, 'Hi there')
+    threads = MessageThread.find_all(user_id='1')
+    eq_(len(threads), 1)
+    eq_([m.html for m in threads[0].messages],
+        ['<p>Hello</p>', '<p>Hi there</p>'])
+    thread = MessageThread.reply(
+        user_id='1', thread_id=thread.thread_id, body='Thanks', read=True)
+    eq_(len(thread.messages), 3)
+
+
+@with_setup(reset)
+def test_error_injection():
+    fake.fail_next(503, path='users')
+    raises(ServiceUnavailableError)(User.find)(user_id='1')
+    fake.fail_next(500)
+    raises(ServerError)(Intercom.get_users)()
+    eq_(Intercom.get_users()['total_count'], 0)
+
+
+@with_setup(reset)
+def test_rate_limit():
+    fake.rate_limit = 2
+    fake.reset()
+    try:
+        Intercom.get_users()
+        Intercom.get_users()
+        raises(ServerError)(Intercom.get_users)()
+    finally:
+        fake.rate_limit = None
+
+
+@with_setup(reset)
+@raises(AuthenticationError)
+def test_authentication():
+    Intercom.api_key = 'bad-api-key'
+    try:
+        Intercom.get_users()
+    finally:
+        Intercom.api_key = 'fake-api-key'
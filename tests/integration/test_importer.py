@@ -0,0 +1,177 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+import os
+import shutil
+import tempfile
+
+from intercom import Intercom
+from intercom.fake_server import FakeIntercom
+from intercom.importer import _Pool
+from intercom.importer import _import_batch
+from intercom.importer import import_users
+from intercom.importer import main
+from intercom.importer import read_rows
+from intercom.importer import shard
+from intercom.tracing import RecordingAdapter
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+fake = FakeIntercom(app_id='fake-app-id', api_key='fake-api-key')
+saved = {}
+tmp = {}
+
+
+def setup_module():
+    saved.update(
+        api_endpoint=Intercom.api_endpoint, app_id=Intercom.app_id,
+        api_key=Intercom.api_key)
+    fake.start()
+    Intercom.api_endpoint = fake.url
+    Intercom.app_id = 'fake-app-id'
+    Intercom.api_key = 'fake-api-key'
+
+
+def teardown_module():
+    fake.stop()
+    for name, value in saved.items():
+        setattr(Intercom, name, value)
+
+
+def set_up():
+    fake.reset()
+    tmp['dir'] = tempfile.mkdtemp()
+
+
+def tear_down():
+    shutil.rmtree(tmp['dir'])
+
+
+def write(name, content):
+    path = os.path.join(tmp['dir'], name)
+    with open(path, 'w') as output:
+        output.write(content)
+    return path
+
+
+@with_setup(set_up, tear_down)
+def test_read_rows():
+    path = write('users.csv', (
+        'email,name,created_at,plan\n'
+        'ben@example.com,Ben,1400000000,pro\n'
+        'ann@example.com,,,\n'))
+    eq_([(2, {'email': 'ben@example.com', 'name': 'Ben',
+              'created_at': 1400000000, 'custom_data': {'plan': 'pro'}}),
+         (3, {'email': 'ann@example.com'})], list(read_rows(path)))
+    path = write('users.ndjson', (
+        '{"user_id": "1", "custom_data": {"plan": "pro"}}\n\n'
+        '{"user_id": "2"}\n'))
+    eq_([(1, {'user_id': '1', 'custom_data': {'plan': 'pro'}}),
+         (3, {'user_id': '2'})], list(read_rows(path)))
+
+
+def test_shard():
+    eq_(shard({'email': 'ben@example.com'}, 8),
+        shard({'email': 'ben@example.com', 'name': 'Ben'}, 8))
+    eq_(shard({'user_id': '1'}, 8),
+        shard({'user_id': '1', 'email': 'ben@example.com'}, 8))
+    shards = set(
+        shard({'user_id': str(n)}, 8) for n in range(100))
+    eq_(set(range(8)), shards)
+
+
+@with_setup(set_up, tear_down)
+def test_import_users():
+    lines = []
+    for number in range(1, 201):
+        lines.append(json.dumps(
+            {'email': 'user%s@example.com' % number, 'name': 'First'}))
+    # a later row for a user is applied after the earlier one
+    for number in range(1, 201, 10):
+        lines.append(json.dumps(
+            {'email': 'user%s@example.com' % number, 'name': 'Second'}))
+    lines.append(json.dumps({'name': 'Nobody'}))
+    path = write('users.ndjson', '\n'.join(lines) + '\n')
+    rejects = os.path.join(tmp['dir'], 'rejects.ndjson')
+    fake.fail_next(400, count=1, path='users')
+    reports = []
+    stats = import_users(
+        path, processes=2, threads=3, rate=10000, rejects=rejects,
+        progress=reports.append)
+    eq_(221, stats.rows)
+    eq_(219, stats.imported)
+    eq_(2, stats.rejected)
+    ok_(reports)
+    # including the one that failed
+    eq_(220, fake.request_count('POST', 'users'))
+    with open(rejects) as saved_rejects:
+        rejected = [json.loads(line) for line in saved_rejects]
+    eq_(2, len(rejected))
+    rejected.sort(key=lambda reject: reject['line'])
+    failed = rejected[0]['row']['email']
+    for number in range(1, 201):
+        email = 'user%s@example.com' % number
+        user = fake._find_user({'email': email}, required=False)
+        if email != failed:
+            eq_('Second' if number % 10 == 1 else 'First', user['name'])
+    eq_(221, rejected[-1]['line'])
+    eq_({'name': 'Nobody'}, rejected[-1]['row'])
+
+
+@with_setup(set_up, tear_down)
+@raises(RuntimeError)
+def test_import_users_worker_exits():
+    lines = [json.dumps({'email': 'user%s@example.com' % number})
+             for number in range(1, 2001)]
+    path = write('users.ndjson', '\n'.join(lines) + '\n')
+    # the worker fails to make its transport, and takes no rows
+    import_users(path, processes=1, transport='unknown')
+
+
+@raises(RuntimeError)
+def test_close_with_killed_worker():
+    config = {
+        'api_endpoint': fake.url, 'app_id': 'fake-app-id',
+        'api_key': 'fake-api-key', 'transport': 'requests', 'threads': 1,
+        'processes': 1, 'shards': 1, 'rate': None, 'retries': 0}
+    pool = _Pool(config, 1, None, None)
+    pool.workers[0].terminate()
+    pool.workers[0].join()
+    # a full queue, that nothing will take from
+    for line in range(8):
+        pool.tasks[0].put([(line, {'email': 'ben@example.com'})])
+    pool.close()
+
+
+@with_setup(set_up, tear_down)
+def test_import_batch_spans():
+    rows = [(1, {'email': 'ben@example.com'}), (2, {'name': 'Nobody'})]
+    fake.fail_next(400, path='users')
+    recorder = RecordingAdapter()
+    Intercom.tracer.add_adapter(recorder)
+    try:
+        imported, rejects = _import_batch(rows, None, 0)
+    finally:
+        Intercom.tracer.remove_adapter(recorder)
+    eq_((0, [1, 2]), (imported, [line for line, _, _ in rejects]))
+    batch = recorder.spans[-1]
+    eq_(('import_users.batch', {'rows': 2}), (batch.name, batch.attributes))
+    items = [span for span in recorder.spans if span.name == 'item']
+    eq_([{'line': 1}, {'line': 2}], [span.attributes for span in items])
+    eq_([batch, batch], [span.parent for span in items])
+    ok_(all(span.error is not None for span in items))
+
+
+@with_setup(set_up, tear_down)
+def test_main():
+    path = write('users.csv', 'email,plan\nben@example.com,pro\n')
+    eq_(0, main([
+        path, '--processes', '1', '--app-id', 'fake-app-id',
+        '--api-key', 'fake-api-key', '--api-endpoint', fake.url]))
+    user = fake._find_user({'email': 'ben@example.com'})
+    eq_('pro', user['custom_data']['plan'])
@@ -0,0 +1,36 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+# Keeps the memory footprint of bulk operations a tested property. The
+# ceilings are deliberately generous; they catch regressions such as a
+# streaming iterator that holds on to every page, not small changes.
+#
+
+from benchmarks import memory
+from nose.plugins.skip import SkipTest
+from nose.tools import ok_
+
+results = {}
+
+
+def setup_module():
+    if memory.tracemalloc is None:
+        raise SkipTest('tracemalloc is not available')
+    results.update(memory.run(records=2000, per_page=100, fan_out=200))
+
+
+def test_streaming_does_not_retain_records():
+    for name in ('User.iter_all (User)', 'User.iter_all (dict)'):
+        ok_(results[name]['steady_kib_per_1k'] < 64, name)
+        # only a page at a time is held
+        ok_(results[name]['peak_kib_per_1k'] <
+            results['User.all (User)']['steady_kib_per_1k'] / 4, name)
+
+
+def test_user_footprint():
+    ok_(results['User.all (User)']['steady_kib_per_1k'] < 8 * 1024)
+
+
+def test_writes_do_not_accumulate():
+    ok_(results['User.save']['steady_kib_per_1k'] < 128)
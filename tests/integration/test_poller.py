@@ -0,0 +1,170 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import os
+import shutil
+import tempfile
+
+from intercom import Intercom
+from intercom import MessageThread
+from intercom import User
+from intercom.fake_server import FakeIntercom
+from intercom.poller import MessagePoller
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import with_setup
+
+fake = FakeIntercom(app_id='fake-app-id', api_key='fake-api-key')
+saved = {}
+tmpdir = []
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def setup_module():
+    saved.update(
+        api_endpoint=Intercom.api_endpoint, app_id=Intercom.app_id,
+        api_key=Intercom.api_key)
+    fake.start()
+    Intercom.api_endpoint = fake.url
+    Intercom.app_id = 'fake-app-id'
+    Intercom.api_key = 'fake-api-key'
+
+
+def teardown_module():
+    fake.stop()
+    for name, value in saved.items():
+        setattr(Intercom, name, value)
+
+
+def set_up():
+    fake.reset()
+    fake.seed_users(3)
+    fake.seed_threads(1)
+    tmpdir.append(tempfile.mkdtemp())
+
+
+def tear_down():
+    shutil.rmtree(tmpdir.pop())
+
+
+def messages(updates):
+    return sorted(
+        (update.user, update.thread.thread_id, message.html)
+        for update in updates for message in update.messages)
+
+
+@with_setup(set_up, tear_down)
+def test_new_messages():
+    clock = Clock()
+    emails = ['user1@example.com', 'user2@example.com']
+    poller = MessagePoller(emails, clock=clock)
+    # the existing messages are taken as seen
+    eq_([], poller.poll_once())
+    eq_(2, fake.request_count('GET', 'users/message_threads'))
+
+    thread = MessageThread.find_all(email='user1@example.com')[0]
+    fake.admin_reply(thread.thread_id, 'One')
+    fake.admin_reply(thread.thread_id, 'Two')
+    # nobody is due yet
+    eq_([], poller.poll_once())
+    clock.now += 20
+    eq_([('user1@example.com', thread.thread_id, '<p>One</p>'),
+         ('user1@example.com', thread.thread_id, '<p>Two</p>')],
+        messages(poller.poll_once()))
+    clock.now += 20
+    eq_([], poller.poll_once())
+
+    # a new thread is reported in full
+    clock.now += 40
+    new = MessageThread.create(email='user2@example.com', body='Help')
+    eq_([('user2@example.com', new.thread_id, '<p>Help</p>')],
+        messages(poller.poll_once()))
+
+
+@with_setup(set_up, tear_down)
+def test_adaptive_interval():
+    clock = Clock()
+    poller = MessagePoller(
+        ['user1@example.com'], min_interval=10, max_interval=35,
+        clock=clock)
+    intervals = []
+    for _ in range(4):
+        clock.now = poller.next_due()
+        poller.poll_once()
+        intervals.append(poller.next_due() - clock.now)
+    eq_([20, 35, 35, 35], intervals)
+
+    thread = MessageThread.find_all(email='user1@example.com')[0]
+    fake.admin_reply(thread.thread_id, 'Hello')
+    clock.now = poller.next_due()
+    eq_(1, len(poller.poll_once()))
+    eq_(10, poller.next_due() - clock.now)
+
+
+@with_setup(set_up, tear_down)
+def test_checkpoint():
+    clock = Clock()
+    path = os.path.join(tmpdir[-1], 'poller.json')
+    user = User.find(email='user3@example.com')
+    poller = MessagePoller([user], path=path, clock=clock)
+    poller.poll_once()
+    poller.save()
+    ok_(os.path.exists(path))
+
+    thread = MessageThread.find_all(user_id=user.user_id)[0]
+    fake.admin_reply(thread.thread_id, 'Back again')
+    clock.now += 20
+    restarted = MessagePoller([user], path=path, clock=clock)
+    eq_([(user, thread.thread_id, '<p>Back again</p>')],
+        messages(restarted.poll_once()))
+
+
+@with_setup(set_up, tear_down)
+def test_checkpoint_after_callback():
+    clock = Clock()
+    path = os.path.join(tmpdir[-1], 'poller.json')
+    poller = MessagePoller(['user1@example.com'], path=path, clock=clock)
+    poller.poll_once()
+    poller.save()
+    thread = MessageThread.find_all(email='user1@example.com')[0]
+    fake.admin_reply(thread.thread_id, 'Unhandled')
+    clock.now += 20
+
+    def fail(update):
+        raise RuntimeError('handler failed')
+
+    try:
+        poller.run(fail)
+    except RuntimeError:
+        pass
+    # the update was not handled, so it is reported again
+    restarted = MessagePoller(['user1@example.com'], path=path, clock=clock)
+    eq_([('user1@example.com', thread.thread_id, '<p>Unhandled</p>')],
+        messages(restarted.poll_once()))
+
+
+@with_setup(set_up, tear_down)
+def test_remove_forgets_threads():
+    poller = MessagePoller(['user1@example.com', 'user2@example.com'])
+    poller.poll_once()
+    eq_(2, len(poller.threads))
+    poller.remove('user1@example.com')
+    eq_(['email:user2@example.com'],
+        [seen['user'] for seen in poller.threads.values()])
+
+
+@with_setup(set_up, tear_down)
+def test_report_existing():
+    poller = MessagePoller(['1', '2'], key='user_id', report_existing=True)
+    eq_(2, len(poller.poll_once()))
+    eq_(0, len(poller.poll_once()))
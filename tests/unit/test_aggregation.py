@@ -0,0 +1,167 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+import time
+import weakref
+
+from intercom import Event
+from intercom import Intercom
+from intercom.aggregation import EventAggregator
+from intercom.aggregation import _flush_at_exit
+from intercom.metrics import MetricsCollector
+from intercom.tracing import RecordingAdapter
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class EventsTransport(Transport):
+
+    def __init__(self, status=202):
+        self.status = status
+        self.events = []
+
+    def send(self, method, url, data=None, **kwargs):
+        self.events.append(json.loads(data))
+        return Response(self.status, {}, b'')
+
+
+def tear_down():
+    if Intercom.event_aggregator is not None:
+        Intercom.event_aggregator.stop()
+    Intercom.transport = default_transport
+    Intercom.event_aggregator = None
+
+
+def view(email='ben@example.com', created=1400000000, name='page-viewed',
+         metadata=None):
+    Event.create(event_name=name, email=email, created=created,
+                 metadata=metadata)
+
+
+@with_setup(teardown=tear_down)
+def test_aggregates_per_user_and_name():
+    clock = Clock()
+    metrics = MetricsCollector()
+    transport = Intercom.transport = EventsTransport()
+    aggregator = Intercom.event_aggregator = EventAggregator(
+        ['page-viewed'], window=60, metrics=metrics, clock=clock)
+    for second in (5, 1, 9):
+        view(created=1400000000 + second)
+    view(email='ann@example.com')
+    # other events, and events with metadata, are sent as they are
+    view(name='signed-up')
+    view(metadata={'page': '/'})
+    eq_(2, len(transport.events))
+    eq_(4, aggregator.aggregated)
+    eq_(2, aggregator.flush())
+    events = dict((e['email'], e) for e in transport.events[2:])
+    eq_({'count': 3, 'first': 1400000001, 'last': 1400000009},
+        events['ben@example.com']['metadata'])
+    eq_(1400000009, events['ben@example.com']['created'])
+    eq_('page-viewed', events['ben@example.com']['event_name'])
+    eq_(1, events['ann@example.com']['metadata']['count'])
+    eq_(4, metrics.counter('events_aggregated_total'))
+    eq_(2, metrics.counter('aggregate_events_sent_total'))
+    eq_(0, aggregator.flush())
+
+
+@with_setup(teardown=tear_down)
+def test_tumbling_window():
+    clock = Clock()
+    transport = Intercom.transport = EventsTransport()
+    Intercom.event_aggregator = EventAggregator(window=60, clock=clock)
+    view()
+    view()
+    clock.now = 60
+    # the first event of a window flushes the last one
+    view()
+    eq_(1, len(transport.events))
+    eq_(2, transport.events[0]['metadata']['count'])
+
+
+@with_setup(teardown=tear_down)
+def test_max_keys():
+    transport = Intercom.transport = EventsTransport()
+    Intercom.event_aggregator = EventAggregator(max_keys=10)
+    for number in range(25):
+        view(email='user%s@example.com' % number)
+    eq_(20, len(transport.events))
+    ok_(len(Intercom.event_aggregator.counts) < 10)
+
+
+@with_setup(teardown=tear_down)
+def test_failures_are_counted():
+    Intercom.transport = EventsTransport(status=500)
+    aggregator = Intercom.event_aggregator = EventAggregator()
+    view()
+    eq_(0, aggregator.flush())
+    eq_(1, aggregator.failed)
+
+
+@with_setup(teardown=tear_down)
+def test_started():
+    transport = Intercom.transport = EventsTransport()
+    aggregator = Intercom.event_aggregator = EventAggregator(
+        window=0.05).start()
+    view()
+    time.sleep(0.3)
+    eq_(1, len(transport.events))
+    view()
+    aggregator.stop()
+    eq_(2, len(transport.events))
+
+
+@with_setup(teardown=tear_down)
+def test_flushed_at_exit_until_stopped():
+    transport = Intercom.transport = EventsTransport()
+    # never started
+    aggregator = Intercom.event_aggregator = EventAggregator()
+    view()
+    _flush_at_exit(weakref.ref(aggregator))
+    eq_(1, len(transport.events))
+    aggregator.start()
+    view()
+    _flush_at_exit(weakref.ref(aggregator))
+    eq_(2, len(transport.events))
+    aggregator.stop()
+    view()
+    _flush_at_exit(weakref.ref(aggregator))
+    eq_(2, len(transport.events))
+
+
+@with_setup(teardown=tear_down)
+def test_flush_spans():
+    Intercom.transport = EventsTransport()
+    aggregator = Intercom.event_aggregator = EventAggregator()
+    view()
+    view(email='ann@example.com')
+    recorder = RecordingAdapter()
+    Intercom.tracer.add_adapter(recorder)
+    try:
+        eq_(2, aggregator.flush())
+    finally:
+        Intercom.tracer.remove_adapter(recorder)
+    flush = recorder.spans[-1]
+    eq_(('EventAggregator.flush', None, {'events': 2}),
+        (flush.name, flush.parent, flush.attributes))
+    items = [span for span in recorder.spans if span.name == 'item']
+    eq_([flush, flush], [span.parent for span in items])
+    http = [span for span in recorder.spans if span.name == 'http']
+    eq_(items, [span.parent for span in http])
@@ -0,0 +1,118 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import os
+import shutil
+import tempfile
+
+from intercom import Intercom
+from intercom import ResourceNotFound
+from intercom.cassette import CassetteError
+from intercom.cassette import RecordingTransport
+from intercom.cassette import ReplayTransport
+from intercom.cassette import load
+from intercom.cassette import play
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+tmpdir = []
+default_transport = Intercom.transport
+
+
+class StubTransport(Transport):
+    """ Answers from a dict of (method, url) to Response. """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.sent = []
+
+    def send(self, method, url, **kwargs):
+        self.sent.append((method, url, kwargs))
+        return self.responses[(method, url)]
+
+
+def set_up():
+    tmpdir.append(tempfile.mkdtemp())
+    Intercom.app_id = 'app-id'
+    Intercom.api_key = 'api-key'
+
+
+def tear_down():
+    shutil.rmtree(tmpdir.pop())
+    Intercom.transport = default_transport
+
+
+def record(name):
+    path = os.path.join(tmpdir[-1], name)
+    endpoint = Intercom.api_endpoint
+    stub = StubTransport({
+        ('GET', endpoint + 'users'): Response(
+            200, {'X-RateLimit-Remaining': '10'}, b'{"email": "a@b.c"}'),
+        ('POST', endpoint + 'users/notes'): Response(
+            200, {}, b'{"html": "<p>Hi</p>"}'),
+        ('POST', endpoint + 'users/impressions'): Response(404, {}, b''),
+    })
+    Intercom.transport = RecordingTransport(stub, path)
+    Intercom.get_user(email='a@b.c')
+    Intercom.create_note(email='a@b.c', body='Hi')
+    raises(ResourceNotFound)(Intercom.create_impression)(email='a@b.c')
+    Intercom.transport.close()
+    return path
+
+
+@with_setup(set_up, tear_down)
+def test_record():
+    for name in ('session.jsonl', 'session.jsonl.gz'):
+        interactions = load(record(name))
+        eq_([i.method for i in interactions], ['GET', 'POST', 'POST'])
+        eq_(interactions[0].params, {'email': 'a@b.c'})
+        eq_(interactions[0].response_headers['X-RateLimit-Remaining'], '10')
+        eq_(interactions[1].content, b'{"html": "<p>Hi</p>"}')
+        eq_(interactions[2].status_code, 404)
+        ok_(interactions[2].offset >= interactions[0].offset)
+        ok_('Authorization' not in (interactions[1].headers or {}))
+
+
+@with_setup(set_up, tear_down)
+def test_replay():
+    Intercom.transport = ReplayTransport(record('session.jsonl'))
+    # matched on the body
+    eq_(Intercom.create_note(email='a@b.c', body='Hi'), {'html': '<p>Hi</p>'})
+    # matched on the method and path only
+    eq_(Intercom.get_user(email='x@y.z'), {'email': 'a@b.c'})
+    raises(ResourceNotFound)(Intercom.create_impression)(email='a@b.c')
+    eq_(Intercom.transport.remaining, 0)
+    raises(CassetteError)(Intercom.get_user)(email='a@b.c')
+
+
+@with_setup(set_up, tear_down)
+def test_replay_empty_params():
+    path = os.path.join(tmpdir[-1], 'pages.jsonl')
+    url = Intercom.api_endpoint + 'users'
+    responses = [Response(200, {}, b'{"page": 2}'),
+                 Response(200, {}, b'{"page": 1}')]
+    stub = StubTransport({})
+    stub.send = lambda method, url, **kwargs: responses.pop(0)
+    recorder = RecordingTransport(stub, path)
+    recorder.send('GET', url, params={'page': 2})
+    recorder.send('GET', url, params={})
+    recorder.close()
+    replay = ReplayTransport(path)
+    # {} and None are the same, so the exact match is found
+    eq_(b'{"page": 1}', replay.send('GET', url, params={}).content)
+    eq_(b'{"page": 2}', replay.send('GET', url, params={'page': 2}).content)
+
+
+@with_setup(set_up, tear_down)
+def test_play():
+    path = record('session.jsonl')
+    eq_(play(path)['calls'], 3)
+    stats = play(path, speed=10.0, workers=2)
+    eq_(stats['calls'], 3)
+    eq_(stats['errors'], 1)
@@ -0,0 +1,202 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom import Intercom
+from intercom import ServiceUnavailableError
+from intercom import User
+from intercom.circuit import CLOSED
+from intercom.circuit import CircuitBreaker
+from intercom.circuit import CircuitOpenError
+from intercom.circuit import HALF_OPEN
+from intercom.circuit import OPEN
+from intercom.circuit import Outbox
+from intercom.metrics import MetricsCollector
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyTransport(Transport):
+    """ Returns status for every request, or raises error. """
+
+    def __init__(self, status=200, error=None):
+        self.status = status
+        self.error = error
+        self.sent = []
+
+    def send(self, method, url, **kwargs):
+        self.sent.append((method, url, kwargs))
+        if self.error is not None:
+            raise self.error
+        return Response(self.status, {}, b'{"user_id": "1"}')
+
+
+def url(path):
+    return Intercom.api_endpoint + path
+
+
+def tear_down():
+    Intercom.transport = default_transport
+
+
+def test_opens_after_threshold():
+    clock = Clock()
+    inner = FlakyTransport(503)
+    metrics = MetricsCollector()
+    breaker = CircuitBreaker(
+        inner, failure_threshold=3, recovery_timeout=10, clock=clock,
+        metrics=metrics)
+    for _ in range(2):
+        breaker.send('GET', url('users'))
+    eq_(CLOSED, breaker.state('users'))
+    breaker.send('GET', url('users'))
+    eq_(OPEN, breaker.state('users'))
+    # other endpoints are unaffected
+    eq_(CLOSED, breaker.state('users/notes'))
+
+    clock.now = 4
+    try:
+        breaker.send('GET', url('users'))
+        ok_(False)
+    except CircuitOpenError as exc:
+        eq_('users', exc.endpoint)
+        eq_(6, exc.retry_after)
+    eq_(3, len(inner.sent))
+    eq_(1, metrics.counter('circuit_rejected_total', endpoint='users'))
+    eq_(1, metrics.counter(
+        'circuit_transitions_total', endpoint='users', state=OPEN))
+    eq_({(('endpoint', 'users'),): 2}, metrics.gauges['circuit_state'])
+
+
+def test_success_resets_failures():
+    inner = FlakyTransport(500)
+    breaker = CircuitBreaker(inner, failure_threshold=2)
+    breaker.send('GET', url('users'))
+    inner.status = 404
+    breaker.send('GET', url('users'))
+    inner.status = 500
+    breaker.send('GET', url('users'))
+    eq_(CLOSED, breaker.state('users'))
+
+
+def test_half_open():
+    clock = Clock()
+    inner = FlakyTransport(error=IOError('timed out'))
+    breaker = CircuitBreaker(
+        inner, failure_threshold=1, recovery_timeout=10, clock=clock)
+    try:
+        breaker.send('GET', url('users'))
+    except IOError:
+        pass
+    eq_(OPEN, breaker.state('users'))
+
+    # a failed trial opens the circuit again
+    clock.now = 10
+    try:
+        breaker.send('GET', url('users'))
+    except IOError:
+        pass
+    eq_(OPEN, breaker.state('users'))
+
+    # a successful trial closes it
+    clock.now = 20
+    inner.error = None
+    eq_(200, breaker.send('GET', url('users')).status_code)
+    eq_(CLOSED, breaker.state('users'))
+    eq_(3, len(inner.sent))
+
+
+def test_half_open_trials():
+    clock = Clock()
+    breaker = CircuitBreaker(
+        FlakyTransport(500), failure_threshold=1, recovery_timeout=1,
+        half_open_calls=2, clock=clock)
+    breaker.send('GET', url('users'))
+    clock.now = 1
+    circuit = breaker.circuit('users')
+    ok_(breaker._allow(circuit))
+    eq_(HALF_OPEN, circuit.state)
+    ok_(breaker._allow(circuit))
+    ok_(not breaker._allow(circuit))
+
+
+@with_setup(teardown=tear_down)
+def test_fails_fast_through_intercom():
+    Intercom.transport = CircuitBreaker(
+        FlakyTransport(503), failure_threshold=1)
+    try:
+        User.find(user_id='1')
+    except ServiceUnavailableError:
+        pass
+    try:
+        User.find(user_id='1')
+        ok_(False)
+    except CircuitOpenError:
+        pass
+
+
+@with_setup(teardown=tear_down)
+def test_outbox():
+    inner = FlakyTransport(503)
+    outbox = Outbox(maxsize=2)
+    breaker = CircuitBreaker(inner, failure_threshold=1, fallback=outbox)
+    Intercom.transport = breaker
+    breaker.send('POST', url('users/notes'))
+
+    eq_(202, breaker.send('POST', url('users/notes'), data='1').status_code)
+    # the result of a queued write is empty
+    eq_('', Intercom._call('POST', url('users/notes'), {'body': 2}))
+    eq_(2, len(outbox))
+    # GETs, and writes when the outbox is full, fail fast
+    for method in ('GET', 'POST'):
+        try:
+            breaker.send(method, url('users/notes'))
+            ok_(False)
+        except CircuitOpenError:
+            pass
+
+    # while the circuit is still open nothing is sent
+    eq_(0, outbox.flush())
+    eq_(2, len(outbox))
+
+    breaker.reset()
+    inner.status = 200
+    eq_(2, outbox.flush())
+    eq_(0, len(outbox))
+    eq_('1', inner.sent[-2][2]['data'])
+    eq_({'body': 2}, Intercom.codec.loads(inner.sent[-1][2]['data']))
+
+
+def test_outbox_keeps_failed_requests():
+    outbox = Outbox()
+    outbox('POST', url('users/notes'), data='1')
+    outbox('POST', url('users/notes'), data='2')
+    eq_(0, outbox.flush(FlakyTransport(500)))
+    eq_(2, len(outbox))
+    eq_(0, outbox.flush(FlakyTransport(error=IOError('reset'))))
+    eq_(2, len(outbox))
+
+
+@raises(CircuitOpenError)
+def test_no_fallback_response():
+    breaker = CircuitBreaker(
+        FlakyTransport(500), failure_threshold=1,
+        fallback=lambda *args: None)
+    breaker.send('GET', url('users'))
+    breaker.send('GET', url('users'))
@@ -0,0 +1,49 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom.codec import CODECS
+from intercom.codec import fastest_codec
+from intercom.codec import get_codec
+from intercom.intercom import Intercom
+from intercom.intercom import parse_response
+from mock import Mock
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+
+def test_default_codec():
+    eq_('json', get_codec().name)
+    eq_('json', Intercom.codec.name)
+
+
+def test_fastest_codec():
+    codec = fastest_codec()
+    ok_(codec.name in CODECS)
+    eq_(codec.loads(codec.dumps({'a': [1, 2]})), {'a': [1, 2]})
+
+
+def test_stdlib_codec():
+    codec = get_codec('json')
+    eq_(codec.dumps({'a': 1}), '{"a":1}')
+    eq_(codec.loads(b'{"a": 1}'), {'a': 1})
+
+
+@raises(ValueError)
+def test_unknown_codec():
+    get_codec('yaml')
+
+
+def response(content):
+    resp = Mock()
+    resp.status_code = 200
+    resp.content = content
+    return parse_response(resp)
+
+
+def test_response_decoding():
+    eq_(response(b''), '')
+    eq_(response(b' \n'), '')
+    eq_(response(b'{"unread_messages": 1}\n'), {'unread_messages': 1})
@@ -0,0 +1,275 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import random
+import threading
+import time
+
+from intercom import Intercom
+from intercom import RateLimitError
+from intercom import ResourceNotFound
+from intercom.concurrency import AdaptiveLimiter
+from intercom.concurrency import KeyedExecutor
+from intercom.concurrency import RateLimiter
+from intercom.concurrency import TimeoutError
+from intercom.concurrency import map_concurrent
+from intercom.concurrency import user_key
+from intercom.metrics import MetricsCollector
+from intercom.tracing import RecordingAdapter
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+
+def test_additive_increase():
+    limiter = AdaptiveLimiter(initial=2, maximum=4)
+    # about a limit's worth of successes adds one
+    for _ in range(3):
+        limiter.release(limiter.acquire())
+    eq_(3, limiter.limit)
+    for _ in range(100):
+        limiter.release(limiter.acquire())
+    eq_(4, limiter.limit)
+
+
+def test_multiplicative_decrease():
+    metrics = MetricsCollector()
+    limiter = AdaptiveLimiter(initial=16, metrics=metrics, name='notes')
+    starts = [limiter.acquire() for _ in range(3)]
+    limiter.release(starts[0], RateLimitError('Too Many Requests'))
+    eq_(8, limiter.limit)
+    # calls already in flight don't decrease it again
+    limiter.release(starts[1], RateLimitError('Too Many Requests'))
+    eq_(8, limiter.limit)
+    # other errors don't count
+    limiter.release(starts[2], ResourceNotFound('Not found.'))
+    eq_(8, limiter.limit)
+    limiter.release(limiter.acquire(), RateLimitError('Too Many Requests'))
+    eq_(4, limiter.limit)
+    eq_({(('limiter', 'notes'),): 4}, metrics.gauges['concurrency_limit'])
+    for _ in range(5):
+        limiter.release(limiter.acquire(), RateLimitError('Too Many'))
+    eq_(1, limiter.limit)
+
+
+def test_latency_spike():
+    limiter = AdaptiveLimiter(initial=8, tolerance=3.0, min_spike=0.005)
+    limiter.average = 0.001
+    start = limiter.acquire()
+    time.sleep(0.01)
+    limiter.release(start)
+    eq_(4, limiter.limit)
+
+
+def test_acquire_waits():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    start = limiter.acquire()
+    acquired = []
+    thread = threading.Thread(
+        target=lambda: acquired.append(limiter.acquire()))
+    thread.start()
+    time.sleep(0.02)
+    eq_([], acquired)
+    limiter.release(start)
+    thread.join()
+    eq_(1, len(acquired))
+
+
+def test_rate_limiter():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+
+    limiter = RateLimiter(10, burst=2, clock=lambda: now[0], sleep=sleep)
+    eq_([0, 0, 0.1, 0.2], [
+        round(limiter.acquire(), 6) for _ in range(4)])
+    eq_([0.1, 0.2], [round(s, 6) for s in slept])
+    # idle time earns tokens, up to burst
+    now[0] = 10.0
+    eq_([0, 0, 0.1], [round(limiter.acquire(), 6) for _ in range(3)])
+
+
+def test_map_concurrent():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def square(number):
+        with lock:
+            active.append(number)
+            peak.append(len(active))
+        time.sleep(0.005)
+        with lock:
+            active.remove(number)
+        if number == 3:
+            raise ResourceNotFound('Not found.')
+        return number * number
+
+    limiter = AdaptiveLimiter(initial=2, maximum=4)
+    results = list(map_concurrent(square, range(20), limiter=limiter))
+    eq_(20, len(results))
+    eq_(dict((n, n * n) for n in range(20) if n != 3), dict(
+        (r.item, r.result) for r in results if r.error is None))
+    errors = [r for r in results if r.error is not None]
+    eq_(3, errors[0].item)
+    ok_(isinstance(errors[0].error, ResourceNotFound))
+    ok_(max(peak) <= 4)
+    eq_(4, limiter.limit)
+
+
+def test_map_concurrent_retries():
+    calls = {}
+    lock = threading.Lock()
+
+    def flaky(number):
+        with lock:
+            calls[number] = calls.get(number, 0) + 1
+            attempt = calls[number]
+        if number % 2 and attempt < 3:
+            raise RateLimitError('Too many requests.')
+        if number == 4:
+            raise ResourceNotFound('Not found.')
+        return number
+
+    results = list(map_concurrent(
+        flaky, range(6), workers=2, retries=2, backoff=0.001))
+    errors = dict((r.item, r.error) for r in results if r.error)
+    eq_([4], list(errors))
+    # overload errors are retried, others are not
+    eq_({0: 1, 1: 3, 2: 1, 3: 3, 4: 1, 5: 3}, calls)
+    calls.clear()
+    results = list(map_concurrent(flaky, [1], retries=1, backoff=0.001))
+    ok_(isinstance(results[0].error, RateLimitError))
+    eq_({1: 2}, calls)
+
+
+def test_map_concurrent_stops():
+    consumed = []
+
+    def items():
+        for number in range(1000):
+            consumed.append(number)
+            yield number
+
+    results = map_concurrent(lambda n: n, items(), workers=2)
+    next(results)
+    results.close()
+    time.sleep(0.3)
+    ok_(len(consumed) < 100)
+
+
+def test_map_concurrent_spans():
+    recorder = RecordingAdapter()
+    Intercom.tracer.add_adapter(recorder)
+
+    def traced(number):
+        with Intercom.tracer.span('work'):
+            return number
+
+    try:
+        with Intercom.tracer.span('bulk') as bulk:
+            list(map_concurrent(traced, range(3)))
+        list(map_concurrent(traced, range(2), name='operation'))
+    finally:
+        Intercom.tracer.remove_adapter(recorder)
+    items = [span for span in recorder.spans if span.name == 'item']
+    eq_(5, len(items))
+    works = [span for span in recorder.spans if span.name == 'work']
+    ok_(all(span.parent in items for span in works))
+    eq_(3, len([span for span in items if span.parent is bulk]))
+    operation = recorder.spans[-1]
+    eq_(('operation', None), (operation.name, operation.parent))
+    eq_(2, len([span for span in items if span.parent is operation]))
+    eq_({'attempts': 1}, items[0].attributes)
+
+
+def test_map_concurrent_worker_exits():
+    def leave(number):
+        raise SystemExit(number)
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.extend(map_concurrent(leave, [1], workers=1)))
+    thread.daemon = True
+    thread.start()
+    thread.join(5)
+    ok_(not thread.is_alive())
+    eq_([], results)
+
+
+def test_keyed_executor():
+    writes = {}
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def write(user, number):
+        with lock:
+            active.append(user)
+            peak.append(len(active))
+            # no two calls for a user at once
+            eq_(1, active.count(user))
+        time.sleep(random.random() * 0.002)
+        with lock:
+            active.remove(user)
+            writes.setdefault(user, []).append(number)
+        return number
+
+    with KeyedExecutor(workers=4) as executor:
+        futures = [
+            executor.submit(user, write, user, number)
+            for number in range(20) for user in ('ann', 'ben', 'cat')]
+    eq_(list(range(20)), writes['ann'])
+    eq_(list(range(20)), writes['ben'])
+    eq_(list(range(20)), writes['cat'])
+    ok_(max(peak) > 1)
+    ok_(all(future.done() for future in futures))
+    eq_(19, futures[-1].result())
+
+
+def test_keyed_executor_errors():
+    def fail():
+        raise ResourceNotFound('Not found.')
+
+    executor = KeyedExecutor()
+    failed = executor.submit('ann', fail)
+    after = executor.submit('ann', lambda: 'saved')
+    eq_('saved', after.result(timeout=1))
+    ok_(isinstance(failed.exception(), ResourceNotFound))
+    try:
+        failed.result()
+        ok_(False)
+    except ResourceNotFound:
+        pass
+    executor.shutdown()
+
+
+def test_future_timeout():
+    executor = KeyedExecutor()
+    release = threading.Event()
+    future = executor.submit('ann', release.wait)
+    try:
+        future.result(timeout=0.01)
+        ok_(False)
+    except TimeoutError:
+        pass
+    release.set()
+    eq_(None, future.exception(timeout=1))
+    executor.shutdown()
+
+
+def test_user_key():
+    eq_('email:ben@example.com', user_key('ben@example.com'))
+    eq_('user_id:7', user_key({'user_id': '7', 'email': 'b@example.com'}))
+    eq_('user_id:7', user_key('7', key='user_id'))
+
+
+@raises(RuntimeError)
+def test_keyed_executor_shutdown():
+    executor = KeyedExecutor()
+    executor.shutdown()
+    executor.submit('ann', lambda: None)
@@ -0,0 +1,143 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+import threading
+
+from intercom import DeadlineExceeded
+from intercom import Intercom
+from intercom import User
+from intercom.concurrency import map_concurrent
+from intercom.deadline import Deadline
+from intercom.deadline import current
+from intercom.transport import RequestsTransport
+from intercom.transport import Response
+from intercom.transport import Timeout
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+default_timeout = Intercom.timeout
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PagesTransport(Transport):
+    """ Serves pages of one user, each taking a second of clock time. """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.timeouts = []
+
+    def send(self, method, url, params=None, timeout=None, **kwargs):
+        self.clock.now += 1
+        self.timeouts.append(timeout)
+        page = params['page']
+        return Response(200, {}, json.dumps({
+            'users': [{'email': 'user%s@example.com' % page}],
+            'total_pages': 5}).encode('ascii'))
+
+
+def tear_down():
+    Intercom.transport = default_transport
+    Intercom.timeout = default_timeout
+
+
+def test_timeout():
+    eq_(Timeout(3, 3), Timeout.of(3))
+    timeout = Timeout(connect=1, read=10)
+    ok_(Timeout.of(timeout) is timeout)
+    eq_(Timeout(1, 4), timeout.capped(4))
+    eq_(Timeout(4, 4), Timeout().capped(4))
+
+
+def test_nested_deadlines():
+    clock = Clock()
+    eq_(None, current())
+    with Deadline(10, timeout=Timeout(1, 2), clock=clock) as outer:
+        ok_(current() is outer)
+        with Deadline(20, clock=clock) as inner:
+            ok_(current() is inner)
+            # the earlier deadline applies
+            eq_(10, inner.remaining())
+            eq_(Timeout(1, 2), inner.timeout)
+        ok_(current() is outer)
+        clock.now = 10
+        ok_(outer.expired)
+    eq_(None, current())
+
+
+@with_setup(teardown=tear_down)
+def test_request_timeout():
+    clock = Clock()
+    Intercom.timeout = 10
+    eq_(10, Intercom._request_timeout())
+    with Deadline(30, clock=clock):
+        eq_(Timeout(10, 10), Intercom._request_timeout())
+        clock.now = 25
+        eq_(Timeout(5, 5), Intercom._request_timeout())
+    Intercom.timeout = Timeout(connect=2, read=10)
+    with Deadline(5, clock=clock):
+        eq_(Timeout(2, 5), Intercom._request_timeout())
+
+
+@with_setup(teardown=tear_down)
+def test_pagination_stops_at_deadline():
+    clock = Clock()
+    transport = Intercom.transport = PagesTransport(clock)
+    emails = []
+    try:
+        with Deadline(2.5, clock=clock):
+            for user in User.iter_all():
+                emails.append(user.email)
+        ok_(False)
+    except DeadlineExceeded:
+        pass
+    eq_(['user1@example.com', 'user2@example.com', 'user3@example.com'],
+        emails)
+    # each page got only the time remaining
+    eq_([Timeout(2.5, 2.5), Timeout(1.5, 1.5), Timeout(0.5, 0.5)],
+        transport.timeouts)
+
+
+@raises(DeadlineExceeded)
+def test_bulk_stops_at_deadline():
+    clock = Clock()
+    seen = []
+    lock = threading.Lock()
+
+    def work(number):
+        with lock:
+            seen.append(current())
+            clock.now += 1
+        return number
+
+    with Deadline(3, clock=clock) as active:
+        try:
+            list(map_concurrent(work, range(100), workers=2))
+        finally:
+            ok_(len(seen) < 10)
+            ok_(all(deadline is active for deadline in seen))
+
+
+def test_requests_timeout():
+    sent = {}
+
+    class Session(object):
+        def request(self, method, url, **kwargs):
+            sent.update(kwargs)
+
+    RequestsTransport(Session()).send('GET', 'url', timeout=Timeout(1, 5))
+    eq_((1, 5), sent['timeout'])
@@ -0,0 +1,162 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import datetime
+import json
+import threading
+import time
+
+from intercom import Event
+from intercom import Intercom
+from intercom import ServiceUnavailableError
+from intercom.dedup import BloomFilter
+from intercom.dedup import EventFilter
+from intercom.dedup import event_key
+from intercom.metrics import MetricsCollector
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class EventsTransport(Transport):
+
+    def __init__(self, delay=0, status=202):
+        self.delay = delay
+        self.status = status
+        self.events = []
+
+    def send(self, method, url, data=None, **kwargs):
+        self.events.append(json.loads(data))
+        time.sleep(self.delay)
+        return Response(self.status, {}, b'')
+
+
+def tear_down():
+    Intercom.transport = default_transport
+    Intercom.event_filter = None
+
+
+def event(name='shared-item', created=1400000000, **params):
+    return dict(
+        params, event_name=name, email='ben@example.com', created=created)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(8 * 1024 * 8, 0.01)
+    keys = [('key%s' % n).encode('ascii') for n in range(bloom.capacity)]
+    for key in keys:
+        bloom.add(key)
+    ok_(all(key in bloom for key in keys))
+    ok_(bloom.full)
+    others = [('other%s' % n).encode('ascii') for n in range(10000)]
+    false_positives = sum(1 for key in others if key in bloom)
+    # about the error rate, once at capacity
+    ok_(false_positives < 300, false_positives)
+    eq_(8 * 1024, len(bloom.array))
+
+
+def test_event_key():
+    eq_(event_key(event(metadata={'a': 1, 'b': 2})),
+        event_key(event(metadata={'b': 2, 'a': 1})))
+    ok_(event_key(event(metadata={'a': 1})) != event_key(event()))
+    ok_(event_key(event()) != event_key(event(created=1400000001)))
+    ok_(event_key(event()) != event_key(event(name='other')))
+
+
+def test_event_filter_window():
+    clock = Clock()
+    metrics = MetricsCollector()
+    events = EventFilter(window=60, metrics=metrics, clock=clock)
+    ok_(not events.seen(event()))
+    events.add(event())
+    ok_(events.seen(event()))
+    ok_(not events.seen(event(name='other')))
+    # remembered for at least the window
+    clock.now = 90
+    ok_(events.seen(event()))
+    # and forgotten after twice the window
+    clock.now = 150
+    ok_(not events.seen(event()))
+    eq_(1, events.sent)
+    eq_(2, events.duplicates)
+    eq_(2, metrics.counter('events_deduplicated_total'))
+    eq_(1, metrics.counter('events_sent_total'))
+
+
+def test_event_filter_memory():
+    events = EventFilter(max_bytes=1024, error_rate=0.01)
+    for number in range(5000):
+        events.add(event(created=number))
+    ok_(events.rotations > 1)
+    eq_(1024, len(events.current.array) + len(events.previous.array))
+    # the recent events are remembered
+    ok_(events.seen(event(created=4999)))
+
+
+@with_setup(teardown=tear_down)
+def test_create_event_deduplicated():
+    transport = Intercom.transport = EventsTransport()
+    Intercom.event_filter = EventFilter()
+    created = datetime.datetime(2014, 5, 1, 12, 0)
+    for _ in range(3):
+        Event.create(
+            event_name='shared-item', email='ben@example.com',
+            metadata={'item': 1}, created=created)
+    Event.create(
+        event_name='shared-item', email='ben@example.com',
+        metadata={'item': 2}, created=created)
+    eq_(2, len(transport.events))
+    eq_(2, Intercom.event_filter.duplicates)
+    ok_(isinstance(transport.events[0]['created'], int))
+
+
+@with_setup(teardown=tear_down)
+def test_concurrent_duplicates():
+    transport = Intercom.transport = EventsTransport(delay=0.1)
+    Intercom.event_filter = EventFilter()
+    go = threading.Event()
+
+    def create():
+        go.wait()
+        Event.create(event_name='shared-item', email='ben@example.com',
+                     created=1400000000)
+
+    threads = [threading.Thread(target=create) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    go.set()
+    for thread in threads:
+        thread.join()
+    eq_(1, len(transport.events))
+    eq_(1, Intercom.event_filter.duplicates)
+
+
+@with_setup(teardown=tear_down)
+def test_failed_event_is_released():
+    transport = Intercom.transport = EventsTransport(status=503)
+    Intercom.event_filter = EventFilter()
+    try:
+        Event.create(event_name='shared-item', email='ben@example.com',
+                     created=1400000000)
+    except ServiceUnavailableError:
+        pass
+    transport.status = 202
+    Event.create(event_name='shared-item', email='ben@example.com',
+                 created=1400000000)
+    eq_(2, len(transport.events))
+    eq_(0, Intercom.event_filter.duplicates)
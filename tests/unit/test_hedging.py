@@ -0,0 +1,126 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import threading
+import time
+
+from intercom import Intercom
+from intercom.hedging import HedgedTransport
+from intercom.hedging import LatencyWindow
+from intercom.metrics import MetricsCollector
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+URL = Intercom.api_endpoint + 'users'
+
+
+class SlowTransport(Transport):
+    """ Sleeps for the next of delays before answering each request. """
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.lock = threading.Lock()
+        self.sent = []
+
+    def send(self, method, url, **kwargs):
+        with self.lock:
+            number = len(self.sent) + 1
+            self.sent.append(method)
+            delay = self.delays.pop(0) if self.delays else 0
+        if isinstance(delay, Exception):
+            raise delay
+        time.sleep(delay)
+        return Response(200, {}, str(number).encode('ascii'))
+
+
+def test_latency_window():
+    window = LatencyWindow(size=100, percentile=0.9, min_samples=10)
+    for number in range(9):
+        window.observe(number / 100.0)
+    eq_(None, window.delay())
+    window.observe(0.09)
+    eq_(0.09, window.delay())
+    for _ in range(100):
+        window.observe(0.01)
+    eq_(0.01, window.delay())
+
+
+def test_hedge_wins():
+    metrics = MetricsCollector()
+    transport = HedgedTransport(
+        SlowTransport(0.5, 0), max_rate=1.0, initial_delay=0.02,
+        metrics=metrics)
+    start = time.time()
+    eq_(b'2', transport.send('GET', URL).content)
+    ok_(time.time() - start < 0.4)
+    eq_((1, 1, 1), (
+        transport.requests, transport.hedges, transport.hedge_wins))
+    eq_(1, metrics.counter('hedge_wins_total', endpoint='users'))
+
+
+def test_fast_requests_are_not_hedged():
+    inner = SlowTransport()
+    transport = HedgedTransport(inner, max_rate=1.0, initial_delay=0.5)
+    for _ in range(5):
+        transport.send('GET', URL)
+    eq_(5, len(inner.sent))
+    eq_(0, transport.hedges)
+
+
+def test_writes_are_not_hedged():
+    inner = SlowTransport(0.05)
+    transport = HedgedTransport(inner, max_rate=1.0, initial_delay=0.01)
+    transport.send('POST', URL)
+    eq_(['POST'], inner.sent)
+
+
+def test_hedge_rate_is_capped():
+    inner = SlowTransport(*([0.03] * 20))
+    transport = HedgedTransport(
+        inner, max_rate=0.25, initial_delay=0.01, min_delay=0.01)
+    for _ in range(8):
+        transport.send('GET', URL)
+    eq_(2, transport.hedges)
+
+
+def test_failed_attempt_falls_back():
+    transport = HedgedTransport(
+        SlowTransport(0.05, IOError('reset')), max_rate=1.0,
+        initial_delay=0.01)
+    eq_(b'1', transport.send('GET', URL).content)
+
+
+@raises(IOError)
+def test_error_is_raised():
+    transport = HedgedTransport(
+        SlowTransport(IOError('reset')), max_rate=1.0, initial_delay=1)
+    transport.send('GET', URL)
+
+
+def test_concurrent_requests_are_not_queued():
+    go = threading.Event()
+
+    def get(transport):
+        go.wait()
+        transport.send('GET', URL)
+
+    for _ in range(5):
+        inner = SlowTransport(0, 0.1, 0.1)
+        transport = HedgedTransport(inner, max_rate=1.0, initial_delay=0.15)
+        # leaves one idle worker for the concurrent GETs to contend for
+        transport.send('GET', URL)
+        go.clear()
+        threads = [threading.Thread(target=get, args=(transport,))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        go.set()
+        for thread in threads:
+            thread.join()
+        eq_(3, len(inner.sent))
+        eq_(0, transport.hedges)
@@ -0,0 +1,76 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom import Intercom
+from intercom import ServerError
+from intercom.hooks import Hooks
+from mock import Mock
+from mock import patch
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+
+def response(status_code=200, content=b'{"unread_messages": 1}'):
+    resp = Mock()
+    resp.status_code = status_code
+    resp.content = content
+    return resp
+
+
+def test_inactive():
+    hooks = Hooks()
+    ok_(not hooks.active)
+    callback = Mock()
+    hooks.register('on_error', callback)
+    ok_(hooks.active)
+    hooks.unregister('on_error', callback)
+    ok_(not hooks.active)
+
+
+@raises(ValueError)
+def test_unknown_event():
+    Hooks().register('on_success', Mock())
+
+
+def test_call_hooks():
+    events = []
+    Intercom.hooks.register('before_request', lambda i: events.append(
+        ('before', i.method, i.endpoint, i.bytes_sent)))
+    Intercom.hooks.register('after_response', lambda i: events.append(
+        ('after', i.status_code, i.bytes_received, i.elapsed >= 0)))
+    try:
+        with patch.object(Intercom, '_send', return_value=response()):
+            Intercom.create_impression(email='somebody@example.com')
+    finally:
+        Intercom.hooks.clear()
+    eq_(events[0], ('before', 'POST', 'users/impressions', 32))
+    eq_(events[1], ('after', 200, 22, True))
+
+
+def test_error_hook():
+    errors = []
+    Intercom.hooks.register('on_error', errors.append)
+    try:
+        with patch.object(Intercom, '_send', return_value=response(500)):
+            raises(ServerError)(Intercom.get_user)(email='x@example.com')
+    finally:
+        Intercom.hooks.clear()
+    eq_(len(errors), 1)
+    eq_(errors[0].status_code, 500)
+    ok_(isinstance(errors[0].error, ServerError))
+
+
+def test_broken_hook():
+    # an exception in a hook must not break the call
+    def broken(info):
+        raise RuntimeError
+    Intercom.hooks.register('after_response', broken)
+    try:
+        with patch.object(Intercom, '_send', return_value=response()):
+            eq_(Intercom.create_impression(email='x@example.com'),
+                {'unread_messages': 1})
+    finally:
+        Intercom.hooks.clear()
@@ -0,0 +1,131 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom import Intercom
+from intercom import Note
+from intercom.circuit import CircuitBreaker
+from intercom.circuit import Outbox
+from intercom.concurrency import map_concurrent
+from intercom.idempotency import HEADER
+from intercom.idempotency import IdempotentTransport
+from intercom.idempotency import Operation
+from intercom.metrics import MetricsCollector
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedTransport(Transport):
+    """ Returns the statuses in turn, then 200s, recording the keys. """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.keys = []
+
+    def send(self, method, url, headers=None, **kwargs):
+        self.keys.append((headers or {}).get(HEADER))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return Response(status, {}, b'{"html": "<p>Hi</p>"}')
+
+
+def tear_down():
+    Intercom.transport = default_transport
+
+
+def write_keys(count):
+    return [
+        Intercom._build_request('POST', {})['headers'][HEADER]
+        for _ in range(count)]
+
+
+def test_keys():
+    keys = write_keys(3)
+    eq_(3, len(set(keys)))
+    ok_(HEADER not in Intercom._build_request('GET', {})['headers'])
+
+
+def test_operation():
+    operation = Operation('op')
+    with operation:
+        first = write_keys(2)
+    eq_(['op', 'op-2'], first)
+    with operation:
+        eq_(first, write_keys(2))
+    # outside the operation each write has a new key
+    ok_(write_keys(1)[0] not in first)
+
+
+@with_setup(teardown=tear_down)
+def test_retry_reuses_key():
+    transport = Intercom.transport = ScriptedTransport(503, 429)
+    results = list(map_concurrent(
+        lambda body: Note.create(email='ben@example.com', body=body),
+        ['Hi'], retries=2, backoff=0.001))
+    eq_(None, results[0].error)
+    eq_(3, len(transport.keys))
+    eq_(1, len(set(transport.keys)))
+
+
+@with_setup(teardown=tear_down)
+def test_outbox_reuses_key():
+    outbox = Outbox()
+    inner = ScriptedTransport()
+    Intercom.transport = CircuitBreaker(
+        ScriptedTransport(503), failure_threshold=1, fallback=outbox)
+    try:
+        Note.create(email='ben@example.com', body='Hi')
+    except Exception:
+        pass
+    Note.create(email='ben@example.com', body='Hi')
+    key = outbox.queue[0].headers[HEADER]
+    outbox.flush(inner)
+    eq_([key], inner.keys)
+
+
+def test_idempotent_transport():
+    clock = Clock()
+    metrics = MetricsCollector()
+    inner = ScriptedTransport(200, 200, 500)
+    transport = IdempotentTransport(
+        inner, window=10, metrics=metrics, clock=clock)
+    headers = {HEADER: 'key'}
+    eq_(200, transport.send('POST', 'url', headers=headers).status_code)
+    # confirmed, so not sent again
+    eq_(200, transport.send('POST', 'url', headers=headers).status_code)
+    eq_(1, len(inner.keys))
+    eq_(1, transport.suppressed)
+    eq_(1, metrics.counter('idempotent_suppressed_total', method='POST'))
+    # requests without a key are always sent
+    transport.send('GET', 'url')
+    eq_(2, len(inner.keys))
+    # until the window has passed
+    clock.now = 10
+    eq_(500, transport.send('POST', 'url', headers=headers).status_code)
+    # a failure is not confirmed
+    eq_(200, transport.send('POST', 'url', headers=headers).status_code)
+    eq_(4, len(inner.keys))
+    eq_(1, len(transport.recent))
+
+
+def test_recent_keys_maxsize():
+    transport = IdempotentTransport(ScriptedTransport(), maxsize=2)
+    for key in 'abc':
+        transport.send('POST', 'url', headers={HEADER: key})
+    eq_(2, len(transport.recent))
+    ok_(transport.recent.get('a') is None)
+    ok_(transport.recent.get('c') is not None)
@@ -2,8 +2,44 @@
 #
 # License: http://jkeyes.mit-license.org/
 #
+import os
+import subprocess
+import sys
+
 from intercom import *
+from nose.tools import eq_
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
 
 
 def test_wildcard_import():
     pass
+
+
+def test_lazy_import():
+    # importing the package must not import requests or the resources
+    script = (
+        "import sys, intercom\n"
+        "print(sorted(m for m in ('requests', 'intercom.intercom', "
+        "'intercom.user') if m in sys.modules))")
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    eq_(output.strip(), b'[]')
+
+
+def test_lazy_names():
+    import intercom
+    from intercom.user import User as UserClass
+    eq_(intercom.User, UserClass)
+    eq_(sorted(intercom.__all__), sorted(
+        n for n in dir(intercom) if n in intercom.__all__))
+
+
+def test_lazy_submodules():
+    # the submodules are attributes of the package, as they were before
+    # it imported lazily
+    script = (
+        "import intercom\n"
+        "print('%s %s' % (intercom.user.User.__name__, "
+        "intercom.intercom.Intercom.__name__))")
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    eq_(output.split()[-2:], [b'User', b'Intercom'])
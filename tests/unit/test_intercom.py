@@ -0,0 +1,68 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+
+from intercom import Intercom
+from intercom import RateLimitError
+from intercom import ServerError
+from intercom.intercom import BODY_HEADERS
+from intercom.intercom import HEADERS
+from intercom.intercom import raise_errors_on_failure
+from intercom.intercom import strip_none
+from intercom.transport import Response
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+
+def test_strip_none():
+    eq_(strip_none(None), {})
+    eq_(strip_none({'email': 'a@example.com', 'user_id': None}),
+        {'email': 'a@example.com'})
+    # falsy values other than None are sent
+    eq_(strip_none({'read': False, 'body': ''}), {'read': False, 'body': ''})
+
+
+def test_build_get_request():
+    req = Intercom._build_request(
+        'GET', {'email': 'a@example.com', 'user_id': None})
+    eq_(req['params'], {'email': 'a@example.com'})
+    ok_(req['headers'] is HEADERS)
+
+
+def test_build_post_request():
+    req = Intercom._build_request(
+        'POST', {'email': 'a@example.com', 'body': 'Hi', 'user_id': None})
+    eq_(json.loads(req['data']), {'email': 'a@example.com', 'body': 'Hi'})
+    headers = dict(req['headers'])
+    ok_(headers.pop('Idempotency-Key'))
+    eq_(BODY_HEADERS, headers)
+    Intercom.idempotency_keys = False
+    try:
+        req = Intercom._build_request('POST', {'body': 'Hi'})
+        ok_(req['headers'] is BODY_HEADERS)
+    finally:
+        Intercom.idempotency_keys = True
+
+
+def test_auth_reused():
+    Intercom.app_id = 'app-id'
+    Intercom.api_key = 'api-key'
+    auth = Intercom._get_auth()
+    ok_(Intercom._get_auth() is auth)
+    eq_(auth.header, 'Basic YXBwLWlkOmFwaS1rZXk=')
+
+    Intercom.api_key = 'another-api-key'
+    ok_(Intercom._get_auth() is not auth)
+
+
+@raises(RateLimitError)
+def test_rate_limit_error():
+    try:
+        raise_errors_on_failure(Response(429))
+    except ServerError as exc:
+        # a RateLimitError is still a ServerError
+        raise exc
@@ -0,0 +1,93 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+from intercom import Intercom
+from intercom.concurrency import RateLimiter
+from intercom.concurrency import map_concurrent
+from intercom.hooks import Hooks
+from intercom.hooks import RequestInfo
+from intercom.metrics import Histogram
+from intercom.metrics import MetricsCollector
+from intercom.intercom import ServerError
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+
+
+def info(elapsed, status_code=200, error=None):
+    i = RequestInfo('GET', 'https://api.intercom.io/users', 'users')
+    i.elapsed = elapsed
+    i.status_code = status_code
+    i.bytes_received = 10
+    i.error = error
+    return i
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    eq_(histogram.cumulative(), [(0.1, 2), (1.0, 3), ('+Inf', 4)])
+    eq_(histogram.percentile(0.5), 0.1)
+    eq_(histogram.percentile(0.99), '+Inf')
+    eq_(Histogram().percentile(0.5), None)
+
+
+def test_collector():
+    hooks = Hooks()
+    metrics = MetricsCollector(buckets=(0.1, 1.0)).attach(hooks)
+    hooks.fire('after_response', info(0.05))
+    hooks.fire('after_response', info(0.5, status_code=500))
+    hooks.fire('on_error', info(0.5, 500, ServerError('Server error.')))
+    eq_(metrics.histogram('GET', 'users').count, 2)
+    eq_(metrics.counter(
+        'requests_total', method='GET', endpoint='users', status=500), 1)
+    eq_(metrics.counter(
+        'errors_total', method='GET', endpoint='users',
+        error='ServerError'), 1)
+
+    text = metrics.to_prometheus()
+    ok_('intercom_request_duration_seconds_bucket{endpoint="users",'
+        'method="GET",le="0.1"} 1' in text)
+    ok_('intercom_request_duration_seconds_count{endpoint="users",'
+        'method="GET"} 2' in text)
+    ok_('intercom_response_bytes_total{endpoint="users",'
+        'method="GET"} 20' in text)
+
+    metrics.detach()
+    ok_(not hooks.active)
+
+
+class RateLimitedTransport(Transport):
+    """ Answers the first request with a 429, and the others with 200. """
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, method, url, **kwargs):
+        self.sent += 1
+        if self.sent == 1:
+            return Response(429, {}, b'')
+        return Response(200, {}, b'{}')
+
+
+def test_retries_and_queue_time():
+    default_transport = Intercom.transport
+    Intercom.transport = RateLimitedTransport()
+    metrics = MetricsCollector().attach()
+    try:
+        results = list(map_concurrent(
+            lambda n: Intercom._call('GET', Intercom.api_endpoint + 'users'),
+            [1, 2], workers=1, rate_limiter=RateLimiter(20), retries=1,
+            backoff=0.001))
+    finally:
+        metrics.detach()
+        Intercom.transport = default_transport
+    eq_([None, None], [result.error for result in results])
+    eq_(1, metrics.counter('retries_total', method='GET', endpoint='users'))
+    # the rate limit holds back all but the first request
+    ok_(metrics.counter(
+        'queue_seconds_total', method='GET', endpoint='users') > 0.05)
@@ -0,0 +1,118 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+
+from intercom import Company
+from intercom import Intercom
+from intercom import ResourceNotFound
+from intercom import User
+from intercom.streaming import ListPage
+from intercom.streaming import chunks
+from intercom.streaming import iter_records
+from intercom.transport import Response
+from intercom.transport import Transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+from nose.tools import with_setup
+
+default_transport = Intercom.transport
+
+USERS = [
+    {'email': u'zoë@example.com', 'session_count': 12345,
+     'custom_data': {'plan': 'pro', 'tags': [1, 2.5, None, True]}},
+    {'email': 'ben@example.com', 'session_count': 0, 'custom_data': {}},
+    {'email': 'ann@example.com', 'session_count': -7, 'name': 'Ann "A"'},
+]
+
+
+class PagesTransport(Transport):
+    """ Serves the users a page of two at a time. """
+
+    def __init__(self, key, status=200):
+        self.key = key
+        self.status = status
+        self.pages = []
+
+    def send(self, method, url, params=None, **kwargs):
+        page = params['page']
+        self.pages.append(page)
+        body = json.dumps({
+            'page': page, self.key: USERS[(page - 1) * 2:page * 2],
+            'total_pages': 2})
+        return Response(self.status, {}, body.encode('utf-8'))
+
+
+def tear_down():
+    Intercom.transport = default_transport
+
+
+def test_iter_records():
+    body = json.dumps(
+        {'total_count': 3, 'users': USERS, 'total_pages': 12},
+        ensure_ascii=False, indent=1).encode('utf-8')
+    # every chunk size splits a number, a string or a character somewhere
+    for size in (1, 2, 3, 7, 64, len(body)):
+        fields = {}
+        records = list(iter_records(chunks(body, size), 'users', fields))
+        eq_(USERS, records)
+        eq_({'total_count': 3, 'total_pages': 12}, fields)
+
+
+def test_iter_records_empty():
+    fields = {}
+    eq_([], list(iter_records([b'{"users": [ ], "page": 1}'], 'users', fields)))
+    eq_({'page': 1}, fields)
+    eq_([], list(iter_records([b' { } '], 'users', {})))
+    # not an array
+    fields = {}
+    eq_([], list(iter_records([b'{"users": null}'], 'users', fields)))
+    eq_({'users': None}, fields)
+
+
+@raises(ValueError)
+def test_truncated():
+    list(iter_records(chunks(b'{"users": [{"email": "a"}, {"em', 4), 'users',
+                      {}))
+
+
+def test_list_page():
+    page = ListPage(json.dumps({'users': USERS}).encode('utf-8'), 'users')
+    records = iter(page)
+    eq_(USERS[0], next(records))
+    eq_(USERS[1:], list(records))
+    try:
+        iter(page)
+        ok_(False)
+    except ValueError:
+        pass
+
+
+@with_setup(teardown=tear_down)
+def test_users_streamed():
+    transport = Intercom.transport = PagesTransport('users')
+    users = list(User.iter_all(stream=True))
+    eq_([1, 2], transport.pages)
+    eq_([u['email'] for u in USERS], [u.email for u in users])
+    ok_(isinstance(users[0], User))
+    raw = list(User.iter_all(raw=True, stream=True))
+    eq_(USERS, raw)
+    ok_(type(raw[0]) is dict)
+
+
+@with_setup(teardown=tear_down)
+def test_companies_streamed():
+    Intercom.transport = PagesTransport('companies')
+    companies = list(Company.iter_all(stream=True))
+    eq_(3, len(companies))
+    ok_(isinstance(companies[0], Company))
+
+
+@with_setup(teardown=tear_down)
+@raises(ResourceNotFound)
+def test_streamed_errors():
+    Intercom.transport = PagesTransport('users', status=404)
+    list(User.iter_all(stream=True))
@@ -0,0 +1,93 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import json
+import threading
+
+from intercom import Intercom
+from intercom import User
+from intercom.tracing import NULL_SPAN
+from intercom.tracing import RecordingAdapter
+from intercom.tracing import Tracer
+from mock import Mock
+from mock import patch
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+
+def test_inactive():
+    with Tracer().span('op') as span:
+        ok_(span is NULL_SPAN)
+
+
+def test_nesting():
+    tracer = Tracer()
+    recorder = RecordingAdapter()
+    tracer.add_adapter(recorder)
+    with tracer.span('op') as op:
+        with tracer.span('child', n=1) as child:
+            eq_(tracer.current(), child)
+        eq_(tracer.current(), op)
+    eq_(tracer.current(), None)
+    eq_([s.name for s in recorder.spans], ['child', 'op'])
+    eq_(child.parent, op)
+    eq_(child.trace_id, op.span_id)
+    eq_(child.attributes, {'n': 1})
+    ok_(op.duration >= child.duration)
+
+
+@raises(KeyError)
+def test_error():
+    tracer = Tracer()
+    recorder = RecordingAdapter()
+    tracer.add_adapter(recorder)
+    try:
+        with tracer.span('op'):
+            raise KeyError
+    finally:
+        ok_(isinstance(recorder.spans[0].error, KeyError))
+
+
+def test_activate_in_thread():
+    tracer = Tracer()
+    recorder = RecordingAdapter()
+    tracer.add_adapter(recorder)
+
+    def work(parent):
+        with tracer.activate(parent):
+            with tracer.span('work'):
+                pass
+
+    with tracer.span('op') as op:
+        thread = threading.Thread(target=work, args=(op,))
+        thread.start()
+        thread.join()
+    eq_(recorder.spans[0].parent, op)
+
+
+def page(number, total_pages):
+    resp = Mock()
+    resp.status_code = 200
+    resp.content = json.dumps({
+        'users': [{'email': 'user%s@example.com' % number}],
+        'page': number, 'total_pages': total_pages})
+    return resp
+
+
+def test_user_all():
+    recorder = RecordingAdapter()
+    Intercom.tracer.add_adapter(recorder)
+    try:
+        with patch.object(Intercom, '_send', side_effect=[
+                page(1, 2), page(2, 2)]):
+            eq_(len(User.all()), 2)
+    finally:
+        Intercom.tracer.remove_adapter(recorder)
+    names = [s.name for s in recorder.spans]
+    eq_(names, ['decode', 'http', 'build', 'page'] * 2 + ['User.all'])
+    eq_(recorder.spans[1].attributes['status_code'], 200)
+    eq_(recorder.spans[3].parent, recorder.spans[-1])
+    eq_(recorder.spans[7].attributes, {'page': 2})
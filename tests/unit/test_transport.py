@@ -0,0 +1,210 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import socket
+import threading
+import time
+
+from intercom import Intercom
+from intercom import AuthenticationError
+from intercom import User
+from intercom.fake_server import FakeIntercom
+from intercom.intercom import BasicAuth
+from intercom.transport import HTTPClientTransport
+from intercom.transport import HTTPException
+from intercom.transport import RequestsTransport
+from intercom.transport import Timeout
+from intercom.transport import Urllib3Transport
+from intercom.transport import _headers
+from intercom.transport import _query
+from intercom.transport import get_transport
+from nose.tools import eq_
+from nose.tools import ok_
+from nose.tools import raises
+
+fake = FakeIntercom(app_id='app', api_key='key')
+
+
+def setup_module():
+    fake.start()
+
+
+def teardown_module():
+    fake.stop()
+
+
+def test_query():
+    eq_('http://x/users', _query('http://x/users', None))
+    eq_('http://x/users?a=1&b=%C3%A9&c=1&c=2',
+        _query('http://x/users', {'b': u'é', 'a': 1, 'c': [1, 2]}))
+    eq_('http://x/users?a=1&b=2', _query('http://x/users?a=1', {'b': 2}))
+
+
+def test_headers():
+    auth = BasicAuth('app', 'key')
+    headers, data = _headers({'Accept': 'application/json'}, auth, u'{}')
+    eq_(auth.header, headers['Authorization'])
+    eq_(b'{}', data)
+    eq_(({}, None), _headers(None, None, None))
+
+
+def test_get_transport():
+    ok_(isinstance(get_transport('requests'), RequestsTransport))
+    ok_(isinstance(get_transport('urllib3'), Urllib3Transport))
+    ok_(isinstance(get_transport('http.client'), HTTPClientTransport))
+
+
+@raises(ValueError)
+def test_get_unknown_transport():
+    get_transport('pycurl')
+
+
+def check_transport(name):
+    endpoint = Intercom.api_endpoint
+    previous = Intercom.transport
+    timeout = Intercom.timeout
+    Intercom.api_endpoint = fake.url
+    Intercom.app_id = fake.app_id
+    Intercom.api_key = fake.api_key
+    Intercom.transport = get_transport(name)
+    Intercom.timeout = Timeout(connect=1, read=5)
+    fake.reset()
+    try:
+        user = User.create(user_id='1', email=u'joe@example.com')
+        eq_(u'joe@example.com', User.find(user_id='1').email)
+        eq_('1', User.find(email=user.email).user_id)
+        Intercom.api_key = 'wrong'
+        try:
+            User.find(user_id='1')
+            ok_(False)
+        except AuthenticationError:
+            pass
+        eq_(4, fake.request_count())
+    finally:
+        Intercom.transport.close()
+        Intercom.transport = previous
+        Intercom.api_endpoint = endpoint
+        Intercom.timeout = timeout
+
+
+def test_transports():
+    for name in ('requests', 'urllib3', 'http.client'):
+        yield check_transport, name
+
+
+def test_http_client_reconnects():
+    transport = HTTPClientTransport()
+    auth = BasicAuth(fake.app_id, fake.api_key)
+    fake.reset()
+    fake.seed_users(1)
+    response = transport.send('GET', fake.url + 'users', {'user_id': '1'},
+                              auth=auth)
+    eq_(200, response.status_code)
+    # the server drops kept-alive connections
+    fake.server.close_connections()
+    response = transport.send('GET', fake.url + 'users', {'user_id': '1'},
+                              auth=auth)
+    eq_(200, response.status_code)
+    transport.close()
+
+
+class SilentServer(object):
+    """ Answers GETs, and never answers anything else, counting the
+    requests it receives by method. """
+
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.url = 'http://127.0.0.1:%s/' % (self.listener.getsockname()[1])
+        self.methods = []
+        self.connections = []
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except socket.error:
+                return
+            self.connections.append(connection)
+            thread = threading.Thread(target=self.serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, connection):
+        data = b''
+        while True:
+            try:
+                chunk = connection.recv(4096)
+            except socket.error:
+                return
+            if not chunk:
+                return
+            data += chunk
+            while b'\r\n\r\n' in data:
+                head, data = data.split(b'\r\n\r\n', 1)
+                length = 0
+                for line in head.split(b'\r\n')[1:]:
+                    name, value = line.split(b':', 1)
+                    if name.strip().lower() == b'content-length':
+                        length = int(value)
+                data = data[length:]
+                method = head.split(b' ', 1)[0].decode('ascii')
+                self.methods.append(method)
+                if method == 'GET':
+                    connection.sendall(
+                        b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+
+    def close(self):
+        self.listener.close()
+        for connection in self.connections:
+            connection.close()
+
+
+def test_http_client_timeout_not_resent():
+    server = SilentServer()
+    transport = HTTPClientTransport()
+    timeout = Timeout(connect=1, read=0.2)
+    try:
+        eq_(200, transport.send('GET', server.url, timeout=timeout)
+            .status_code)
+        # the POST goes on the kept-alive connection, and times out
+        try:
+            transport.send('POST', server.url, data=b'{}', timeout=timeout)
+            ok_(False)
+        except socket.timeout:
+            pass
+        time.sleep(0.1)
+        eq_(['GET', 'POST'], server.methods)
+    finally:
+        transport.close()
+        server.close()
+
+
+def test_http_client_writes_not_resent():
+    transport = HTTPClientTransport()
+    auth = BasicAuth(fake.app_id, fake.api_key)
+    fake.reset()
+    url = fake.url + 'users'
+    body = b'{"email": "ann@example.com"}'
+    eq_(200, transport.send('POST', url, data=body, auth=auth).status_code)
+    # a write without an idempotency key is not sent again
+    fake.server.close_connections()
+    try:
+        transport.send('POST', url, data=body, auth=auth)
+        ok_(False)
+    except (IOError, HTTPException):
+        pass
+    # one with a key is
+    transport.send('GET', url, {'email': 'ann@example.com'}, auth=auth)
+    fake.server.close_connections()
+    response = transport.send(
+        'POST', url, data=body, auth=auth,
+        headers={'Idempotency-Key': 'key'})
+    eq_(200, response.status_code)
+    transport.close()
@@ -0,0 +1,191 @@
+# coding=utf-8
+#
+# License: http://jkeyes.mit-license.org/
+#
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from intercom import MessageThread
+from intercom import User
+from intercom.metrics import MetricsCollector
+from intercom.webhooks import Dispatcher
+from intercom.webhooks import Notification
+from intercom.webhooks import WebhookReceiver
+from intercom.webhooks import replay
+from intercom.webhooks import sign
+from intercom.webhooks import verify_signature
+from nose.tools import eq_
+from nose.tools import ok_
+
+SECRET = 'hub-secret'
+
+
+def payload(topic='user.created', item=None, number=1):
+    item = item or {'type': 'user', 'email': 'user%s@example.com' % number}
+    return json.dumps({
+        'type': 'notification_event', 'id': 'notif_%s' % number,
+        'topic': topic, 'created_at': 1400000000,
+        'data': {'type': 'notification_event_data', 'item': item}},
+    ).encode('utf-8')
+
+
+class Collector(object):
+    """ A handler that keeps the batches it is given. """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append(batch)
+
+    @property
+    def notifications(self):
+        return [n for batch in self.batches for n in batch]
+
+
+def test_signature():
+    body = payload()
+    signature = sign(body, SECRET)
+    ok_(signature.startswith('sha1='))
+    ok_(verify_signature(body, signature, SECRET))
+    ok_(not verify_signature(body + b' ', signature, SECRET))
+    ok_(not verify_signature(body, signature, 'another-secret'))
+    ok_(not verify_signature(body, None, SECRET))
+
+
+def test_notification_models():
+    notification = Notification.parse(payload())
+    eq_('user.created', notification.topic)
+    eq_('notif_1', notification.id)
+    ok_(isinstance(notification.item, User))
+    eq_('user1@example.com', notification.item.email)
+    notification = Notification.parse(payload(
+        'conversation.user.replied', {'type': 'conversation', 'id': '5'}))
+    ok_(isinstance(notification.item, MessageThread))
+    notification = Notification.parse(payload(
+        'ping', {'type': 'ping', 'message': 'hi'}))
+    eq_({'type': 'ping', 'message': 'hi'}, notification.item)
+
+
+def test_dispatcher_batches():
+    collector = Collector()
+    dispatcher = Dispatcher(
+        collector, workers=2, batch_size=10, max_wait=0.05).start()
+    for number in range(25):
+        ok_(dispatcher.submit(Notification.parse(payload(number=number))))
+    dispatcher.stop()
+    eq_(25, len(collector.notifications))
+    ok_(max(len(batch) for batch in collector.batches) <= 10)
+    ok_(len(collector.batches) < 25)
+    stats = dispatcher.stats()
+    eq_(25, stats['received'])
+    eq_(25, stats['dispatched'])
+    ok_(stats['per_second'] > 0)
+
+
+def test_dispatcher_backpressure():
+    metrics = MetricsCollector()
+    collector = Collector(delay=0.2)
+    dispatcher = Dispatcher(
+        collector, workers=1, batch_size=1, max_queue=2,
+        metrics=metrics).start()
+    accepted = [
+        dispatcher.submit(Notification.parse(payload(number=number)))
+        for number in range(6)]
+    ok_(not all(accepted))
+    ok_(dispatcher.stats()['rejected'])
+    ok_(metrics.counter('webhooks_rejected_total', topic='user.created'))
+    dispatcher.stop()
+
+
+def test_handler_errors_are_counted():
+    def fail(batch):
+        raise RuntimeError('boom')
+    dispatcher = Dispatcher(fail, workers=1, max_wait=0).start()
+    dispatcher.submit(Notification.parse(payload()))
+    dispatcher.stop()
+    eq_(1, dispatcher.stats()['errors'])
+
+
+def wsgi(receiver, body, method='POST', signature=None, path='/'):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path,
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+    if signature:
+        environ['HTTP_X_HUB_SIGNATURE'] = signature
+    started = []
+    content = receiver(environ, lambda s, h: started.append((s, h)))
+    return started[0][0], b''.join(content)
+
+
+def test_wsgi():
+    collector = Collector()
+    dispatcher = Dispatcher(collector, max_wait=0).start()
+    receiver = WebhookReceiver(dispatcher, secret=SECRET, path='/hooks')
+    body = payload()
+    eq_('202 Accepted', wsgi(
+        receiver, body, signature=sign(body, SECRET), path='/hooks')[0])
+    eq_('401 Unauthorized', wsgi(
+        receiver, body, signature='sha1=0', path='/hooks')[0])
+    eq_('400 Bad Request', wsgi(
+        receiver, b'[', signature=sign(b'[', SECRET), path='/hooks')[0])
+    eq_('405 Method Not Allowed', wsgi(
+        receiver, b'', method='GET', path='/hooks')[0])
+    eq_('404 Not Found', wsgi(receiver, body)[0])
+    dispatcher.stop()
+    eq_(1, len(collector.notifications))
+
+
+def test_wsgi_invalid_shape():
+    dispatcher = Dispatcher(Collector())
+    receiver = WebhookReceiver(dispatcher, secret=SECRET)
+    for payload_, error in (
+            ({'topic': 'user.created', 'data': {'item': [1]}},
+             b'data.item is not an object'),
+            ({'topic': 'user.created', 'data': 'user'},
+             b'data is not an object'),
+            ({'topic': ['user'], 'data': {'item': {}}},
+             b'topic is not a string'),
+            ({'topic': 'user.created', 'data': {'item': {'type': []}}},
+             b'data.item.type is not a string')):
+        body = json.dumps(payload_).encode('utf-8')
+        status, content = wsgi(receiver, body, signature=sign(body, SECRET))
+        eq_('400 Bad Request', status)
+        eq_(b'Invalid notification: ' + error, content)
+    eq_(0, dispatcher.queue.qsize())
+
+
+def test_wsgi_full_queue():
+    dispatcher = Dispatcher(Collector(), max_queue=1)
+    receiver = WebhookReceiver(dispatcher)
+    eq_('202 Accepted', wsgi(receiver, payload())[0])
+    eq_('503 Service Unavailable', wsgi(receiver, payload())[0])
+
+
+def test_replay():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for number in range(3):
+            path = os.path.join(tmpdir, '%s.json' % (number))
+            with open(path, 'wb') as saved:
+                saved.write(payload(number=number))
+            paths.append(path)
+        collector = Collector()
+        dispatcher = Dispatcher(collector, max_wait=0).start()
+        receiver = WebhookReceiver(dispatcher, secret=SECRET)
+        eq_([202, 202, 202], replay(receiver, paths))
+        dispatcher.stop()
+        eq_(3, len(collector.notifications))
+    finally:
+        shutil.rmtree(tmpdir)